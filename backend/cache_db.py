@@ -2,13 +2,50 @@
 Cache database initialization and management for OpenRecords.
 Handles SQLite cache for OpenRouter models.
 """
+import atexit
 import sqlite3
+import threading
+import weakref
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Generator
 
 from config import settings
 
+# Connection-scoped pragmas, applied once when a pooled connection is opened
+CONNECTION_PRAGMAS_SQL = f"""
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -{settings.sqlite_cache_mb * 1024};
+PRAGMA mmap_size = {settings.sqlite_mmap_bytes};
+PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms};
+PRAGMA wal_autocheckpoint = 1000;
+"""
+
+# Database-scoped pragmas are persisted in the file header, so they only run at init.
+# page_size only takes effect on an empty database, so it goes first.
+INIT_PRAGMAS_SQL = """
+PRAGMA page_size = 8192;
+PRAGMA journal_mode = WAL;
+""" + CONNECTION_PRAGMAS_SQL
+
+# One connection per thread, reused across requests. The connection is closed
+# when its thread exits (the worker pool retires idle threads), and _pool tracks
+# the live ones weakly so shutdown can close them all.
+_local = threading.local()
+_pool: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+_pool_lock = threading.Lock()
+
+
+class _ThreadConnection:
+    """Holder for one thread's connection, kept in that thread's locals."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection | None = conn
+
+# Set once the schema has been seen; tables are never dropped at runtime
+_cache_db_initialized = False
+
 
 # SQL to create the models_cache table
 CREATE_MODELS_CACHE_TABLE_SQL = """
@@ -19,16 +56,44 @@ CREATE TABLE IF NOT EXISTS models_cache (
     context_length INTEGER,
     pricing_prompt REAL,
     pricing_completion REAL,
-    categories TEXT,
+    categories TEXT CHECK (categories IS NULL OR json_valid(categories)),
     supports_streaming INTEGER,
+    is_embedding INTEGER NOT NULL DEFAULT 0,
     raw_json TEXT NOT NULL,
     updated_at INTEGER NOT NULL
-);
+) STRICT;
 
 -- Create indexes for faster lookups
 CREATE INDEX IF NOT EXISTS idx_models_provider ON models_cache(provider);
 CREATE INDEX IF NOT EXISTS idx_models_categories ON models_cache(categories);
 CREATE INDEX IF NOT EXISTS idx_models_updated_at ON models_cache(updated_at);
+CREATE INDEX IF NOT EXISTS idx_models_embedding ON models_cache(provider, name) WHERE is_embedding = 1;
+"""
+
+
+# categories used to be a comma-joined string; it is now a JSON array
+MIGRATE_MODELS_CACHE_CATEGORIES_SQL = """
+UPDATE models_cache
+SET categories = CASE
+    WHEN categories IS NULL OR categories = '' THEN '[]'
+    ELSE '["' || replace(categories, ',', '","') || '"]'
+END
+WHERE CASE
+    WHEN json_valid(categories) THEN json_type(categories) != 'array'
+    ELSE 1
+END;
+"""
+
+# Embedding-capable flag computed at write time, backfilled for older caches
+ADD_MODELS_CACHE_IS_EMBEDDING_SQL = """
+ALTER TABLE models_cache ADD COLUMN is_embedding INTEGER NOT NULL DEFAULT 0;
+
+UPDATE models_cache
+SET is_embedding = 1
+WHERE EXISTS (SELECT 1 FROM json_each(categories) WHERE value = 'embedding')
+   OR id LIKE '%embed%';
+
+CREATE INDEX IF NOT EXISTS idx_models_embedding ON models_cache(provider, name) WHERE is_embedding = 1;
 """
 
 
@@ -45,9 +110,8 @@ def init_cache_database() -> None:
     conn = sqlite3.connect(settings.cache_db_path)
     cursor = conn.cursor()
 
-    # Enable WAL mode for better concurrency
-    cursor.execute("PRAGMA journal_mode=WAL;")
-    cursor.execute("PRAGMA synchronous=NORMAL;")
+    # Page size, WAL and cache tuning
+    cursor.executescript(INIT_PRAGMAS_SQL)
 
     # Create tables
     cursor.executescript(CREATE_MODELS_CACHE_TABLE_SQL)
@@ -56,21 +120,52 @@ def init_cache_database() -> None:
     conn.close()
 
 
-@contextmanager
-def get_cache_db_connection() -> Generator[sqlite3.Connection, None, None]:
-    """Get a cache database connection with proper setup."""
+def migrate_cache_database() -> None:
+    """Upgrade cache rows written by older versions in place."""
+    with get_cache_db_cursor() as cursor:
+        cursor.executescript(MIGRATE_MODELS_CACHE_CATEGORIES_SQL)
+
+        cursor.execute("PRAGMA table_info(models_cache)")
+        if "is_embedding" not in {row[1] for row in cursor.fetchall()}:
+            cursor.executescript(ADD_MODELS_CACHE_IS_EMBEDDING_SQL)
+
+
+def _make_cache_connection() -> sqlite3.Connection:
+    """Open a new cache database connection and apply the connection pragmas."""
     ensure_cache_directory()
-    conn = sqlite3.connect(settings.cache_db_path)
+    conn = sqlite3.connect(settings.cache_db_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Allow accessing columns by name
-    
-    # Enable WAL mode
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.executescript(CONNECTION_PRAGMAS_SQL)
+    return conn
 
-    try:
-        yield conn
-    finally:
-        conn.close()
+
+def close_cache_db_connections() -> None:
+    """Close every pooled cache database connection."""
+    with _pool_lock:
+        for holder in list(_pool):
+            if holder.conn is not None:
+                holder.conn.close()
+                holder.conn = None
+        _pool.clear()
+
+
+atexit.register(close_cache_db_connections)
+
+
+@contextmanager
+def get_cache_db_connection() -> Generator[sqlite3.Connection, None, None]:
+    """Get the pooled cache database connection for the current thread."""
+    holder = getattr(_local, "connection", None)
+    if holder is None or holder.conn is None:
+        conn = _make_cache_connection()
+        holder = _ThreadConnection(conn)
+        # Runs once the thread's locals are freed, i.e. when the thread exits
+        weakref.finalize(holder, conn.close)
+        with _pool_lock:
+            _pool.add(holder)
+        _local.connection = holder
+
+    yield holder.conn
 
 
 @contextmanager
@@ -86,14 +181,26 @@ def get_cache_db_cursor() -> Generator[sqlite3.Cursor, None, None]:
             raise
 
 
+def optimize_cache_database() -> None:
+    """Let SQLite refresh query planner statistics where it deems it useful."""
+    with get_cache_db_connection() as conn:
+        conn.execute("PRAGMA analysis_limit = 1000;")
+        conn.execute("PRAGMA optimize;")
+
+
 def check_cache_database_initialized() -> bool:
-    """Check if the cache database has been initialized."""
+    """Check if the cache database has been initialized (memoized once true)."""
+    global _cache_db_initialized
+    if _cache_db_initialized:
+        return True
+
     try:
         with get_cache_db_cursor() as cursor:
             cursor.execute(
                 "SELECT name FROM sqlite_master WHERE type='table' AND name='models_cache';"
             )
-            return cursor.fetchone() is not None
+            _cache_db_initialized = cursor.fetchone() is not None
+            return _cache_db_initialized
     except sqlite3.Error:
         return False
 
@@ -102,3 +209,38 @@ def clear_models_cache() -> None:
     """Clear all models from the cache."""
     with get_cache_db_cursor() as cursor:
         cursor.execute("DELETE FROM models_cache")
+
+
+def replace_models_cache(models: list[dict]) -> int:
+    """
+    Replace the whole models cache in a single transaction.
+
+    Each model dict must contain every models_cache column.
+    Returns the number of models stored.
+    """
+    with get_cache_db_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute("DELETE FROM models_cache")
+            conn.executemany(
+                """
+                INSERT INTO models_cache (
+                    id, provider, name, context_length,
+                    pricing_prompt, pricing_completion,
+                    categories, supports_streaming, is_embedding,
+                    raw_json, updated_at
+                ) VALUES (
+                    :id, :provider, :name, :context_length,
+                    :pricing_prompt, :pricing_completion,
+                    :categories, :supports_streaming, :is_embedding,
+                    :raw_json, :updated_at
+                )
+                """,
+                models,
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return len(models)
@@ -3,13 +3,23 @@ Configuration module for OpenRecords backend.
 Loads environment variables and provides settings.
 """
 import os
+from functools import cached_property, lru_cache
 from pathlib import Path
+from dotenv import dotenv_values
 from pydantic import Field
 from pydantic.aliases import AliasChoices
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 BASE_DIR = Path(__file__).resolve().parent
+ENV_FILE = BASE_DIR / ".env.local"
+
+
+def _load_env_file() -> None:
+    """Export .env.local into the environment without overriding real env vars."""
+    for key, value in dotenv_values(ENV_FILE).items():
+        if value is not None:
+            os.environ.setdefault(key.upper(), value)
 
 
 class Settings(BaseSettings):
@@ -29,6 +39,11 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     jwt_expiration_days: int = 30
 
+    # Argon2id password hashing (RFC 9106 second recommendation: 64 MiB, t=3)
+    argon2_time_cost: int = 3
+    argon2_memory_kib: int = 64 * 1024
+    argon2_parallelism: int = 4
+
     # CORS
     cors_origins: str = "http://localhost:3000,http://localhost:5173"
 
@@ -39,12 +54,21 @@ class Settings(BaseSettings):
     # Cache settings
     cache_ttl_seconds: int = 86400  # 24 hours
 
+    # SQLite tuning
+    sqlite_cache_mb: int = 64
+    sqlite_mmap_bytes: int = 10 * 1024 * 1024 * 1024  # 10 GB
+    sqlite_busy_timeout_ms: int = 5000
+
+    # Background ingestion (document processing, scraping, reindexing)
+    ingest_workers: int = 2
+    # How long shutdown waits for queued and running ingest jobs to finish
+    ingest_drain_timeout_seconds: float = 30.0
+
     # Storage
     openrecords_vault_path: str = str(BASE_DIR / "vault" / "encrypted_files")
+    openrecords_pdf_path: str = str(BASE_DIR / "data" / "pdfs")
 
     class Config:
-        env_file = ".env.local"
-        env_file_encoding = "utf-8"
         extra = "ignore"
 
     @property
@@ -57,12 +81,12 @@ class Settings(BaseSettings):
         """Check if running in production mode."""
         return self.openrecords_env.lower() == "prod"
 
-    @property
+    @cached_property
     def cors_origins_list(self) -> list[str]:
         """Get CORS origins as a list."""
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
-    @property
+    @cached_property
     def database_path(self) -> Path:
         """Get the database path as a Path object."""
         db_path = Path(self.openrecords_db_path)
@@ -70,7 +94,7 @@ class Settings(BaseSettings):
             db_path = BASE_DIR / db_path
         return db_path
 
-    @property
+    @cached_property
     def cache_db_path(self) -> Path:
         """Get the cache database path as a Path object."""
         db_path = Path(self.openrecords_cache_db)
@@ -78,7 +102,7 @@ class Settings(BaseSettings):
             db_path = BASE_DIR / db_path
         return db_path
 
-    @property
+    @cached_property
     def vault_path(self) -> Path:
         """Get the vault path as a Path object."""
         vault_path = Path(self.openrecords_vault_path)
@@ -86,6 +110,21 @@ class Settings(BaseSettings):
             vault_path = BASE_DIR / vault_path
         return vault_path
 
+    @cached_property
+    def pdf_path(self) -> Path:
+        """Get the generated PDF directory as a Path object."""
+        pdf_path = Path(self.openrecords_pdf_path)
+        if not pdf_path.is_absolute():
+            pdf_path = BASE_DIR / pdf_path
+        return pdf_path
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load the environment file and build the settings once per process."""
+    _load_env_file()
+    return Settings()
+
 
 # Global settings instance
-settings = Settings()
+settings = get_settings()
@@ -2,13 +2,52 @@
 Database initialization and management for OpenRecords.
 Handles SQLite connection and schema creation.
 """
+import atexit
+import base64
 import sqlite3
+import threading
+import weakref
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Generator
 
 from config import settings
 
+# Connection-scoped pragmas, applied once when a pooled connection is opened
+CONNECTION_PRAGMAS_SQL = f"""
+PRAGMA synchronous = NORMAL;
+PRAGMA foreign_keys = ON;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -{settings.sqlite_cache_mb * 1024};
+PRAGMA mmap_size = {settings.sqlite_mmap_bytes};
+PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms};
+PRAGMA wal_autocheckpoint = 1000;
+"""
+
+# Database-scoped pragmas are persisted in the file header, so they only run at init.
+# page_size only takes effect on an empty database, so it goes first.
+INIT_PRAGMAS_SQL = """
+PRAGMA page_size = 8192;
+PRAGMA journal_mode = WAL;
+""" + CONNECTION_PRAGMAS_SQL
+
+# One connection per thread, reused across requests. The connection is closed
+# when its thread exits (the worker pool retires idle threads), and _pool tracks
+# the live ones weakly so shutdown can close them all.
+_local = threading.local()
+_pool: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+_pool_lock = threading.Lock()
+
+
+class _ThreadConnection:
+    """Holder for one thread's connection, kept in that thread's locals."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn: sqlite3.Connection | None = conn
+
+# Set once the schema has been seen; tables are never dropped at runtime
+_db_initialized = False
+
 
 # SQL to create the users table
 CREATE_USERS_TABLE_SQL = """
@@ -21,7 +60,7 @@ CREATE TABLE IF NOT EXISTS users (
     encrypted_master_key TEXT NOT NULL,
     created_at TEXT NOT NULL,
     last_login TEXT
-);
+) STRICT;
 
 -- Create indexes for faster lookups
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
@@ -38,7 +77,7 @@ CREATE TABLE IF NOT EXISTS user_settings (
     temperature REAL,
     updated_at TEXT NOT NULL,
     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-);
+) STRICT;
 
 CREATE INDEX IF NOT EXISTS idx_user_settings_user_id ON user_settings(user_id);
 """
@@ -56,9 +95,9 @@ CREATE TABLE IF NOT EXISTS records (
     chat_model TEXT,
     embed_model TEXT,
     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-);
+) STRICT;
 
-CREATE INDEX IF NOT EXISTS idx_records_user_id ON records(user_id);
+CREATE INDEX IF NOT EXISTS idx_records_user_updated ON records(user_id, updated_at DESC);
 CREATE INDEX IF NOT EXISTS idx_records_created_at ON records(created_at);
 CREATE INDEX IF NOT EXISTS idx_records_last_opened ON records(last_opened);
 """
@@ -75,20 +114,23 @@ CREATE TABLE IF NOT EXISTS documents (
     status TEXT NOT NULL DEFAULT 'processing',
     page_count INTEGER DEFAULT 0,
     token_count INTEGER DEFAULT 0,
+    chunk_count INTEGER DEFAULT 0,
     error_message TEXT,
     created_at TEXT NOT NULL,
     FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE
-);
+) STRICT, WITHOUT ROWID;
 
-CREATE INDEX IF NOT EXISTS idx_documents_record_id ON documents(record_id);
+CREATE INDEX IF NOT EXISTS idx_documents_record_created ON documents(record_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(hash);
 CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
 """
 
 # SQL to create chunks table
+# seq is an explicit rowid alias so VACUUM cannot renumber it; chunks_fts is keyed on it
 CREATE_CHUNKS_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS chunks (
-    id TEXT PRIMARY KEY,
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
     document_id TEXT NOT NULL,
     chunk_index INTEGER NOT NULL DEFAULT 0,
     encrypted_text TEXT NOT NULL,
@@ -96,9 +138,18 @@ CREATE TABLE IF NOT EXISTS chunks (
     page_number INTEGER,
     section TEXT,
     FOREIGN KEY(document_id) REFERENCES documents(id) ON DELETE CASCADE
-);
+) STRICT;
+
+CREATE INDEX IF NOT EXISTS idx_chunks_document_index ON chunks(document_id, chunk_index);
+"""
+
+# SQL to create the blind keyword index (keyed term hashes, rowid = chunks.seq)
+CREATE_CHUNKS_FTS_TABLE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(terms);
 
-CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id);
+CREATE TRIGGER IF NOT EXISTS trg_chunks_fts_delete AFTER DELETE ON chunks BEGIN
+    DELETE FROM chunks_fts WHERE rowid = old.seq;
+END;
 """
 
 # SQL to create references table
@@ -114,7 +165,7 @@ CREATE TABLE IF NOT EXISTS references_table (
     created_at TEXT NOT NULL,
     FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE,
     FOREIGN KEY(document_id) REFERENCES documents(id) ON DELETE SET NULL
-);
+) STRICT, WITHOUT ROWID;
 
 CREATE INDEX IF NOT EXISTS idx_references_record_id ON references_table(record_id);
 CREATE INDEX IF NOT EXISTS idx_references_url ON references_table(url);
@@ -127,7 +178,7 @@ CREATE TABLE IF NOT EXISTS sessions (
     user_id TEXT NOT NULL,
     expires_at INTEGER NOT NULL,
     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-);
+) STRICT, WITHOUT ROWID;
 
 CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
@@ -144,53 +195,225 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     model TEXT,
     created_at TEXT NOT NULL,
     FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE
-);
+) STRICT;
 
-CREATE INDEX IF NOT EXISTS idx_chat_messages_record_id ON chat_messages(record_id);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_record_created ON chat_messages(record_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at);
 """
 
 # SQL to create generated_images table
+# Raw image bytes live in generated_image_blobs so metadata scans never touch them.
+# legacy_image_url holds remote image URLs from before images were stored as blobs.
 CREATE_GENERATED_IMAGES_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS generated_images (
     id TEXT PRIMARY KEY,
     record_id TEXT NOT NULL,
     user_id TEXT NOT NULL,
     type TEXT NOT NULL DEFAULT 'infographic',
-    image_data TEXT NOT NULL,
     prompt TEXT,
     depth TEXT,
     model TEXT,
     created_at TEXT NOT NULL,
     document_count INTEGER,
     chunk_count INTEGER,
+    legacy_image_url TEXT,
     FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE,
     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-);
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS generated_image_blobs (
+    image_id TEXT PRIMARY KEY,
+    mime_type TEXT NOT NULL,
+    image_data BLOB NOT NULL,
+    FOREIGN KEY(image_id) REFERENCES generated_images(id) ON DELETE CASCADE
+) STRICT;
 
 CREATE INDEX IF NOT EXISTS idx_generated_images_record_user ON generated_images(record_id, user_id);
 CREATE INDEX IF NOT EXISTS idx_generated_images_created_at ON generated_images(created_at);
 """
 
 # SQL to create generated_pdfs table
+# New PDFs are written to storage_path on disk; generated_pdf_blobs keeps
+# the bytes of PDFs created before that, out of the metadata table
 CREATE_GENERATED_PDFS_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS generated_pdfs (
     id TEXT PRIMARY KEY,
     record_id TEXT NOT NULL,
     user_id TEXT NOT NULL,
-    pdf_data BLOB NOT NULL,
     created_at TEXT NOT NULL,
     chunk_count INTEGER,
     page_count INTEGER,
     model TEXT,
+    storage_path TEXT,
     FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE,
     FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-);
+) STRICT, WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS generated_pdf_blobs (
+    pdf_id TEXT PRIMARY KEY,
+    pdf_data BLOB NOT NULL,
+    FOREIGN KEY(pdf_id) REFERENCES generated_pdfs(id) ON DELETE CASCADE
+) STRICT;
 
 CREATE INDEX IF NOT EXISTS idx_generated_pdfs_record_user ON generated_pdfs(record_id, user_id);
 CREATE INDEX IF NOT EXISTS idx_generated_pdfs_created_at ON generated_pdfs(created_at);
 """
 
+# SQL to create rag_cache table (full-corpus LLM answers, encrypted with the user key)
+CREATE_RAG_CACHE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS rag_cache (
+    record_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    encrypted_answer TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY(record_id, kind, model, content_hash),
+    FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE
+) STRICT, WITHOUT ROWID;
+"""
+
+# Full schema, executed as one script at init
+ALL_SCHEMA_SQL = "\n".join([
+    CREATE_USERS_TABLE_SQL,
+    CREATE_USER_SETTINGS_TABLE_SQL,
+    CREATE_RECORDS_TABLE_SQL,
+    CREATE_DOCUMENTS_TABLE_SQL,
+    CREATE_CHUNKS_TABLE_SQL,
+    CREATE_CHUNKS_FTS_TABLE_SQL,
+    CREATE_REFERENCES_TABLE_SQL,
+    CREATE_SESSIONS_TABLE_SQL,
+    CREATE_CHAT_MESSAGES_TABLE_SQL,
+    CREATE_GENERATED_IMAGES_TABLE_SQL,
+    CREATE_GENERATED_PDFS_TABLE_SQL,
+    CREATE_RAG_CACHE_TABLE_SQL,
+])
+
+# SQL to move inline pdf_data from a legacy generated_pdfs table into generated_pdf_blobs
+MIGRATE_GENERATED_PDFS_SQL = """
+BEGIN;
+CREATE TABLE IF NOT EXISTS generated_pdf_blobs (
+    pdf_id TEXT PRIMARY KEY,
+    pdf_data BLOB NOT NULL,
+    FOREIGN KEY(pdf_id) REFERENCES generated_pdfs(id) ON DELETE CASCADE
+) STRICT;
+INSERT OR IGNORE INTO generated_pdf_blobs (pdf_id, pdf_data)
+    SELECT id, pdf_data FROM generated_pdfs;
+CREATE TABLE generated_pdfs_new (
+    id TEXT PRIMARY KEY,
+    record_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    chunk_count INTEGER,
+    page_count INTEGER,
+    model TEXT,
+    FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE,
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+) STRICT, WITHOUT ROWID;
+INSERT INTO generated_pdfs_new (id, record_id, user_id, created_at, chunk_count, page_count, model)
+    SELECT id, record_id, user_id, created_at, chunk_count, page_count, model FROM generated_pdfs;
+DROP TABLE generated_pdfs;
+ALTER TABLE generated_pdfs_new RENAME TO generated_pdfs;
+COMMIT;
+"""
+
+# SQL to move base64 data-URL images from a legacy generated_images table into
+# generated_image_blobs (uses the data_url_* functions registered in migrate_database).
+# Rows that stored a remote image URL instead keep it in legacy_image_url.
+MIGRATE_GENERATED_IMAGES_SQL = """
+BEGIN;
+CREATE TABLE IF NOT EXISTS generated_image_blobs (
+    image_id TEXT PRIMARY KEY,
+    mime_type TEXT NOT NULL,
+    image_data BLOB NOT NULL,
+    FOREIGN KEY(image_id) REFERENCES generated_images(id) ON DELETE CASCADE
+) STRICT;
+INSERT OR IGNORE INTO generated_image_blobs (image_id, mime_type, image_data)
+    SELECT id, data_url_mime(image_data), data_url_bytes(image_data) FROM generated_images
+    WHERE image_data LIKE 'data:image/%;base64,%';
+CREATE TABLE generated_images_new (
+    id TEXT PRIMARY KEY,
+    record_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT 'infographic',
+    prompt TEXT,
+    depth TEXT,
+    model TEXT,
+    created_at TEXT NOT NULL,
+    document_count INTEGER,
+    chunk_count INTEGER,
+    legacy_image_url TEXT,
+    FOREIGN KEY(record_id) REFERENCES records(id) ON DELETE CASCADE,
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+) STRICT;
+INSERT INTO generated_images_new (
+    id, record_id, user_id, type, prompt, depth, model, created_at, document_count, chunk_count,
+    legacy_image_url
+)
+    SELECT id, record_id, user_id, type, prompt, depth, model, created_at, document_count, chunk_count,
+        CASE WHEN image_data LIKE 'data:image/%;base64,%' THEN NULL ELSE NULLIF(image_data, '') END
+    FROM generated_images;
+DROP TABLE generated_images;
+ALTER TABLE generated_images_new RENAME TO generated_images;
+COMMIT;
+"""
+
+# SQL to give a legacy chunks table an explicit rowid alias. The current rowids are
+# copied into seq so existing chunks_fts entries keep pointing at the same chunks.
+MIGRATE_CHUNKS_SEQ_SQL = """
+BEGIN;
+DROP TRIGGER IF EXISTS trg_chunks_fts_delete;
+CREATE TABLE chunks_new (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    document_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL DEFAULT 0,
+    encrypted_text TEXT NOT NULL,
+    token_count INTEGER,
+    page_number INTEGER,
+    section TEXT,
+    FOREIGN KEY(document_id) REFERENCES documents(id) ON DELETE CASCADE
+) STRICT;
+INSERT INTO chunks_new (seq, id, document_id, chunk_index, encrypted_text, token_count, page_number, section)
+    SELECT rowid, id, document_id, chunk_index, encrypted_text, token_count, page_number, section
+    FROM chunks;
+DROP TABLE chunks;
+ALTER TABLE chunks_new RENAME TO chunks;
+COMMIT;
+"""
+
+# SQL to add legacy_image_url to generated_images tables created without it
+ADD_GENERATED_IMAGES_LEGACY_URL_SQL = """
+ALTER TABLE generated_images ADD COLUMN legacy_image_url TEXT;
+"""
+
+# SQL to add the denormalized documents.chunk_count column and backfill it
+ADD_DOCUMENTS_CHUNK_COUNT_SQL = """
+BEGIN;
+ALTER TABLE documents ADD COLUMN chunk_count INTEGER DEFAULT 0;
+UPDATE documents
+SET chunk_count = (SELECT COUNT(*) FROM chunks WHERE chunks.document_id = documents.id);
+COMMIT;
+"""
+
+# SQL to add the on-disk location of generated PDFs
+ADD_GENERATED_PDFS_STORAGE_PATH_SQL = """
+ALTER TABLE generated_pdfs ADD COLUMN storage_path TEXT;
+"""
+
+# SQL to swap single-column indexes for the composite ones used by list queries
+UPGRADE_INDEXES_SQL = """
+DROP INDEX IF EXISTS idx_records_user_id;
+DROP INDEX IF EXISTS idx_documents_record_id;
+DROP INDEX IF EXISTS idx_chunks_document_id;
+DROP INDEX IF EXISTS idx_chat_messages_record_id;
+
+CREATE INDEX IF NOT EXISTS idx_records_user_updated ON records(user_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_record_created ON documents(record_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_chunks_document_index ON chunks(document_id, chunk_index);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_record_created ON chat_messages(record_id, created_at);
+"""
+
 
 def ensure_data_directory() -> None:
     """Ensure the data directory exists."""
@@ -205,37 +428,115 @@ def init_database() -> None:
     conn = sqlite3.connect(settings.database_path)
     cursor = conn.cursor()
 
-    # Enable foreign keys
-    cursor.execute("PRAGMA foreign_keys = ON;")
-
-    # Create tables
-    cursor.executescript(CREATE_USERS_TABLE_SQL)
-    cursor.executescript(CREATE_USER_SETTINGS_TABLE_SQL)
-    cursor.executescript(CREATE_RECORDS_TABLE_SQL)
-    cursor.executescript(CREATE_DOCUMENTS_TABLE_SQL)
-    cursor.executescript(CREATE_CHUNKS_TABLE_SQL)
-    cursor.executescript(CREATE_REFERENCES_TABLE_SQL)
-    cursor.executescript(CREATE_SESSIONS_TABLE_SQL)
-    cursor.executescript(CREATE_CHAT_MESSAGES_TABLE_SQL)
-    cursor.executescript(CREATE_GENERATED_IMAGES_TABLE_SQL)
-    cursor.executescript(CREATE_GENERATED_PDFS_TABLE_SQL)
+    # Page size, WAL, foreign keys and cache tuning
+    cursor.executescript(INIT_PRAGMAS_SQL)
+
+    # Create all tables and indexes in one transaction
+    cursor.executescript("BEGIN;\n" + ALL_SCHEMA_SQL + "\nCOMMIT;")
 
     conn.commit()
     conn.close()
 
 
-@contextmanager
-def get_db_connection() -> Generator[sqlite3.Connection, None, None]:
-    """Get a database connection with proper setup."""
-    ensure_data_directory()
+def _table_columns(cursor: sqlite3.Cursor, table: str) -> set[str]:
+    """Return the column names of a table."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _data_url_mime(data_url: str) -> str:
+    """MIME type of a ``data:<mime>;base64,...`` URL."""
+    return data_url[5:data_url.index(";")]
+
+
+def _data_url_bytes(data_url: str) -> bytes:
+    """Decoded payload of a ``data:<mime>;base64,...`` URL."""
+    return base64.b64decode(data_url.split(",", 1)[1])
+
+
+def migrate_database() -> None:
+    """Upgrade tables created by older schema versions in place."""
     conn = sqlite3.connect(settings.database_path)
+    cursor = conn.cursor()
+
+    # Databases created before WAL was enabled at init
+    cursor.execute("PRAGMA journal_mode = WAL;")
+
+    # generated_pdfs used to store pdf_data inline
+    if "pdf_data" in _table_columns(cursor, "generated_pdfs"):
+        cursor.executescript(MIGRATE_GENERATED_PDFS_SQL)
+        cursor.executescript(CREATE_GENERATED_PDFS_TABLE_SQL)
+
+    # Generated PDFs moved from BLOBs to files on disk
+    if "storage_path" not in _table_columns(cursor, "generated_pdfs"):
+        cursor.executescript(ADD_GENERATED_PDFS_STORAGE_PATH_SQL)
+
+    # generated_images used to store base64 data URLs inline
+    if "image_data" in _table_columns(cursor, "generated_images"):
+        conn.create_function("data_url_mime", 1, _data_url_mime, deterministic=True)
+        conn.create_function("data_url_bytes", 1, _data_url_bytes, deterministic=True)
+        cursor.executescript(MIGRATE_GENERATED_IMAGES_SQL)
+        cursor.executescript(CREATE_GENERATED_IMAGES_TABLE_SQL)
+    elif "legacy_image_url" not in _table_columns(cursor, "generated_images"):
+        cursor.executescript(ADD_GENERATED_IMAGES_LEGACY_URL_SQL)
+
+    # chunks_fts used to be keyed on the implicit chunks.rowid, which VACUUM may renumber
+    if "seq" not in _table_columns(cursor, "chunks"):
+        cursor.executescript(MIGRATE_CHUNKS_SEQ_SQL)
+        cursor.executescript(CREATE_CHUNKS_TABLE_SQL)
+
+    # documents.chunk_count replaced a COUNT over chunks in list queries
+    if "chunk_count" not in _table_columns(cursor, "documents"):
+        cursor.executescript(ADD_DOCUMENTS_CHUNK_COUNT_SQL)
+
+    cursor.executescript(UPGRADE_INDEXES_SQL)
+
+    # Keyword index is filled at ingest / reindex time
+    cursor.executescript(CREATE_CHUNKS_FTS_TABLE_SQL)
+
+    # Cached insight / summary / outline answers
+    cursor.executescript(CREATE_RAG_CACHE_TABLE_SQL)
+
+    conn.commit()
+    conn.close()
+
+
+def _make_connection() -> sqlite3.Connection:
+    """Open a new database connection and apply the connection pragmas."""
+    ensure_data_directory()
+    conn = sqlite3.connect(settings.database_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Allow accessing columns by name
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn.executescript(CONNECTION_PRAGMAS_SQL)
+    return conn
 
-    try:
-        yield conn
-    finally:
-        conn.close()
+
+def close_db_connections() -> None:
+    """Close every pooled database connection."""
+    with _pool_lock:
+        for holder in list(_pool):
+            if holder.conn is not None:
+                holder.conn.close()
+                holder.conn = None
+        _pool.clear()
+
+
+atexit.register(close_db_connections)
+
+
+@contextmanager
+def get_db_connection() -> Generator[sqlite3.Connection, None, None]:
+    """Get the pooled database connection for the current thread."""
+    holder = getattr(_local, "connection", None)
+    if holder is None or holder.conn is None:
+        conn = _make_connection()
+        holder = _ThreadConnection(conn)
+        # Runs once the thread's locals are freed, i.e. when the thread exits
+        weakref.finalize(holder, conn.close)
+        with _pool_lock:
+            _pool.add(holder)
+        _local.connection = holder
+
+    yield holder.conn
 
 
 @contextmanager
@@ -251,8 +552,47 @@ def get_db_cursor() -> Generator[sqlite3.Cursor, None, None]:
             raise
 
 
+def bulk_insert(table: str, rows: list[dict]) -> int:
+    """
+    Insert many rows into a table in a single transaction.
+
+    All rows must share the same keys, which are used as column names.
+    Returns the number of rows inserted.
+    """
+    if not rows:
+        return 0
+
+    columns = list(rows[0].keys())
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(':' + column for column in columns)})"
+    )
+
+    with get_db_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.executemany(sql, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return len(rows)
+
+
+def optimize_database() -> None:
+    """Let SQLite refresh query planner statistics where it deems it useful."""
+    with get_db_connection() as conn:
+        conn.execute("PRAGMA analysis_limit = 1000;")
+        conn.execute("PRAGMA optimize;")
+
+
 def check_database_initialized() -> bool:
-    """Check if the database has been initialized."""
+    """Check if the database has been initialized (memoized once true)."""
+    global _db_initialized
+    if _db_initialized:
+        return True
+
     try:
         with get_db_cursor() as cursor:
             cursor.execute(
@@ -277,7 +617,8 @@ def check_database_initialized() -> bool:
                 "generated_images",
                 "generated_pdfs",
             }
-            return required.issubset(existing)
+            _db_initialized = required.issubset(existing)
+            return _db_initialized
     except sqlite3.Error:
         return False
 
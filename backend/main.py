@@ -2,14 +2,28 @@
 Main FastAPI application for OpenRecords.
 Initializes the app, database, and includes all routers.
 """
+import asyncio
 from contextlib import asynccontextmanager
-import dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from config import settings
-from cache_db import check_cache_database_initialized, init_cache_database
-from database import check_database_initialized, init_database
+from cache_db import (
+    check_cache_database_initialized,
+    close_cache_db_connections,
+    init_cache_database,
+    migrate_cache_database,
+    optimize_cache_database,
+)
+from database import (
+    check_database_initialized,
+    close_db_connections,
+    init_database,
+    migrate_database,
+    optimize_database,
+)
+from middleware.auth import AuthMiddleware
 from routers import (
     auth_router,
     cache_router,
@@ -21,7 +35,30 @@ from routers import (
     references_router,
     users_router,
 )
-dotenv.load_dotenv(".env.example")  # Load environment variables from .env file
+from services.model_cache import close_model_cache_client
+from services.ingest_queue import start_ingest_workers, stop_ingest_workers
+from utils.openrouter import close_http_client
+from utils.parsing import shutdown_pdf_pool
+from utils.scraping import close_scrape_client
+
+OPTIMIZE_INTERVAL_SECONDS = 6 * 60 * 60  # 6 hours
+
+
+def _optimize_databases() -> None:
+    """Run PRAGMA optimize on both databases."""
+    optimize_database()
+    optimize_cache_database()
+
+
+async def _periodic_optimize() -> None:
+    """Keep query planner statistics fresh on long-running servers."""
+    while True:
+        await asyncio.sleep(OPTIMIZE_INTERVAL_SECONDS)
+        try:
+            _optimize_databases()
+        except Exception as e:
+            print(f"Database optimize failed: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,6 +77,7 @@ async def lifespan(app: FastAPI):
         print("Database initialized.")
     else:
         print("Database already initialized.")
+        migrate_database()
 
     # Initialize cache database
     if not check_cache_database_initialized():
@@ -48,14 +86,27 @@ async def lifespan(app: FastAPI):
         print("Cache database initialized.")
     else:
         print("Cache database already initialized.")
+        migrate_cache_database()
 
     # Store settings in app state for access in routes
     app.state.settings = settings
 
+    optimize_task = asyncio.create_task(_periodic_optimize())
+    start_ingest_workers()
+
     yield
 
     # Shutdown
     print("Shutting down OpenRecords...")
+    optimize_task.cancel()
+    await stop_ingest_workers()
+    _optimize_databases()
+    close_db_connections()
+    close_cache_db_connections()
+    await close_http_client()
+    await close_scrape_client()
+    shutdown_pdf_pool()
+    close_model_cache_client()
 
 
 # Create FastAPI app
@@ -64,8 +115,12 @@ app = FastAPI(
     description="Privacy-first, local-first record management system",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# Verify the session cookie once per request (runs inside CORS)
+app.add_middleware(AuthMiddleware)
+
 # Add CORS middleware
 cors_kwargs = {
     "allow_origins": settings.cors_origins_list,
@@ -1,4 +1,4 @@
 """Middleware package for OpenRecords."""
-from middleware.auth import get_current_user, optional_auth
+from middleware.auth import AuthMiddleware, get_current_user, optional_auth
 
-__all__ = ["get_current_user", "optional_auth"]
+__all__ = ["AuthMiddleware", "get_current_user", "optional_auth"]
@@ -2,13 +2,103 @@
 Authentication middleware for OpenRecords.
 Provides dependency injection for protected routes.
 """
+import time
+
 from fastapi import HTTPException, Request
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from models.auth import AuthContext
-from utils.auth import verify_jwt_token
+from utils.auth import decode_jwt_token
 
 COOKIE_NAME = "openrecords_session"
 
+# Verified tokens -> (auth context, exp timestamp), oldest first
+TOKEN_CACHE_MAX_ENTRIES = 10_000
+_token_cache: dict[str, tuple[AuthContext, int]] = {}
+
+# Logged-out tokens -> exp timestamp; kept only until they would expire anyway
+_revoked_tokens: dict[str, int] = {}
+
+
+def _resolve_token(token: str) -> AuthContext | None:
+    """
+    Return the AuthContext for a session token, or None if it is invalid.
+
+    A token's signature and claims cannot change, so once verified it is
+    cached until its exp timestamp and later requests skip PyJWT entirely.
+    """
+    now = int(time.time())
+
+    if token in _revoked_tokens:
+        return None
+
+    cached = _token_cache.get(token)
+    if cached is not None:
+        auth_context, exp = cached
+        if exp > now:
+            return auth_context
+        del _token_cache[token]
+
+    payload = decode_jwt_token(token)
+    if payload is None or payload.exp < now:
+        return None
+
+    auth_context = AuthContext(user_id=payload.sub, username=payload.username)
+
+    # Evict in insertion order once the cache is full
+    if len(_token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+        del _token_cache[next(iter(_token_cache))]
+    _token_cache[token] = (auth_context, payload.exp)
+
+    return auth_context
+
+
+def revoke_token(token: str) -> None:
+    """
+    Reject a session token from now until it expires.
+
+    Called on logout so the cached verification cannot keep a token alive.
+    """
+    now = int(time.time())
+
+    cached = _token_cache.pop(token, None)
+    if cached is not None:
+        exp = cached[1]
+    else:
+        payload = decode_jwt_token(token)
+        if payload is None:
+            return
+        exp = payload.exp
+
+    for revoked, revoked_exp in list(_revoked_tokens.items()):
+        if revoked_exp <= now:
+            del _revoked_tokens[revoked]
+
+    if exp > now:
+        _revoked_tokens[token] = exp
+
+
+class AuthMiddleware:
+    """
+    ASGI middleware that verifies the session cookie once per request.
+
+    The resulting AuthContext (or None) is stored on ``request.state.auth_context``
+    so that ``get_current_user`` and ``optional_auth`` never re-verify the token.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket"):
+            connection = HTTPConnection(scope)
+            token = connection.cookies.get(COOKIE_NAME)
+
+            connection.state.auth_context = _resolve_token(token) if token else None
+
+        await self.app(scope, receive, send)
+
 
 async def get_current_user(request: Request) -> AuthContext:
     """
@@ -19,27 +109,20 @@ async def get_current_user(request: Request) -> AuthContext:
         async def protected_route(user: AuthContext = Depends(get_current_user)):
             return {"message": f"Hello {user.username}"}
     """
-    # Extract token from cookie
-    token = request.cookies.get(COOKIE_NAME)
+    auth_context = getattr(request.state, "auth_context", None)
 
-    if not token:
-        raise HTTPException(
-            status_code=401,
-            detail="Authentication required",
-        )
-
-    # Verify token
-    is_valid, auth_context = verify_jwt_token(token)
+    if auth_context is None:
+        if not request.cookies.get(COOKIE_NAME):
+            raise HTTPException(
+                status_code=401,
+                detail="Authentication required",
+            )
 
-    if not is_valid or auth_context is None:
         raise HTTPException(
             status_code=401,
             detail="Invalid or expired token",
         )
 
-    # Store auth context in request state for potential use in routes
-    request.state.auth_context = auth_context
-
     return auth_context
 
 
@@ -50,15 +133,4 @@ async def optional_auth(request: Request) -> AuthContext | None:
     Returns auth context if user is authenticated, None otherwise.
     Does not raise an error if not authenticated.
     """
-    token = request.cookies.get(COOKIE_NAME)
-
-    if not token:
-        return None
-
-    is_valid, auth_context = verify_jwt_token(token)
-
-    if not is_valid:
-        return None
-
-    request.state.auth_context = auth_context
-    return auth_context
+    return getattr(request.state, "auth_context", None)
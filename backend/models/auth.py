@@ -3,12 +3,17 @@ Pydantic models for OpenRecords authentication.
 Handles request/response validation and serialization.
 """
 import re
+import string
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, Field, field_validator
 from pydantic.aliases import AliasChoices
 
+# Deletes every allowed character; anything left over is invalid
+_USERNAME_DISALLOWED = str.maketrans("", "", string.ascii_letters + string.digits + "_")
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
 
 class SignupRequest(BaseModel):
     """Request model for user signup."""
@@ -20,19 +25,28 @@ class SignupRequest(BaseModel):
         max_length=64,
         validation_alias=AliasChoices("full_name", "fullName"),
     )
-    email: EmailStr
+    email: str = Field(..., max_length=254)
     password: str = Field(..., min_length=8)
 
     @field_validator("username")
     @classmethod
     def validate_username(cls, v: str) -> str:
         """Validate username format - alphanumeric and underscore only."""
-        if not re.match(r"^[a-zA-Z0-9_]+$", v):
+        if not v or v.translate(_USERNAME_DISALLOWED):
             raise ValueError(
                 "Username must contain only alphanumeric characters and underscores"
             )
         return v
 
+    @field_validator("email")
+    @classmethod
+    def validate_email(cls, v: str) -> str:
+        """Validate email format - a single @ followed by a dotted domain."""
+        v = v.strip()
+        if not _EMAIL_RE.match(v):
+            raise ValueError("Invalid email address")
+        return v
+
     @field_validator("full_name")
     @classmethod
     def validate_full_name(cls, v: str) -> str:
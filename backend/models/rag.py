@@ -43,6 +43,7 @@ class InsightRequest(BaseModel):
     record_id: str = Field(..., min_length=1)
     prompt: Optional[str] = None  # optional user override
     model: Optional[str] = None   # optional model override
+    stream: bool = False          # stream the answer as server-sent events
 
 
 class InsightResponse(BaseModel):
@@ -52,4 +53,5 @@ class InsightResponse(BaseModel):
     insights: str
     document_count: int
     chunk_count: int
+    cached: bool = False
     model: Optional[str] = None
@@ -43,3 +43,5 @@ class RecordsListResponse(BaseModel):
     """Response model for listing records."""
 
     records: list[RecordResponse]
+    # Pass back as ?cursor= to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
@@ -1,12 +1,21 @@
 """
 Pydantic models for user settings and profile updates.
 """
-import re
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, Field, field_validator
 from pydantic.aliases import AliasChoices
 
+# Shared with the signup validators so both accept exactly the same values
+from models.auth import _EMAIL_RE, _USERNAME_DISALLOWED
+
+# Accept both snake_case and camelCase keys from the frontend
+_FULL_NAME_ALIAS = AliasChoices("full_name", "fullName")
+_CURRENT_PASSWORD_ALIAS = AliasChoices("current_password", "currentPassword")
+_NEW_PASSWORD_ALIAS = AliasChoices("new_password", "newPassword")
+_DEFAULT_CHAT_MODEL_ALIAS = AliasChoices("default_chat_model", "defaultChatModel")
+_DEFAULT_EMBED_MODEL_ALIAS = AliasChoices("default_embed_model", "defaultEmbedModel")
+
 
 class UserUpdateRequest(BaseModel):
     """Request model to update a user's profile."""
@@ -16,19 +25,29 @@ class UserUpdateRequest(BaseModel):
         default=None,
         min_length=2,
         max_length=64,
-        validation_alias=AliasChoices("full_name", "fullName"),
+        validation_alias=_FULL_NAME_ALIAS,
     )
-    email: Optional[EmailStr] = None
+    email: Optional[str] = Field(default=None, max_length=254)
 
     @field_validator("username")
     @classmethod
     def validate_username(cls, v: Optional[str]) -> Optional[str]:
         if v is None:
             return v
-        if not re.match(r"^[a-zA-Z0-9_]+$", v):
+        if not v or v.translate(_USERNAME_DISALLOWED):
             raise ValueError("Username must contain only alphanumeric characters and underscores")
         return v
 
+    @field_validator("email")
+    @classmethod
+    def validate_email(cls, v: Optional[str]) -> Optional[str]:
+        if v is None:
+            return v
+        v = v.strip()
+        if not _EMAIL_RE.match(v):
+            raise ValueError("Invalid email address")
+        return v
+
     @field_validator("full_name")
     @classmethod
     def validate_full_name(cls, v: Optional[str]) -> Optional[str]:
@@ -43,10 +62,10 @@ class PasswordChangeRequest(BaseModel):
     """Request model to change a user's password."""
 
     current_password: str = Field(
-        ..., min_length=1, validation_alias=AliasChoices("current_password", "currentPassword")
+        ..., min_length=1, validation_alias=_CURRENT_PASSWORD_ALIAS
     )
     new_password: str = Field(
-        ..., min_length=8, validation_alias=AliasChoices("new_password", "newPassword")
+        ..., min_length=8, validation_alias=_NEW_PASSWORD_ALIAS
     )
 
 
@@ -60,10 +79,10 @@ class UserSettingsUpdate(BaseModel):
     """Request model to update user settings."""
 
     default_chat_model: Optional[str] = Field(
-        default=None, validation_alias=AliasChoices("default_chat_model", "defaultChatModel")
+        default=None, validation_alias=_DEFAULT_CHAT_MODEL_ALIAS
     )
     default_embed_model: Optional[str] = Field(
-        default=None, validation_alias=AliasChoices("default_embed_model", "defaultEmbedModel")
+        default=None, validation_alias=_DEFAULT_EMBED_MODEL_ALIAS
     )
     theme: Optional[str] = None
     temperature: Optional[float] = None
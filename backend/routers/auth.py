@@ -3,26 +3,30 @@ Authentication router for OpenRecords.
 Handles signup, login, and logout endpoints.
 """
 from fastapi import APIRouter, HTTPException, Request, Response
-from fastapi.responses import JSONResponse
 
+from config import settings
 from database import get_db_cursor
+from middleware.auth import revoke_token
+from routers.users import remember_user_profile
 from models.auth import AuthResponse, LoginRequest, SignupRequest
 from utils.auth import (
     create_jwt_token,
     generate_user_id,
     get_current_timestamp,
     hash_password,
+    password_needs_rehash,
     verify_password,
 )
-from utils.encryption import encrypt_master_key, generate_user_master_key
+from utils.encryption import encrypt_master_key, forget_cached_user_key, generate_user_master_key
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 COOKIE_NAME = "openrecords_session"
+SECURE_COOKIE = not settings.is_dev
 
 
 @router.post("/signup", response_model=AuthResponse)
-async def signup(request: Request, signup_data: SignupRequest):
+def signup(signup_data: SignupRequest):
     """
     Register a new user.
 
@@ -31,21 +35,18 @@ async def signup(request: Request, signup_data: SignupRequest):
     """
     try:
         with get_db_cursor() as cursor:
-            # Check if username already exists
+            # Check if username or email already exists (at most two rows)
             cursor.execute(
-                "SELECT id FROM users WHERE username = ?", (signup_data.username,)
+                "SELECT username FROM users WHERE username = ? OR email = ?",
+                (signup_data.username, signup_data.email),
             )
-            if cursor.fetchone():
+            existing = cursor.fetchall()
+            if any(row[0] == signup_data.username for row in existing):
                 raise HTTPException(
                     status_code=409,
                     detail="Username already exists",
                 )
-
-            # Check if email already exists
-            cursor.execute(
-                "SELECT id FROM users WHERE email = ?", (signup_data.email,)
-            )
-            if cursor.fetchone():
+            if existing:
                 raise HTTPException(
                     status_code=409,
                     detail="Email already registered",
@@ -93,18 +94,18 @@ async def signup(request: Request, signup_data: SignupRequest):
                 last_login=None,
             )
 
-            response = JSONResponse(
-                content=AuthResponse(status="ok", user_id=user_id, user=user_public).model_dump(),
+            response = Response(
+                content=AuthResponse(status="ok", user_id=user_id, user=user_public).model_dump_json(),
                 status_code=200,
+                media_type="application/json",
             )
 
             # Set HTTP-only cookie
-            secure = not request.app.state.settings.is_dev
             response.set_cookie(
                 key=COOKIE_NAME,
                 value=token,
                 httponly=True,
-                secure=secure,
+                secure=SECURE_COOKIE,
                 samesite="lax",
                 max_age=60 * 60 * 24 * 30,  # 30 days
             )
@@ -118,7 +119,7 @@ async def signup(request: Request, signup_data: SignupRequest):
 
 
 @router.post("/login")
-async def login(request: Request, login_data: LoginRequest):
+def login(login_data: LoginRequest):
     """
     Authenticate an existing user.
 
@@ -126,70 +127,88 @@ async def login(request: Request, login_data: LoginRequest):
     """
     try:
         with get_db_cursor() as cursor:
-            # Find user by email or username
+            # Find user by email or username (usernames never contain "@")
+            lookup_column = "email" if "@" in login_data.email_or_username else "username"
             cursor.execute(
-                """
+                f"""
                 SELECT id, username, password_hash, full_name, email, created_at
                 FROM users
-                WHERE username = ? OR email = ?
+                WHERE {lookup_column} = ?
                 """,
-                (login_data.email_or_username, login_data.email_or_username),
+                (login_data.email_or_username,),
             )
 
             row = cursor.fetchone()
 
-            if not row:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid credentials",
-                )
-
-            user_id, username, password_hash, full_name, email, created_at = row
-
-            # Verify password
-            if not verify_password(login_data.password, password_hash):
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid credentials",
-                )
-
-            # Update last_login
-            current_time = get_current_timestamp()
-            cursor.execute(
-                "UPDATE users SET last_login = ? WHERE id = ?",
-                (current_time, user_id),
+        if not row:
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid credentials",
             )
 
-            # Create new JWT token
-            token = create_jwt_token(user_id, username)
+        user_id, username, password_hash, full_name, email, created_at = row
 
-            from models.auth import UserPublic
-            user_public = UserPublic(
-                id=user_id,
-                username=username,
-                full_name=full_name,
-                email=email,
-                created_at=created_at,
-                last_login=current_time,
+        # Argon2 runs outside any transaction so the SQLite writer lock is never
+        # held for a hash
+        if not verify_password(login_data.password, password_hash):
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid credentials",
             )
 
-            response = JSONResponse(
-                content=AuthResponse(status="ok", user_id=user_id, user=user_public).model_dump(),
-                status_code=200,
-            )
+        # Upgrade hashes made with older Argon2 parameters while we have the password
+        new_password_hash = (
+            hash_password(login_data.password)
+            if password_needs_rehash(password_hash)
+            else None
+        )
 
-            # Set HTTP-only cookie
-            secure = not request.app.state.settings.is_dev
-            response.set_cookie(
-                key=COOKIE_NAME,
-                value=token,
-                httponly=True,
-                secure=secure,
-                samesite="lax",
-                max_age=60 * 60 * 24 * 30,  # 30 days
+        # Update last_login (and the rehashed password) in one short transaction
+        current_time = get_current_timestamp()
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE users SET last_login = ? WHERE id = ?",
+                (current_time, user_id),
             )
+            if new_password_hash is not None:
+                # Only replace the hash that was verified, so a password change
+                # committed meanwhile is never overwritten
+                cursor.execute(
+                    "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                    (new_password_hash, user_id, password_hash),
+                )
 
-            return response
+        # Create new JWT token
+        token = create_jwt_token(user_id, username)
+
+        from models.auth import UserPublic
+        user_public = UserPublic(
+            id=user_id,
+            username=username,
+            full_name=full_name,
+            email=email,
+            created_at=created_at,
+            last_login=current_time,
+        )
+        remember_user_profile(user_public)
+
+        response = Response(
+            content=AuthResponse(status="ok", user_id=user_id, user=user_public).model_dump_json(),
+            status_code=200,
+            media_type="application/json",
+        )
+
+        # Set HTTP-only cookie
+        response.set_cookie(
+            key=COOKIE_NAME,
+            value=token,
+            httponly=True,
+            secure=SECURE_COOKIE,
+            samesite="lax",
+            max_age=60 * 60 * 24 * 30,  # 30 days
+        )
+
+        return response
 
     except HTTPException:
         raise
@@ -198,15 +217,32 @@ async def login(request: Request, login_data: LoginRequest):
 
 
 @router.post("/logout")
-async def logout():
+def logout(request: Request):
     """
     Log out the current user.
 
-    Clears the session cookie.
+    Revokes the session token, clears the cookie and drops the user's
+    cached master key.
     """
-    response = JSONResponse(
-        content=AuthResponse(status="ok").model_dump(),
+    token = request.cookies.get(COOKIE_NAME)
+    if token:
+        revoke_token(token)
+
+    auth_context = getattr(request.state, "auth_context", None)
+    if auth_context is not None:
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "SELECT encrypted_master_key FROM users WHERE id = ?",
+                (auth_context.user_id,),
+            )
+            user_row = cursor.fetchone()
+        if user_row is not None:
+            forget_cached_user_key(user_row[0])
+
+    response = Response(
+        content=AuthResponse(status="ok").model_dump_json(),
         status_code=200,
+        media_type="application/json",
     )
 
     # Clear the cookie
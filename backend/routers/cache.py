@@ -7,6 +7,6 @@ router = APIRouter(prefix="/api/cache", tags=["cache"])
 
 
 @router.get("/status")
-async def cache_status():
+def cache_status():
     """Return cache system status."""
     return {"status": "ok"}
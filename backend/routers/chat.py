@@ -2,10 +2,10 @@
 Chat messages router for OpenRecords.
 Persists and retrieves chat history per record.
 """
-import json
 import logging
 from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 
@@ -52,41 +52,49 @@ class ChatHistoryResponse(BaseModel):
     messages: List[ChatMessageOut]
 
 
+# ─── Helpers ─────────────────────────────────────────
+
+def _owns_record(cursor, record_id: str, user_id: str) -> bool:
+    """Check whether a record exists and belongs to the user."""
+    cursor.execute(
+        "SELECT 1 FROM records WHERE id = ? AND user_id = ?",
+        (record_id, user_id),
+    )
+    return cursor.fetchone() is not None
+
+
 # ─── Endpoints ───────────────────────────────────────
 
 @router.get("/{record_id}", response_model=ChatHistoryResponse)
-async def get_chat_history(
+def get_chat_history(
     record_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
     """Get all chat messages for a record."""
-    # Verify record ownership
     with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
-            (record_id, user.user_id),
-        )
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
+        # Ownership is enforced by the join; only an empty result needs a second look
         cursor.execute(
             """
-            SELECT id, role, content, sources, model, created_at
-            FROM chat_messages
-            WHERE record_id = ?
-            ORDER BY created_at ASC
+            SELECT m.id, m.role, m.content, m.sources, m.model, m.created_at
+            FROM chat_messages m
+            JOIN records r ON r.id = m.record_id
+            WHERE m.record_id = ? AND r.user_id = ?
+            ORDER BY m.created_at ASC
             """,
-            (record_id,),
+            (record_id, user.user_id),
         )
         rows = cursor.fetchall()
 
+        if not rows and not _owns_record(cursor, record_id, user.user_id):
+            raise HTTPException(status_code=404, detail="Record not found")
+
     messages = []
     for row in rows:
         sources = None
         if row[3]:
             try:
-                sources = json.loads(row[3])
-            except (json.JSONDecodeError, TypeError):
+                sources = orjson.loads(row[3])
+            except (orjson.JSONDecodeError, TypeError):
                 sources = None
 
         messages.append(ChatMessageOut(
@@ -102,7 +110,7 @@ async def get_chat_history(
 
 
 @router.post("/{record_id}", response_model=ChatHistoryResponse)
-async def save_chat_messages(
+def save_chat_messages(
     record_id: str,
     payload: SaveMessagesRequest,
     user: AuthContext = Depends(get_current_user),
@@ -123,36 +131,58 @@ async def save_chat_messages(
         # Delete existing messages and replace
         cursor.execute("DELETE FROM chat_messages WHERE record_id = ?", (record_id,))
 
-        for msg in payload.messages:
-            sources_json = json.dumps(msg.sources) if msg.sources else None
-            cursor.execute(
-                """
-                INSERT INTO chat_messages (id, record_id, role, content, sources, model, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (msg.id, record_id, msg.role, msg.content, sources_json, msg.model, msg.timestamp),
+        rows = [
+            (
+                msg.id,
+                record_id,
+                msg.role,
+                msg.content,
+                orjson.dumps(msg.sources).decode() if msg.sources else None,
+                msg.model,
+                msg.timestamp,
             )
+            for msg in payload.messages
+        ]
+        cursor.executemany(
+            """
+            INSERT INTO chat_messages (id, record_id, role, content, sources, model, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
 
     logger.info("Saved %d messages for record %s", len(payload.messages), record_id)
 
-    # Return saved messages
-    return await get_chat_history(record_id, user)
+    # Return saved messages in stored order without re-reading them
+    messages = [
+        ChatMessageOut(
+            id=msg.id,
+            role=msg.role,
+            content=msg.content,
+            sources=msg.sources or None,
+            model=msg.model,
+            timestamp=msg.timestamp,
+        )
+        for msg in sorted(payload.messages, key=lambda m: m.timestamp)
+    ]
+    return ChatHistoryResponse(record_id=record_id, messages=messages)
 
 
 @router.delete("/{record_id}")
-async def clear_chat_history(
+def clear_chat_history(
     record_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
     """Clear all chat messages for a record."""
     with get_db_cursor() as cursor:
         cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
+            """
+            DELETE FROM chat_messages
+            WHERE record_id = (SELECT id FROM records WHERE id = ? AND user_id = ?)
+            """,
             (record_id, user.user_id),
         )
-        if cursor.fetchone() is None:
+        if cursor.rowcount == 0 and not _owns_record(cursor, record_id, user.user_id):
             raise HTTPException(status_code=404, detail="Record not found")
 
-        cursor.execute("DELETE FROM chat_messages WHERE record_id = ?", (record_id,))
-
     return {"status": "ok", "detail": "Chat history cleared"}
@@ -2,27 +2,31 @@
 Document upload router for OpenRecords.
 Full multi-format parsing pipeline with background processing.
 """
+import asyncio
 import hashlib
 import logging
 import uuid
 from pathlib import Path
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
 from config import settings
-from database import get_db_cursor
+from database import bulk_insert, get_db_cursor
 from middleware.auth import get_current_user
 from models.auth import AuthContext
 from models.documents import DocumentInfo, DocumentsListResponse, DocumentUploadResponse
+from services.ingest_queue import enqueue_ingest_job
 from utils.auth import get_current_timestamp
 from utils.chunking import chunk_pages, count_tokens
 from utils.encryption import (
-    decrypt_master_key,
     encrypt_bytes_with_user_key,
-    encrypt_text_with_user_key,
+    encrypt_texts_with_user_key,
+    get_cached_user_key,
 )
+from utils.keyword_index import index_chunk_terms
 from utils.openrouter import get_embeddings
 from utils.parsing import SUPPORTED_EXTENSIONS, detect_extension, extract_text
+from utils.storage import write_private_file
 from utils.vectordb import add_vectors
 
 logger = logging.getLogger(__name__)
@@ -30,6 +34,10 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# User vault directories already created by this process
+_known_user_dirs: set[str] = set()
 
 
 async def _process_document(
@@ -46,10 +54,11 @@ async def _process_document(
     Updates document status in the database throughout.
     """
     try:
-        user_key = decrypt_master_key(encrypted_master_key)
+        user_key = get_cached_user_key(encrypted_master_key)
 
         # 1. Extract text
-        pages = extract_text(raw_bytes, extension)
+        # Extraction may wait on the PDF worker pool, so keep it off the event loop
+        pages = await asyncio.to_thread(extract_text, raw_bytes, extension)
         if not pages:
             _set_document_error(document_id, "No extractable text found in file")
             return
@@ -64,34 +73,28 @@ async def _process_document(
             _set_document_error(document_id, "Failed to create text chunks")
             return
 
-        # 3. Encrypt and store chunks
-        chunk_ids: list[str] = []
-        chunk_texts: list[str] = []
+        # 3. Encrypt (off the event loop) and store chunks
+        chunk_ids = [f"chunk_{uuid.uuid4().hex}" for _ in chunks]
+        chunk_texts = [chunk.text for chunk in chunks]
+        encrypted_texts = await asyncio.to_thread(
+            encrypt_texts_with_user_key, user_key, chunk_texts
+        )
 
-        with get_db_cursor() as cursor:
-            for chunk in chunks:
-                chunk_id = f"chunk_{uuid.uuid4().hex}"
-                encrypted_chunk = encrypt_text_with_user_key(user_key, chunk.text)
-
-                cursor.execute(
-                    """
-                    INSERT INTO chunks (
-                        id, document_id, encrypted_text, token_count,
-                        chunk_index, page_number, section
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        chunk_id,
-                        document_id,
-                        encrypted_chunk,
-                        chunk.token_count,
-                        chunk.index,
-                        chunk.page_number,
-                        chunk.section,
-                    ),
-                )
-                chunk_ids.append(chunk_id)
-                chunk_texts.append(chunk.text)
+        chunk_rows = [
+            {
+                "id": chunk_id,
+                "document_id": document_id,
+                "encrypted_text": encrypted_text,
+                "token_count": chunk.token_count,
+                "chunk_index": chunk.index,
+                "page_number": chunk.page_number,
+                "section": chunk.section,
+            }
+            for chunk_id, encrypted_text, chunk in zip(chunk_ids, encrypted_texts, chunks)
+        ]
+
+        bulk_insert("chunks", chunk_rows)
+        await asyncio.to_thread(index_chunk_terms, user_key, record_id, chunk_ids, chunk_texts)
 
         # 4. Generate embeddings
         embeddings = await get_embeddings(chunk_texts)
@@ -121,10 +124,10 @@ async def _process_document(
             cursor.execute(
                 """
                 UPDATE documents
-                SET status = 'indexed', page_count = ?, token_count = ?
+                SET status = 'indexed', page_count = ?, token_count = ?, chunk_count = ?
                 WHERE id = ?
                 """,
-                (page_count, total_tokens, document_id),
+                (page_count, total_tokens, len(chunks), document_id),
             )
 
         logger.info(
@@ -137,6 +140,37 @@ async def _process_document(
         _set_document_error(document_id, str(e)[:500])
 
 
+async def _read_upload(file: UploadFile) -> tuple[bytes, str]:
+    """
+    Hash and size-check an upload in fixed-size chunks, then read it once.
+    Oversized files are rejected as soon as they cross MAX_FILE_SIZE, and
+    only one full copy of the content is ever held in memory.
+    """
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+
+    hasher = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+        hasher.update(chunk)
+
+    # The spooled upload is seekable, so the checked content is read back in one go
+    await file.seek(0)
+    return await file.read(), hasher.hexdigest()
+
+
+def _user_vault_dir(user_id: str) -> Path:
+    """Return the user's vault directory, creating it on first use."""
+    user_dir = settings.vault_path / user_id
+    if user_id not in _known_user_dirs:
+        user_dir.mkdir(parents=True, exist_ok=True)
+        _known_user_dirs.add(user_id)
+    return user_dir
+
+
 def _set_document_error(document_id: str, error: str) -> None:
     """Set document status to error."""
     with get_db_cursor() as cursor:
@@ -148,32 +182,12 @@ def _set_document_error(document_id: str, error: str) -> None:
 
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
-    background_tasks: BackgroundTasks,
     record_id: str = Form(...),
     file: UploadFile = File(...),
     user: AuthContext = Depends(get_current_user),
 ):
     """Upload a document and kick off background processing."""
 
-    # Validate record ownership
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
-            (record_id, user.user_id),
-        )
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        row = cursor.fetchone()
-        if row is None:
-            raise HTTPException(status_code=404, detail="User not found")
-
-    encrypted_master_key = row[0]
-
     # Validate file type
     filename = file.filename or "document"
     content_type = file.content_type
@@ -185,30 +199,39 @@ async def upload_document(
             detail=f"Unsupported file type. Supported: {', '.join(SUPPORTED_EXTENSIONS)}",
         )
 
-    # Read and validate size
-    raw_bytes = await file.read()
+    # Read, hash and validate size (before touching the shared connection)
+    raw_bytes, file_hash = await _read_upload(file)
     if not raw_bytes:
         raise HTTPException(status_code=400, detail="Empty file")
-    if len(raw_bytes) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
 
-    # Compute hash and create document record
-    user_key = decrypt_master_key(encrypted_master_key)
-    file_hash = hashlib.sha256(raw_bytes).hexdigest()
     document_id = f"doc_{uuid.uuid4().hex}"
     created_at = get_current_timestamp()
 
-    # Store encrypted file on disk
-    vault_root = settings.vault_path
-    user_dir = Path(vault_root) / user.user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    encrypted_path = user_dir / f"{document_id}.bin"
+    with get_db_cursor() as cursor:
+        # Validate record ownership and fetch the user's key in one query
+        cursor.execute(
+            """
+            SELECT u.encrypted_master_key
+            FROM records r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.id = ? AND r.user_id = ?
+            """,
+            (record_id, user.user_id),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Record not found")
+
+        encrypted_master_key = row[0]
+        user_key = get_cached_user_key(encrypted_master_key)
 
-    encrypted_bytes = encrypt_bytes_with_user_key(user_key, raw_bytes)
-    encrypted_path.write_bytes(encrypted_bytes)
+        # Store encrypted file on disk
+        encrypted_path = _user_vault_dir(user.user_id) / f"{document_id}.bin"
 
-    # Insert document record with status = 'processing'
-    with get_db_cursor() as cursor:
+        encrypted_bytes = encrypt_bytes_with_user_key(user_key, raw_bytes)
+        write_private_file(encrypted_path, encrypted_bytes)
+
+        # Insert document record with status = 'processing'
         cursor.execute(
             """
             INSERT INTO documents (
@@ -220,7 +243,7 @@ async def upload_document(
         )
 
     # Kick off background processing
-    background_tasks.add_task(
+    enqueue_ingest_job(
         _process_document,
         document_id=document_id,
         record_id=record_id,
@@ -240,7 +263,7 @@ async def upload_document(
 
 
 @router.get("/list/{record_id}", response_model=DocumentsListResponse)
-async def list_documents(
+def list_documents(
     record_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -256,22 +279,20 @@ async def list_documents(
         cursor.execute(
             """
             SELECT
-                documents.id,
-                documents.record_id,
-                documents.filename,
-                documents.hash,
-                documents.source_type,
-                documents.status,
-                documents.page_count,
-                documents.token_count,
-                documents.error_message,
-                documents.created_at,
-                COUNT(chunks.id) as chunk_count
+                id,
+                record_id,
+                filename,
+                hash,
+                source_type,
+                status,
+                page_count,
+                token_count,
+                error_message,
+                created_at,
+                chunk_count
             FROM documents
-            LEFT JOIN chunks ON chunks.document_id = documents.id
-            WHERE documents.record_id = ?
-            GROUP BY documents.id
-            ORDER BY documents.created_at DESC
+            WHERE record_id = ?
+            ORDER BY created_at DESC
             """,
             (record_id,),
         )
@@ -298,7 +319,7 @@ async def list_documents(
 
 
 @router.get("/status/{document_id}")
-async def document_status(
+def document_status(
     document_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -2,37 +2,292 @@
 RAG query router for OpenRecords.
 Hybrid retrieval (vector + regex/keyword) + LLM generation via OpenRouter.
 """
+import asyncio
+import hashlib
 import logging
+import os
+import re
+import sqlite3
 
 from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from typing import List, Optional, Literal
 from pydantic import BaseModel
-import base64
-from io import BytesIO
+import pybase64
+from io import BytesIO, StringIO
+from itertools import groupby
+from pathlib import Path
 from datetime import datetime
 import uuid
 import httpx
-import fitz
+import img2pdf
+import orjson
 
+from config import settings
 from database import get_db_cursor
 from middleware.auth import get_current_user
 from models.auth import AuthContext
 from models.rag import RagQueryRequest, RagQueryResponse, RagSource, InsightRequest, InsightResponse
-from utils.encryption import decrypt_master_key, decrypt_text_with_user_key
+from utils.encryption import (
+    decrypt_text_with_user_key,
+    decrypt_texts_with_user_key,
+    encrypt_text_with_user_key,
+    get_cached_user_key,
+)
 from utils.auth import get_current_timestamp
+from utils.chunking import truncate_tokens
 from utils.openrouter import (
     chat_completion,
+    chat_completion_stream,
     get_embeddings,
+    get_http_client,
+    is_fallback_reply,
+    openrouter_headers,
+    openrouter_post,
+    ChatStreamStatus,
     DEFAULT_CHAT_MODEL,
-    OPENROUTER_HTTP_REFERER,
-    OPENROUTER_X_TITLE,
 )
-from utils.retrieval import hybrid_retrieve
+from utils.keyword_index import is_record_indexed, search_keyword_index
+from utils.retrieval import extract_query_terms, hybrid_retrieve
+from utils.storage import write_private_file
+from utils.vectordb import query_vectors
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/rag", tags=["rag"])
 
+
+# Collapses newlines/runs of whitespace in source snippets
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Chunk rows fetched (and decrypted) per batch when reading a whole record
+CHUNK_FETCH_BATCH_SIZE = 512
+
+
+def _load_owned_record(record_id: str, user_id: str) -> sqlite3.Row:
+    """
+    Look up a record's chat model and its owner's wrapped master key.
+    Raises 404 if the record does not exist or belongs to someone else.
+    Async handlers call this through asyncio.to_thread so SQLite never blocks the event loop.
+    """
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT r.chat_model, u.encrypted_master_key
+            FROM records r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.id = ? AND r.user_id = ?
+            """,
+            (record_id, user_id),
+        )
+        record_row = cursor.fetchone()
+    if record_row is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+    return record_row
+
+
+def _load_decrypted_chunk_rows(user_key: bytes, sql: str, params: tuple | list) -> list[tuple]:
+    """
+    Run a chunk query whose first column is ``encrypted_text`` and decrypt it
+    batch by batch, so only one batch of ciphertext is alive at a time.
+    Returns the rows with the first column replaced by the plaintext, or None
+    for chunks that fail to decrypt.
+    """
+    decrypted_rows: list[tuple] = []
+    with get_db_cursor() as cursor:
+        cursor.arraysize = CHUNK_FETCH_BATCH_SIZE
+        cursor.execute(sql, params)
+        while batch := cursor.fetchmany():
+            plain_texts = decrypt_texts_with_user_key(user_key, [row[0] for row in batch])
+            decrypted_rows.extend(
+                (plain_text, *row[1:]) for row, plain_text in zip(batch, plain_texts)
+            )
+    return decrypted_rows
+
+
+async def _fetch_decrypted_chunk_rows(user_key: bytes, sql: str, params: tuple | list) -> list[tuple]:
+    """Fetch and decrypt chunk rows in a worker thread so large records don't block the event loop."""
+    return await asyncio.to_thread(_load_decrypted_chunk_rows, user_key, sql, params)
+
+
+async def _build_documents_block(user_key: bytes, record_id: str) -> tuple[str, int, int]:
+    """
+    Decrypt every chunk of a record and join them back into full documents.
+
+    Chunks arrive ordered by filename and chunk index, so each document is
+    emitted once as a ``### Document:`` section straight into a buffer.
+    Returns (documents_block, document_count, chunk_count).
+    """
+    chunk_rows = await _fetch_decrypted_chunk_rows(
+        user_key,
+        """
+        SELECT c.encrypted_text, c.id, d.filename
+        FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE d.record_id = ?
+        ORDER BY d.filename, c.chunk_index
+        """,
+        (record_id,),
+    )
+
+    buf = StringIO()
+    document_count = 0
+    chunk_count = 0
+    for filename, rows in groupby(chunk_rows, key=lambda row: row[2] or "unknown"):
+        has_text = False
+        for plain_text, chunk_id, _ in rows:
+            if plain_text is None:
+                logger.warning("Failed to decrypt chunk %s", chunk_id)
+                continue
+            if has_text:
+                buf.write("\n")
+            else:
+                buf.write(f"\n\n---\n### Document: {filename}\n\n")
+                document_count += 1
+                has_text = True
+            buf.write(plain_text)
+            chunk_count += 1
+
+    return buf.getvalue().strip(), document_count, chunk_count
+
+
+def _query_chunk_sql(record_id: str, chunk_ids: Optional[list[str]] = None) -> tuple[str, list]:
+    """Build the query_rag chunk (+ document info) query, optionally only for the given ids."""
+    sql = """
+        SELECT c.encrypted_text, c.id, c.page_number, c.section,
+               d.id, d.filename
+        FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE d.record_id = ?
+    """
+    params: list = [record_id]
+    if chunk_ids is not None:
+        sql += f" AND c.id IN ({', '.join('?' for _ in chunk_ids)})"
+        params.extend(chunk_ids)
+    return sql, params
+
+
+def _sse_event(data: dict, event: Optional[str] = None) -> bytes:
+    """Encode one server-sent event frame."""
+    frame = b"data: " + orjson.dumps(data) + b"\n\n"
+    return f"event: {event}\n".encode() + frame if event else frame
+
+
+def _answer_cache_hash(user_key: bytes, messages: list[dict]) -> str:
+    """Keyed hash of a full prompt, so identical corpora + prompts map to one cache row."""
+    return hashlib.blake2b(orjson.dumps(messages), key=user_key, digest_size=16).hexdigest()
+
+
+def _load_cached_answer(user_key: bytes, record_id: str, kind: str, model: str, content_hash: str) -> Optional[str]:
+    """Return a previously generated answer for this exact prompt, if any."""
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT encrypted_answer FROM rag_cache
+            WHERE record_id = ? AND kind = ? AND model = ? AND content_hash = ?
+            """,
+            (record_id, kind, model, content_hash),
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+    try:
+        return decrypt_text_with_user_key(user_key, row[0])
+    except Exception:
+        logger.warning("Failed to decrypt cached %s for record %s", kind, record_id)
+        return None
+
+
+def _store_cached_answer(
+    user_key: bytes, record_id: str, kind: str, model: str, content_hash: str, answer: str
+) -> None:
+    """Cache an answer, replacing any older answer of the same kind and model for the record."""
+    if not answer or is_fallback_reply(answer):
+        return
+
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM rag_cache WHERE record_id = ? AND kind = ? AND model = ?",
+            (record_id, kind, model),
+        )
+        cursor.execute(
+            """
+            INSERT INTO rag_cache (record_id, kind, model, content_hash, encrypted_answer, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record_id,
+                kind,
+                model,
+                content_hash,
+                encrypt_text_with_user_key(user_key, answer),
+                get_current_timestamp(),
+            ),
+        )
+
+
+async def _cached_chat_completion(
+    user_key: bytes,
+    record_id: str,
+    kind: str,
+    messages: list[dict],
+    model: str,
+    max_tokens: int,
+) -> tuple[str, bool]:
+    """
+    Run a full-corpus chat completion unless the same prompt was answered
+    before. Returns (answer, cached).
+    """
+    content_hash = _answer_cache_hash(user_key, messages)
+    cached_answer = await asyncio.to_thread(_load_cached_answer, user_key, record_id, kind, model, content_hash)
+    if cached_answer is not None:
+        return cached_answer, True
+
+    answer = await chat_completion(messages=messages, model=model, max_tokens=max_tokens)
+    await asyncio.to_thread(_store_cached_answer, user_key, record_id, kind, model, content_hash, answer)
+    return answer, False
+
+
+async def _stream_completion_response(
+    user_key: bytes,
+    record_id: str,
+    kind: str,
+    messages: list[dict],
+    model: str,
+    max_tokens: int,
+    meta: dict,
+) -> StreamingResponse:
+    """
+    Stream a chat completion as SSE: one ``meta`` event, then ``{"delta": ...}``
+    frames as tokens arrive, then a final ``done`` event. A cached answer is
+    sent as a single delta; an answer is cached only if the stream completed cleanly.
+    """
+    content_hash = _answer_cache_hash(user_key, messages)
+    cached_answer = await asyncio.to_thread(_load_cached_answer, user_key, record_id, kind, model, content_hash)
+
+    async def _events():
+        yield _sse_event({**meta, "cached": cached_answer is not None}, event="meta")
+        if cached_answer is not None:
+            yield _sse_event({"delta": cached_answer})
+        else:
+            parts: list[str] = []
+            status = ChatStreamStatus()
+            async for text in chat_completion_stream(
+                messages=messages, model=model, max_tokens=max_tokens, status=status
+            ):
+                parts.append(text)
+                yield _sse_event({"delta": text})
+            # A stream cut short (error text or no [DONE]) must not be served from cache later
+            if status.completed:
+                await asyncio.to_thread(
+                    _store_cached_answer, user_key, record_id, kind, model, content_hash, "".join(parts)
+                )
+        yield _sse_event({}, event="done")
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
 RAG_SYSTEM_PROMPT = """You are a helpful research assistant for OpenRecords.
 Use the following sources to answer the user's question.
 If the sources don't contain enough information to answer, say so honestly.
@@ -53,25 +308,10 @@ async def query_rag(
     """RAG query: embed query → vector search → decrypt → LLM generation."""
 
     # Validate record ownership
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id, chat_model FROM records WHERE id = ? AND user_id = ?",
-            (payload.record_id, user.user_id),
-        )
-        record_row = cursor.fetchone()
-        if record_row is None:
-            raise HTTPException(status_code=404, detail="Record not found")
+    record_row = await asyncio.to_thread(_load_owned_record, payload.record_id, user.user_id)
 
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
-
-    record_chat_model = record_row[1]
-    user_key = decrypt_master_key(user_row[0])
+    record_chat_model = record_row[0]
+    user_key = get_cached_user_key(record_row[1])
     query_text = payload.query.strip()
 
     # 1. Embed the query
@@ -81,25 +321,38 @@ async def query_rag(
 
     query_embedding = query_embeddings[0]
 
-    # 2. Decrypt all chunks for this record (needed for keyword search)
-    decrypted_chunks: dict[str, tuple[str, dict]] = {}
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT c.id, c.encrypted_text, c.page_number, c.section,
-                   d.id, d.filename
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
-            WHERE d.record_id = ?
-            """,
-            (payload.record_id,),
+    # 2. Decrypt chunks for keyword scoring. With a complete keyword index only
+    #    the vector + blind-keyword candidates are decrypted, not the whole record.
+    candidate_top_k = payload.top_k * 3
+    # Both lookups block (a cold vector cache may build the ANN index), so they
+    # run off the event loop
+    vector_hits = await asyncio.to_thread(
+        query_vectors,
+        record_id=payload.record_id,
+        query_embedding=query_embedding,
+        top_k=candidate_top_k,
+    )
+    use_keyword_index = await asyncio.to_thread(is_record_indexed, payload.record_id)
+
+    if use_keyword_index:
+        exact_phrases, keywords = extract_query_terms(query_text)
+        keyword_ids = await asyncio.to_thread(
+            search_keyword_index,
+            user_key, payload.record_id, exact_phrases + keywords, limit=candidate_top_k,
         )
-        chunk_rows = cursor.fetchall()
+        candidate_ids = list({hit["id"] for hit in vector_hits} | set(keyword_ids))
+        chunk_rows = (
+            await _fetch_decrypted_chunk_rows(user_key, *_query_chunk_sql(payload.record_id, candidate_ids))
+            if candidate_ids
+            else []
+        )
+    else:
+        chunk_rows = await _fetch_decrypted_chunk_rows(user_key, *_query_chunk_sql(payload.record_id))
 
-    for chunk_id, encrypted_text, page_number, section, document_id, filename in chunk_rows:
-        try:
-            plain_text = decrypt_text_with_user_key(user_key, encrypted_text)
-        except Exception:
+    decrypted_chunks: dict[str, tuple[str, dict]] = {}
+
+    for plain_text, chunk_id, page_number, section, document_id, filename in chunk_rows:
+        if plain_text is None:
             logger.warning("Failed to decrypt chunk %s", chunk_id)
             continue
         decrypted_chunks[chunk_id] = (
@@ -112,7 +365,7 @@ async def query_rag(
             },
         )
 
-    if not decrypted_chunks:
+    if not decrypted_chunks and not use_keyword_index:
         return RagQueryResponse(
             status="ok",
             answer="No documents found in this record. Upload some files first.",
@@ -128,6 +381,8 @@ async def query_rag(
         query_embedding=query_embedding,
         decrypted_chunks=decrypted_chunks,
         top_k=payload.top_k,
+        vector_top_k=candidate_top_k,
+        vector_hits=vector_hits,
     )
 
     if not hits:
@@ -139,35 +394,31 @@ async def query_rag(
             model=None,
         )
 
-    # 4. Build sources list
+    # 4. Build sources list and the prompt's sources block in one pass
     sources: list[RagSource] = []
-    source_texts: list[str] = []
+    sources_buf = StringIO()
 
-    for hit in hits:
+    for i, hit in enumerate(hits, 1):
         meta = hit.metadata
-        snippet = hit.document[:500].strip().replace("\n", " ")
+        snippet = _WHITESPACE_RE.sub(" ", hit.document[:500]).strip()
         # Combined score: RRF is the primary, but expose vector & keyword too
         score = round(hit.rrf_score, 4) if hit.rrf_score else round(hit.vector_score, 4)
 
-        sources.append(
-            RagSource(
-                document_id=meta.get("document_id", ""),
-                filename=meta.get("filename", "unknown"),
-                chunk_id=hit.chunk_id,
-                snippet=snippet,
-                score=score,
-                page_number=meta.get("page_number"),
-                section=meta.get("section"),
-            )
+        src = RagSource(
+            document_id=meta.get("document_id", ""),
+            filename=meta.get("filename", "unknown"),
+            chunk_id=hit.chunk_id,
+            snippet=snippet,
+            score=score,
+            page_number=meta.get("page_number"),
+            section=meta.get("section"),
         )
-        source_texts.append(hit.document)
+        sources.append(src)
 
-    # 5. Build prompt and call LLM
-    sources_text = ""
-    for i, (src, text) in enumerate(zip(sources, source_texts), 1):
         page_info = f" (page {src.page_number})" if src.page_number else ""
-        sources_text += f"[Source {i}: {src.filename}{page_info}]\n{text}\n\n"
+        sources_buf.write(f"[Source {i}: {src.filename}{page_info}]\n{hit.document}\n\n")
 
+    # 5. Build prompt and call LLM
     chat_model = payload.model or record_chat_model or DEFAULT_CHAT_MODEL
 
     messages = [
@@ -175,7 +426,7 @@ async def query_rag(
         {
             "role": "user",
             "content": RAG_USER_TEMPLATE.format(
-                sources=sources_text,
+                sources=sources_buf.getvalue(),
                 query=query_text,
             ),
         },
@@ -234,54 +485,15 @@ async def generate_insights(
     """Full-text insight generation — reads every chunk, bypasses retrieval."""
 
     # Validate record ownership
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id, chat_model FROM records WHERE id = ? AND user_id = ?",
-            (payload.record_id, user.user_id),
-        )
-        record_row = cursor.fetchone()
-        if record_row is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
+    record_row = await asyncio.to_thread(_load_owned_record, payload.record_id, user.user_id)
 
-    record_chat_model = record_row[1]
-    user_key = decrypt_master_key(user_row[0])
+    record_chat_model = record_row[0]
+    user_key = get_cached_user_key(record_row[1])
 
-    # Decrypt ALL chunks and group by document
-    doc_texts: dict[str, list[tuple[int, str]]] = {}  # filename -> [(chunk_index, text)]
-    chunk_count = 0
+    # Decrypt ALL chunks and reconstruct full documents in chunk order
+    documents_block, document_count, chunk_count = await _build_documents_block(user_key, payload.record_id)
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT c.id, c.encrypted_text, c.chunk_index,
-                   d.filename
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
-            WHERE d.record_id = ?
-            ORDER BY d.filename, c.chunk_index
-            """,
-            (payload.record_id,),
-        )
-        chunk_rows = cursor.fetchall()
-
-    for chunk_id, encrypted_text, chunk_index, filename in chunk_rows:
-        try:
-            plain_text = decrypt_text_with_user_key(user_key, encrypted_text)
-        except Exception:
-            logger.warning("Failed to decrypt chunk %s", chunk_id)
-            continue
-        doc_texts.setdefault(filename or "unknown", []).append((chunk_index or 0, plain_text))
-        chunk_count += 1
-
-    if not doc_texts:
+    if not document_count:
         return InsightResponse(
             status="ok",
             insights="No documents found in this record. Upload some files first.",
@@ -290,13 +502,6 @@ async def generate_insights(
             model=None,
         )
 
-    # Reconstruct full documents in chunk order
-    documents_block = ""
-    for filename, chunks in doc_texts.items():
-        chunks.sort(key=lambda c: c[0])
-        full_text = "\n".join(text for _, text in chunks)
-        documents_block += f"\n\n---\n### Document: {filename}\n\n{full_text}"
-
     # Build prompt
     user_prompt = payload.prompt or "Generate comprehensive insights from these documents."
     chat_model = payload.model or record_chat_model or DEFAULT_CHAT_MODEL
@@ -306,7 +511,7 @@ async def generate_insights(
         {
             "role": "user",
             "content": INSIGHT_USER_TEMPLATE.format(
-                documents=documents_block.strip(),
+                documents=documents_block,
                 user_prompt=user_prompt,
             ),
         },
@@ -314,16 +519,30 @@ async def generate_insights(
 
     logger.info(
         "Insight generation: %d docs, %d chunks, model=%s",
-        len(doc_texts), chunk_count, chat_model,
+        document_count, chunk_count, chat_model,
     )
 
-    answer = await chat_completion(messages=messages, model=chat_model, max_tokens=8192)
+    if payload.stream:
+        return await _stream_completion_response(
+            user_key,
+            payload.record_id,
+            "insights",
+            messages,
+            chat_model,
+            max_tokens=8192,
+            meta={"document_count": document_count, "chunk_count": chunk_count, "model": chat_model},
+        )
+
+    answer, cached = await _cached_chat_completion(
+        user_key, payload.record_id, "insights", messages, chat_model, max_tokens=8192
+    )
 
     return InsightResponse(
         status="ok",
         insights=answer,
-        document_count=len(doc_texts),
+        document_count=document_count,
         chunk_count=chunk_count,
+        cached=cached,
         model=chat_model,
     )
 
@@ -335,20 +554,24 @@ class SummaryResponse(BaseModel):
     document_count: int
     chunk_count: int
     model: str
+    cached: bool = False
 
 class SummaryRequest(BaseModel):
     record_id: str
     model: str | None = None
+    stream: bool = False
 
 class OutlineResponse(BaseModel):
     outline: str
     document_count: int
     chunk_count: int
     model: str
+    cached: bool = False
 
 class OutlineRequest(BaseModel):
     record_id: str
     model: str | None = None
+    stream: bool = False
 
 class PdfRequest(BaseModel):
     record_id: str
@@ -370,52 +593,14 @@ async def generate_summary(
 ):
     """Full-text summary generation — reads every chunk, bypasses retrieval."""
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id, chat_model FROM records WHERE id = ? AND user_id = ?",
-            (payload.record_id, user.user_id),
-        )
-        record_row = cursor.fetchone()
-        if record_row is None:
-            raise HTTPException(status_code=404, detail="Record not found")
+    record_row = await asyncio.to_thread(_load_owned_record, payload.record_id, user.user_id)
 
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
-
-    record_chat_model = record_row[1]
-    user_key = decrypt_master_key(user_row[0])
+    record_chat_model = record_row[0]
+    user_key = get_cached_user_key(record_row[1])
 
-    doc_texts: dict[str, list[tuple[int, str]]] = {}
-    chunk_count = 0
-
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT c.encrypted_text, c.chunk_index, d.filename
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
-            WHERE d.record_id = ?
-            ORDER BY d.filename, c.chunk_index
-            """,
-            (payload.record_id,),
-        )
-        chunk_rows = cursor.fetchall()
-
-    for encrypted_text, chunk_index, filename in chunk_rows:
-        try:
-            plain_text = decrypt_text_with_user_key(user_key, encrypted_text)
-        except Exception:
-            logger.warning("Failed to decrypt chunk for summary")
-            continue
-        doc_texts.setdefault(filename or "unknown", []).append((chunk_index or 0, plain_text))
-        chunk_count += 1
+    documents_block, document_count, chunk_count = await _build_documents_block(user_key, payload.record_id)
 
-    if not doc_texts:
+    if not document_count:
         return SummaryResponse(
             summary="No documents found in this record. Upload some files first.",
             document_count=0,
@@ -423,26 +608,34 @@ async def generate_summary(
             model=record_chat_model or DEFAULT_CHAT_MODEL,
         )
 
-    documents_block = ""
-    for filename, chunks in doc_texts.items():
-        chunks.sort(key=lambda c: c[0])
-        full_text = "\n".join(text for _, text in chunks)
-        documents_block += f"\n\n---\n### Document: {filename}\n\n{full_text}"
-
     chat_model = payload.model or record_chat_model or DEFAULT_CHAT_MODEL
 
     messages = [
         {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-        {"role": "user", "content": documents_block.strip()},
+        {"role": "user", "content": documents_block},
     ]
 
-    summary = await chat_completion(messages=messages, model=chat_model, max_tokens=4096)
+    if payload.stream:
+        return await _stream_completion_response(
+            user_key,
+            payload.record_id,
+            "summary",
+            messages,
+            chat_model,
+            max_tokens=4096,
+            meta={"document_count": document_count, "chunk_count": chunk_count, "model": chat_model},
+        )
+
+    summary, cached = await _cached_chat_completion(
+        user_key, payload.record_id, "summary", messages, chat_model, max_tokens=4096
+    )
 
     return SummaryResponse(
         summary=summary,
-        document_count=len(doc_texts),
+        document_count=document_count,
         chunk_count=chunk_count,
         model=chat_model,
+        cached=cached,
     )
 
 
@@ -459,52 +652,14 @@ async def generate_outline(
 ):
     """Full-text outline generation — reads every chunk, bypasses retrieval."""
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id, chat_model FROM records WHERE id = ? AND user_id = ?",
-            (payload.record_id, user.user_id),
-        )
-        record_row = cursor.fetchone()
-        if record_row is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
-
-    record_chat_model = record_row[1]
-    user_key = decrypt_master_key(user_row[0])
+    record_row = await asyncio.to_thread(_load_owned_record, payload.record_id, user.user_id)
 
-    doc_texts: dict[str, list[tuple[int, str]]] = {}
-    chunk_count = 0
-
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT c.encrypted_text, c.chunk_index, d.filename
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
-            WHERE d.record_id = ?
-            ORDER BY d.filename, c.chunk_index
-            """,
-            (payload.record_id,),
-        )
-        chunk_rows = cursor.fetchall()
+    record_chat_model = record_row[0]
+    user_key = get_cached_user_key(record_row[1])
 
-    for encrypted_text, chunk_index, filename in chunk_rows:
-        try:
-            plain_text = decrypt_text_with_user_key(user_key, encrypted_text)
-        except Exception:
-            logger.warning("Failed to decrypt chunk for outline")
-            continue
-        doc_texts.setdefault(filename or "unknown", []).append((chunk_index or 0, plain_text))
-        chunk_count += 1
+    documents_block, document_count, chunk_count = await _build_documents_block(user_key, payload.record_id)
 
-    if not doc_texts:
+    if not document_count:
         return OutlineResponse(
             outline="No documents found in this record. Upload some files first.",
             document_count=0,
@@ -512,33 +667,52 @@ async def generate_outline(
             model=record_chat_model or DEFAULT_CHAT_MODEL,
         )
 
-    documents_block = ""
-    for filename, chunks in doc_texts.items():
-        chunks.sort(key=lambda c: c[0])
-        full_text = "\n".join(text for _, text in chunks)
-        documents_block += f"\n\n---\n### Document: {filename}\n\n{full_text}"
-
     chat_model = payload.model or record_chat_model or DEFAULT_CHAT_MODEL
 
     summary_messages = [
         {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-        {"role": "user", "content": documents_block.strip()},
+        {"role": "user", "content": documents_block},
     ]
 
-    summary_text = await chat_completion(messages=summary_messages, model=chat_model, max_tokens=4096)
-
+    # Outline from an already generated /summary when there is one (much shorter
+    # input); otherwise outline the documents directly in a single call.
+    summary_text = await asyncio.to_thread(
+        _load_cached_answer,
+        user_key,
+        payload.record_id,
+        "summary",
+        chat_model,
+        _answer_cache_hash(user_key, summary_messages),
+    )
     outline_messages = [
         {"role": "system", "content": OUTLINE_SYSTEM_PROMPT},
-        {"role": "user", "content": f"Summary:\n{summary_text}"},
+        {
+            "role": "user",
+            "content": f"Summary:\n{summary_text}" if summary_text is not None else documents_block,
+        },
     ]
 
-    outline = await chat_completion(messages=outline_messages, model=chat_model, max_tokens=2048)
+    if payload.stream:
+        return await _stream_completion_response(
+            user_key,
+            payload.record_id,
+            "outline",
+            outline_messages,
+            chat_model,
+            max_tokens=2048,
+            meta={"document_count": document_count, "chunk_count": chunk_count, "model": chat_model},
+        )
+
+    outline, cached = await _cached_chat_completion(
+        user_key, payload.record_id, "outline", outline_messages, chat_model, max_tokens=2048
+    )
 
     return OutlineResponse(
         outline=outline,
-        document_count=len(doc_texts),
+        document_count=document_count,
         chunk_count=chunk_count,
         model=chat_model,
+        cached=cached,
     )
 
 class InfographicRequest(BaseModel):
@@ -555,6 +729,14 @@ class InfographicResponse(BaseModel):
     model: str
 
 
+# Detailed infographics sample the first chunks of each document, capped overall
+INFOGRAPHIC_CHUNKS_PER_DOCUMENT = 20
+INFOGRAPHIC_MAX_CHUNKS = 50
+# Token budget for the source content in an infographic prompt (cl100k_base)
+INFOGRAPHIC_CONTENT_TOKENS = 1000
+INFOGRAPHIC_MIN_SNIPPET_TOKENS = 40
+
+
 @router.post("/infographic", response_model=InfographicResponse)
 async def generate_infographic(
     req: InfographicRequest,
@@ -564,34 +746,38 @@ async def generate_infographic(
     Generate an infographic visualization from all documents in a record.
     Supports standard (summary-based) or detailed (chunk-by-chunk) depth.
     """
-    from config import settings
-
     # ── Verify record ownership and get user key ──
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
-            (req.record_id, user.user_id),
-        )
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
+    record_row = await asyncio.to_thread(_load_owned_record, req.record_id, user.user_id)
 
-    user_key = decrypt_master_key(user_row[0])
+    user_key = get_cached_user_key(record_row[1])
 
-    # ── Gather all document chunks (decrypt) ──
+    # ── Gather document chunks (decrypt) ──
     doc_chunks: dict[str, list[tuple[int, str]]] = {}
     doc_titles: dict[str, str] = {}
     chunk_count = 0
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
+    if req.depth == "detailed":
+        # Only the first chunks of each document are used, so only decrypt those
+        chunk_rows = await _fetch_decrypted_chunk_rows(
+            user_key,
+            """
+            SELECT encrypted_text, chunk_index, document_id, filename
+            FROM (
+                SELECT c.encrypted_text, c.chunk_index, d.id AS document_id, d.filename,
+                       ROW_NUMBER() OVER (PARTITION BY d.id ORDER BY c.chunk_index) AS rn
+                FROM chunks c
+                JOIN documents d ON d.id = c.document_id
+                WHERE d.record_id = ?
+            )
+            WHERE rn <= ?
+            ORDER BY document_id, chunk_index
+            LIMIT ?
+            """,
+            (req.record_id, INFOGRAPHIC_CHUNKS_PER_DOCUMENT, INFOGRAPHIC_MAX_CHUNKS),
+        )
+    else:
+        chunk_rows = await _fetch_decrypted_chunk_rows(
+            user_key,
             """
             SELECT c.encrypted_text, c.chunk_index, d.id, d.filename
             FROM chunks c
@@ -601,12 +787,9 @@ async def generate_infographic(
             """,
             (req.record_id,),
         )
-        chunk_rows = cursor.fetchall()
 
-    for encrypted_text, chunk_index, document_id, filename in chunk_rows:
-        try:
-            plain_text = decrypt_text_with_user_key(user_key, encrypted_text)
-        except Exception:
+    for plain_text, chunk_index, document_id, filename in chunk_rows:
+        if plain_text is None:
             logger.warning("Failed to decrypt chunk for document %s", document_id)
             continue
 
@@ -621,35 +804,31 @@ async def generate_infographic(
     doc_ids = list(doc_chunks.keys())
 
     # ── Build the content for infographic generation ──
+    # One token budget for the whole block, shared evenly between its parts
     if req.depth == "detailed":
-        chunk_summaries: list[str] = []
-        for document_id, chunks in doc_chunks.items():
-            title = doc_titles.get(document_id, document_id)
-            chunks.sort(key=lambda c: c[0])
-            for i, (_, text) in enumerate(chunks[:20]):
-                snippet = text.strip()
-                if not snippet:
-                    continue
-                snippet = snippet[:300] + ("..." if len(snippet) > 300 else "")
-                chunk_summaries.append(f"**{title} - Chunk {i + 1}**: {snippet}")
-
-        content_text = "\n\n".join(chunk_summaries[:50])
+        snippets = [
+            (f"**{doc_titles.get(document_id, document_id)} - Chunk {i + 1}**", text.strip())
+            for document_id, chunks in doc_chunks.items()
+            for i, (_, text) in enumerate(chunks)
+            if text.strip()
+        ]
+        per_snippet = max(INFOGRAPHIC_CONTENT_TOKENS // max(len(snippets), 1), INFOGRAPHIC_MIN_SNIPPET_TOKENS)
+        max_snippets = max(INFOGRAPHIC_CONTENT_TOKENS // per_snippet, 1)
+        content_text = "\n\n".join(
+            f"{label}: {truncate_tokens(snippet, per_snippet)}" for label, snippet in snippets[:max_snippets]
+        )
+        if len(snippets) > max_snippets:
+            content_text += "\n\n[...truncated...]"
     else:
+        per_document = INFOGRAPHIC_CONTENT_TOKENS // len(doc_chunks)
         summaries: list[str] = []
         for document_id, chunks in doc_chunks.items():
             title = doc_titles.get(document_id, document_id)
-            chunks.sort(key=lambda c: c[0])
-            combined = " ".join(text for _, text in chunks)
-            combined = combined[:2000]
+            combined = truncate_tokens(" ".join(text for _, text in chunks), per_document)
             summaries.append(f"**{title}**: {combined}")
 
         content_text = "\n\n".join(summaries)
 
-    # Truncate to fit context
-    MAX_CHARS = 4000
-    if len(content_text) > MAX_CHARS:
-        content_text = content_text[:MAX_CHARS] + "\n\n[...truncated...]"
-
     # ── Build the prompt ──
     if req.custom_prompt and req.custom_prompt.strip():
         final_prompt = f"{req.custom_prompt.strip()}\n\n---\n\nSource content:\n{content_text}"
@@ -670,30 +849,24 @@ async def generate_infographic(
     model = "google/gemini-3-pro-image-preview"
 
     try:
-        async with httpx.AsyncClient(timeout=180.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": OPENROUTER_HTTP_REFERER,
-                    "X-Title": OPENROUTER_X_TITLE,
-                },
-                json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": final_prompt}],
-                    "modalities": ["image", "text"],
-                },
-            )
+        response = await openrouter_post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers=openrouter_headers(),
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": final_prompt}],
+                "modalities": ["image", "text"],
+            },
+        )
 
-            if response.status_code != 200:
-                error_text = response.text
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"OpenRouter API error ({response.status_code}): {error_text[:200]}"
-                )
+        if response.status_code != 200:
+            error_text = response.text
+            raise HTTPException(
+                status_code=502,
+                detail=f"OpenRouter API error ({response.status_code}): {error_text[:200]}"
+            )
 
-            data = response.json()
+        data = response.json()
 
         # Extract image from response
         message = data.get("choices", [{}])[0].get("message", {})
@@ -714,6 +887,12 @@ async def generate_infographic(
         if not image_data:
             raise HTTPException(status_code=502, detail="Invalid image response format")
 
+        # Store raw bytes rather than the (1/3 larger) base64 data URL
+        if image_data.startswith("http"):
+            mime_type, image_bytes = await _fetch_image(image_data)
+        else:
+            mime_type, image_bytes = _decode_data_url(image_data)
+
         # ── Store image in database ──
         image_id = f"img_{uuid.uuid4().hex}"
         created_at = get_current_timestamp()
@@ -721,16 +900,15 @@ async def generate_infographic(
             cursor.execute(
                 """
                 INSERT INTO generated_images (
-                    id, record_id, user_id, type, image_data, prompt,
+                    id, record_id, user_id, type, prompt,
                     depth, model, created_at, document_count, chunk_count
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     image_id,
                     req.record_id,
                     user.user_id,
                     "infographic",
-                    image_data,
                     final_prompt,
                     req.depth,
                     model,
@@ -739,9 +917,13 @@ async def generate_infographic(
                     chunk_count,
                 ),
             )
+            cursor.execute(
+                "INSERT INTO generated_image_blobs (image_id, mime_type, image_data) VALUES (?, ?, ?)",
+                (image_id, mime_type, image_bytes),
+            )
 
         return InfographicResponse(
-            image_url=image_data,
+            image_url=_infographic_image_url(image_id),
             image_id=image_id,
             prompt_used=final_prompt,
             document_count=len(doc_ids),
@@ -760,7 +942,7 @@ async def generate_infographic(
 
 
 @router.get("/infographic/{image_id}")
-async def get_infographic(
+def get_infographic(
     image_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -769,7 +951,7 @@ async def get_infographic(
     with get_db_cursor() as cursor:
         cursor.execute(
             """
-            SELECT id, image_data, prompt, depth, model, created_at, document_count, chunk_count
+            SELECT id, prompt, depth, model, created_at, document_count, chunk_count
             FROM generated_images
             WHERE id = ? AND user_id = ?
             """,
@@ -782,18 +964,54 @@ async def get_infographic(
 
     return {
         "image_id": row[0],
-        "image_url": row[1],
-        "prompt": row[2] or "",
-        "depth": row[3] or "standard",
-        "model": row[4] or "",
-        "created_at": row[5],
-        "document_count": row[6],
-        "chunk_count": row[7],
+        "image_url": _infographic_image_url(row[0]),
+        "prompt": row[1] or "",
+        "depth": row[2] or "standard",
+        "model": row[3] or "",
+        "created_at": row[4],
+        "document_count": row[5],
+        "chunk_count": row[6],
     }
 
 
+@router.get("/infographic/{image_id}/image")
+def get_infographic_image(
+    image_id: str,
+    user: AuthContext = Depends(get_current_user),
+):
+    """Serve the raw bytes of a previously generated infographic"""
+
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT b.mime_type, b.image_data, i.legacy_image_url
+            FROM generated_images i
+            LEFT JOIN generated_image_blobs b ON b.image_id = i.id
+            WHERE i.id = ? AND i.user_id = ?
+            """,
+            (image_id, user.user_id),
+        )
+        row = cursor.fetchone()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    mime_type, image_data, legacy_image_url = row
+    if image_data is None:
+        # Images generated before blob storage may only have a remote URL
+        if not legacy_image_url:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return RedirectResponse(legacy_image_url)
+
+    return Response(
+        content=image_data,
+        media_type=mime_type,
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
 @router.get("/infographics/{record_id}")
-async def list_infographics(
+def list_infographics(
     record_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -844,188 +1062,225 @@ async def list_infographics(
         return {"infographics": []}
 
 
-def _decode_image_bytes(image_data: str) -> bytes:
+def _infographic_image_url(image_id: str) -> str:
+    return f"/api/rag/infographic/{image_id}/image"
+
+
+def _decode_data_url(image_data: str) -> tuple[str, bytes]:
+    """Split a ``data:<mime>;base64,...`` image URL into (mime type, raw bytes)."""
     if image_data.startswith("data:image"):
-        _, b64 = image_data.split(",", 1)
-        return base64.b64decode(b64)
+        comma = image_data.find(",")
+        mime_type = image_data[5:comma].split(";", 1)[0]
+        # SIMD base64 decoder; pages are multi-MB images
+        return mime_type, pybase64.b64decode(image_data[comma + 1 :], validate=False)
     raise ValueError("Unsupported image format")
 
 
-@router.post("/pdf", response_model=PdfResponse)
-async def generate_pdf(
-    payload: PdfRequest,
-    user: AuthContext = Depends(get_current_user),
-):
-    """Generate a PDF by rendering each chunk as an image and combining into A4 pages."""
-    from config import settings
+def _decode_image_bytes(image_data: str) -> bytes:
+    return _decode_data_url(image_data)[1]
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id, chat_model FROM records WHERE id = ? AND user_id = ?",
-            (payload.record_id, user.user_id),
-        )
-        record_row = cursor.fetchone()
-        if record_row is None:
-            raise HTTPException(status_code=404, detail="Record not found")
 
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
+GENERATED_IMAGE_MAX_BYTES = 32 * 1024 * 1024
+IMAGE_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+async def _fetch_image(url: str) -> tuple[str, bytes]:
+    """Stream a generated image from a model-hosted URL into memory, capped in size."""
+    async with get_http_client().stream("GET", url) as response:
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail="Failed to fetch generated image")
+        mime_type = response.headers.get("content-type", "image/png").split(";")[0]
+        buffer = bytearray()
+        async for chunk in response.aiter_bytes(IMAGE_DOWNLOAD_CHUNK_BYTES):
+            buffer += chunk
+            if len(buffer) > GENERATED_IMAGE_MAX_BYTES:
+                raise HTTPException(status_code=502, detail="Generated image too large")
+    return mime_type, bytes(buffer)
+
+
+PDF_IMAGE_MODEL = "google/gemini-3-pro-image-preview"
+PDF_CHUNKS_PER_PAGE = 5
+# Pages are rendered in parallel; results are reassembled in chunk order.
+PDF_RENDER_CONCURRENCY = 4
+
+
+async def _render_pdf_page(batch: list[tuple]) -> Optional[bytes]:
+    """Render one batch of chunks into a page image, or None if nothing decrypted."""
+    combined_parts: list[str] = []
+
+    for plain_text, chunk_index, document_id, filename in batch:
+        if plain_text is None:
+            logger.warning("Failed to decrypt chunk for document %s", document_id)
+            continue
+
+        snippet = plain_text.strip().replace("\n", " ")
+        snippet = snippet[:800]
+        combined_parts.append(
+            f"Document: {filename or 'unknown'} | Chunk: {chunk_index or 0}\n{snippet}"
         )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
 
-    user_key = decrypt_master_key(user_row[0])
+    if not combined_parts:
+        return None
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT c.encrypted_text, c.chunk_index, d.id, d.filename
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
-            WHERE d.record_id = ?
-            ORDER BY d.filename, c.chunk_index
-            """,
-            (payload.record_id,),
+    combined_text = "\n\n".join(combined_parts)
+
+    prompt = (
+        "Create a clean, printable page image that summarizes the following text. "
+        "Use a white background, subtle section headers, and clear typography. "
+        "Group the content into 5 short sections when possible. "
+        f"\n\nContent:\n{combined_text}"
+    )
+
+    response = await openrouter_post(
+        "https://openrouter.ai/api/v1/chat/completions",
+        headers=openrouter_headers(),
+        json={
+            "model": PDF_IMAGE_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "modalities": ["image", "text"],
+        },
+    )
+
+    if response.status_code != 200:
+        error_text = response.text
+        raise HTTPException(
+            status_code=502,
+            detail=f"OpenRouter API error ({response.status_code}): {error_text[:200]}"
         )
-        chunk_rows = cursor.fetchall()
 
-    if not chunk_rows:
-        raise HTTPException(status_code=400, detail="No document chunks found. Upload sources first.")
+    data = response.json()
+    message = data.get("choices", [{}])[0].get("message", {})
+    images_list = message.get("images", [])
 
-    api_key = getattr(settings, "OPENROUTER_API_KEY", None) or getattr(settings, "openrouter_api_key", None)
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OPENROUTER_API_KEY not configured in settings")
+    image_data = ""
+    if images_list:
+        image_data = images_list[0].get("image_url", {}).get("url", "")
+        if not image_data:
+            image_data = images_list[0].get("url", "")
+    else:
+        content = message.get("content", "")
+        if content and content.startswith("data:image"):
+            image_data = content
 
-    model = "google/gemini-3-pro-image-preview"
-    images: list[bytes] = []
-
-    async with httpx.AsyncClient(timeout=180.0) as client:
-        for start in range(0, len(chunk_rows), 5):
-            batch = chunk_rows[start : start + 5]
-            combined_parts: list[str] = []
-
-            for encrypted_text, chunk_index, document_id, filename in batch:
-                try:
-                    plain_text = decrypt_text_with_user_key(user_key, encrypted_text)
-                except Exception:
-                    logger.warning("Failed to decrypt chunk for document %s", document_id)
-                    continue
-
-                snippet = plain_text.strip().replace("\n", " ")
-                snippet = snippet[:800]
-                combined_parts.append(
-                    f"Document: {filename or 'unknown'} | Chunk: {chunk_index or 0}\n{snippet}"
-                )
+    if not image_data:
+        raise HTTPException(status_code=502, detail="No image generated by model for PDF")
 
-            if not combined_parts:
-                continue
+    if image_data.startswith("http"):
+        return (await _fetch_image(image_data))[1]
+    return _decode_image_bytes(image_data)
 
-            combined_text = "\n\n".join(combined_parts)
 
-            prompt = (
-                "Create a clean, printable page image that summarizes the following text. "
-                "Use a white background, subtle section headers, and clear typography. "
-                "Group the content into 5 short sections when possible. "
-                f"\n\nContent:\n{combined_text}"
-            )
+# A4 portrait with a half-inch margin, in PDF points
+PDF_PAGE_LAYOUT = img2pdf.get_layout_fun(
+    (img2pdf.mm_to_pt(210), img2pdf.mm_to_pt(297)),
+    border=(36, 36),
+)
 
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": OPENROUTER_HTTP_REFERER,
-                    "X-Title": OPENROUTER_X_TITLE,
-                },
-                json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "modalities": ["image", "text"],
-                },
-            )
 
-            if response.status_code != 200:
-                error_text = response.text
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"OpenRouter API error ({response.status_code}): {error_text[:200]}"
-                )
+def _build_pdf(images: list[bytes]) -> bytes:
+    """Embed each page image as-is on its own A4 page and return the PDF bytes."""
+    return img2pdf.convert(images, layout_fun=PDF_PAGE_LAYOUT)
 
-            data = response.json()
-            message = data.get("choices", [{}])[0].get("message", {})
-            images_list = message.get("images", [])
 
-            image_data = ""
-            if images_list:
-                image_data = images_list[0].get("image_url", {}).get("url", "")
-                if not image_data:
-                    image_data = images_list[0].get("url", "")
-            else:
-                content = message.get("content", "")
-                if content and content.startswith("data:image"):
-                    image_data = content
+def _write_pdf_file(path: Path, data: bytes) -> None:
+    """Write a generated PDF owner-readable only, creating the user's directory on first use."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    write_private_file(path, data)
 
-            if not image_data:
-                raise HTTPException(status_code=502, detail="No image generated by model for PDF")
 
-            if image_data.startswith("http"):
-                img_resp = await client.get(image_data)
-                if img_resp.status_code != 200:
-                    raise HTTPException(status_code=502, detail="Failed to fetch generated image")
-                images.append(img_resp.content)
-            else:
-                images.append(_decode_image_bytes(image_data))
+@router.post("/pdf", response_model=PdfResponse)
+async def generate_pdf(
+    payload: PdfRequest,
+    user: AuthContext = Depends(get_current_user),
+):
+    """Generate a PDF by rendering each chunk as an image and combining into A4 pages."""
+    record_row = await asyncio.to_thread(_load_owned_record, payload.record_id, user.user_id)
+
+    user_key = get_cached_user_key(record_row[1])
+
+    # Decrypt every chunk in one pass up front; the page renders only see plaintext
+    chunk_rows = await _fetch_decrypted_chunk_rows(
+        user_key,
+        """
+        SELECT c.encrypted_text, c.chunk_index, d.id, d.filename
+        FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE d.record_id = ?
+        ORDER BY d.filename, c.chunk_index
+        """,
+        (payload.record_id,),
+    )
 
-    if not images:
-        raise HTTPException(status_code=502, detail="No images generated for PDF")
+    if not chunk_rows:
+        raise HTTPException(status_code=400, detail="No document chunks found. Upload sources first.")
 
-    pdf = fitz.open()
-    a4_width = 595
-    a4_height = 842
-    margin = 36
-    rect = fitz.Rect(margin, margin, a4_width - margin, a4_height - margin)
+    api_key = getattr(settings, "OPENROUTER_API_KEY", None) or getattr(settings, "openrouter_api_key", None)
+    if not api_key:
+        raise HTTPException(status_code=500, detail="OPENROUTER_API_KEY not configured in settings")
 
-    for image_bytes in images:
-        page = pdf.new_page(width=a4_width, height=a4_height)
-        page.insert_image(rect, stream=image_bytes, keep_proportion=True)
+    slots = asyncio.Semaphore(PDF_RENDER_CONCURRENCY)
 
-    pdf_bytes = pdf.tobytes()
-    pdf.close()
+    async def render(batch: list[tuple]) -> Optional[bytes]:
+        async with slots:
+            return await _render_pdf_page(batch)
+
+    tasks = [
+        asyncio.create_task(render(chunk_rows[start : start + PDF_CHUNKS_PER_PAGE]))
+        for start in range(0, len(chunk_rows), PDF_CHUNKS_PER_PAGE)
+    ]
+    try:
+        pages = await asyncio.gather(*tasks)
+    except BaseException:
+        # gather does not cancel siblings on failure; stop the remaining paid renders
+        for task in tasks:
+            task.cancel()
+        raise
+    images = [page for page in pages if page is not None]
+
+    if not images:
+        raise HTTPException(status_code=502, detail="No images generated for PDF")
+
+    pdf_bytes = await asyncio.to_thread(_build_pdf, images)
 
     pdf_id = f"pdf_{uuid.uuid4().hex}"
     created_at = get_current_timestamp()
+    storage_path = settings.pdf_path / user.user_id / f"{pdf_id}.pdf"
+    await asyncio.to_thread(_write_pdf_file, storage_path, pdf_bytes)
 
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
-            INSERT INTO generated_pdfs (
-                id, record_id, user_id, pdf_data, created_at, chunk_count, page_count, model
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                pdf_id,
-                payload.record_id,
-                user.user_id,
-                pdf_bytes,
-                created_at,
-                len(chunk_rows),
-                len(images),
-                model,
-            ),
-        )
+    try:
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO generated_pdfs (
+                    id, record_id, user_id, created_at, chunk_count, page_count, model, storage_path
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    pdf_id,
+                    payload.record_id,
+                    user.user_id,
+                    created_at,
+                    len(chunk_rows),
+                    len(images),
+                    PDF_IMAGE_MODEL,
+                    str(storage_path),
+                ),
+            )
+    except Exception:
+        # Do not leave an unreferenced PDF behind (e.g. the record was deleted meanwhile)
+        storage_path.unlink(missing_ok=True)
+        raise
 
     return PdfResponse(
         pdf_id=pdf_id,
         page_count=len(images),
         chunk_count=len(chunk_rows),
-        model=model,
+        model=PDF_IMAGE_MODEL,
     )
 
 
 @router.get("/pdf/{pdf_id}")
-async def get_pdf(
+def get_pdf(
     pdf_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -1033,9 +1288,10 @@ async def get_pdf(
     with get_db_cursor() as cursor:
         cursor.execute(
             """
-            SELECT pdf_data
-            FROM generated_pdfs
-            WHERE id = ? AND user_id = ?
+            SELECT p.storage_path, b.pdf_data
+            FROM generated_pdfs p
+            LEFT JOIN generated_pdf_blobs b ON b.pdf_id = p.id
+            WHERE p.id = ? AND p.user_id = ?
             """,
             (pdf_id, user.user_id),
         )
@@ -1044,35 +1300,42 @@ async def get_pdf(
     if not row:
         raise HTTPException(status_code=404, detail="PDF not found")
 
-    return Response(content=row[0], media_type="application/pdf")
+    storage_path, pdf_data = row
+    if storage_path:
+        if not os.path.isfile(storage_path):
+            raise HTTPException(status_code=404, detail="PDF file missing")
+        return FileResponse(storage_path, media_type="application/pdf")
+
+    # PDFs generated before on-disk storage still live in generated_pdf_blobs
+    if pdf_data is None:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return Response(content=pdf_data, media_type="application/pdf")
 
 
 @router.get("/pdfs/{record_id}")
-async def list_pdfs(
+def list_pdfs(
     record_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
     """List all PDFs for a record."""
     with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
-            (record_id, user.user_id),
-        )
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
+        # LEFT JOIN from records: no rows means not owned, a NULL id means no PDFs
         cursor.execute(
             """
-            SELECT id, created_at, page_count, model
-            FROM generated_pdfs
-            WHERE record_id = ? AND user_id = ?
-            ORDER BY created_at DESC
+            SELECT p.id, p.created_at, p.page_count, p.model
+            FROM records r
+            LEFT JOIN generated_pdfs p ON p.record_id = r.id AND p.user_id = r.user_id
+            WHERE r.id = ? AND r.user_id = ?
+            ORDER BY p.created_at DESC
             LIMIT 50
             """,
             (record_id, user.user_id),
         )
         rows = cursor.fetchall()
 
+    if not rows:
+        raise HTTPException(status_code=404, detail="Record not found")
+
     return {
         "pdfs": [
             {
@@ -1082,5 +1345,6 @@ async def list_pdfs(
                 "model": row[3],
             }
             for row in rows
+            if row[0] is not None
         ]
     }
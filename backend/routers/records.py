@@ -1,20 +1,25 @@
 """
 Record management router for OpenRecords.
 """
+import asyncio
 import logging
+import time
 import uuid
-from typing import List
+from pathlib import Path
+from typing import List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 from database import get_db_cursor
 from middleware.auth import get_current_user
 from models.auth import AuthContext
 from models.documents import ReindexResponse
 from models.records import RecordCreate, RecordResponse, RecordsListResponse, RecordUpdate
+from services.ingest_queue import enqueue_ingest_job
 from utils.auth import get_current_timestamp
 from utils.chunking import count_tokens
-from utils.encryption import decrypt_master_key, decrypt_text_with_user_key
+from utils.encryption import decrypt_texts_with_user_key, get_cached_user_key
+from utils.keyword_index import index_chunk_terms
 from utils.openrouter import get_embeddings
 from utils.vectordb import add_vectors, delete_collection
 
@@ -25,9 +30,38 @@ router = APIRouter(prefix="/api/records", tags=["records"])
 DEFAULT_CHAT_MODEL = "moonshotai/kimi-k2.5"
 DEFAULT_EMBED_MODEL = "text-embedding-3-large"
 
+# Opening a record only bumps last_opened once per window, so repeated reads stay read-only.
+# record_id -> monotonic write time, oldest first; entries past the window are pruned.
+LAST_OPENED_DEBOUNCE_SECONDS = 60
+LAST_OPENED_MAX_ENTRIES = 10_000
+_last_opened_writes: dict[str, float] = {}
+
+
+def _remember_last_opened_write(record_id: str, now: float) -> None:
+    """Record a last_opened write, dropping entries that can no longer debounce anything."""
+    _last_opened_writes.pop(record_id, None)
+    cutoff = now - LAST_OPENED_DEBOUNCE_SECONDS
+    while _last_opened_writes:
+        oldest_id = next(iter(_last_opened_writes))
+        if (
+            _last_opened_writes.get(oldest_id, cutoff) > cutoff
+            and len(_last_opened_writes) < LAST_OPENED_MAX_ENTRIES
+        ):
+            break
+        _last_opened_writes.pop(oldest_id, None)
+    _last_opened_writes[record_id] = now
+
+# Records are listed newest-first in keyset pages of (updated_at, id)
+RECORDS_PAGE_SIZE = 100
+RECORDS_MAX_PAGE_SIZE = 200
+
+# Reindexing streams a record through decrypt -> embed -> write in batches
+REINDEX_BATCH_SIZE = 128
+REINDEX_QUEUE_DEPTH = 4
+
 
 @router.post("/init", response_model=RecordResponse)
-async def create_record(
+def create_record(
     payload: RecordCreate,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -46,13 +80,12 @@ async def create_record(
         )
         settings_row = cursor.fetchone()
 
-    default_chat_model = settings_row[0] if settings_row else None
-    default_embed_model = settings_row[1] if settings_row else None
+        default_chat_model = settings_row[0] if settings_row else None
+        default_embed_model = settings_row[1] if settings_row else None
 
-    chat_model = payload.chat_model or default_chat_model or DEFAULT_CHAT_MODEL
-    embed_model = payload.embed_model or default_embed_model or DEFAULT_EMBED_MODEL
+        chat_model = payload.chat_model or default_chat_model or DEFAULT_CHAT_MODEL
+        embed_model = payload.embed_model or default_embed_model or DEFAULT_EMBED_MODEL
 
-    with get_db_cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO records (
@@ -87,11 +120,27 @@ async def create_record(
 
 
 @router.get("", response_model=RecordsListResponse)
-async def list_records(user: AuthContext = Depends(get_current_user)):
-    """List records for the current user."""
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            """
+def list_records(
+    limit: int = Query(RECORDS_PAGE_SIZE, ge=1, le=RECORDS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: AuthContext = Depends(get_current_user),
+):
+    """List records for the current user, most recently updated first."""
+    params: list = [user.user_id]
+    after_cursor = ""
+    if cursor:
+        before_updated_at, sep, before_id = cursor.partition("|")
+        if not sep:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after_cursor = "AND (records.updated_at, records.id) < (?, ?)"
+        params += [before_updated_at, before_id]
+    params.append(limit + 1)
+
+    # Walks idx_records_user_updated; the document count is a per-row index lookup
+    # so only the returned page is aggregated
+    with get_db_cursor() as db_cursor:
+        db_cursor.execute(
+            f"""
             SELECT
                 records.id,
                 records.user_id,
@@ -102,16 +151,20 @@ async def list_records(user: AuthContext = Depends(get_current_user)):
                 records.last_opened,
                 records.chat_model,
                 records.embed_model,
-                COUNT(documents.id) as doc_count
+                (SELECT COUNT(*) FROM documents WHERE documents.record_id = records.id) AS doc_count
             FROM records
-            LEFT JOIN documents ON documents.record_id = records.id
-            WHERE records.user_id = ?
-            GROUP BY records.id
-            ORDER BY records.updated_at DESC
+            WHERE records.user_id = ? {after_cursor}
+            ORDER BY records.updated_at DESC, records.id DESC
+            LIMIT ?
             """,
-            (user.user_id,),
+            params,
         )
-        rows = cursor.fetchall()
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1][5]}|{rows[-1][0]}"
 
     records: List[RecordResponse] = [
         RecordResponse(
@@ -129,11 +182,11 @@ async def list_records(user: AuthContext = Depends(get_current_user)):
         for row in rows
     ]
 
-    return RecordsListResponse(records=records)
+    return RecordsListResponse(records=records, next_cursor=next_cursor)
 
 
 @router.get("/{record_id}", response_model=RecordResponse)
-async def get_record(record_id: str, user: AuthContext = Depends(get_current_user)):
+def get_record(record_id: str, user: AuthContext = Depends(get_current_user)):
     """Get a record by ID for the current user."""
     with get_db_cursor() as cursor:
         cursor.execute(
@@ -149,12 +202,16 @@ async def get_record(record_id: str, user: AuthContext = Depends(get_current_use
     if not row:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    last_opened = get_current_timestamp()
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            "UPDATE records SET last_opened = ? WHERE id = ? AND user_id = ?",
-            (last_opened, record_id, user.user_id),
-        )
+    last_opened = row[6]
+    now = time.monotonic()
+    if now - _last_opened_writes.get(record_id, float("-inf")) >= LAST_OPENED_DEBOUNCE_SECONDS:
+        last_opened = get_current_timestamp()
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE records SET last_opened = ? WHERE id = ? AND user_id = ?",
+                (last_opened, record_id, user.user_id),
+            )
+        _remember_last_opened_write(record_id, now)
 
     return RecordResponse(
         id=row[0],
@@ -171,7 +228,7 @@ async def get_record(record_id: str, user: AuthContext = Depends(get_current_use
 
 
 @router.patch("/{record_id}", response_model=RecordResponse)
-async def update_record(
+def update_record(
     record_id: str,
     payload: RecordUpdate,
     user: AuthContext = Depends(get_current_user),
@@ -233,9 +290,15 @@ async def update_record(
 
 
 @router.delete("/{record_id}")
-async def delete_record(record_id: str, user: AuthContext = Depends(get_current_user)):
+def delete_record(record_id: str, user: AuthContext = Depends(get_current_user)):
     """Delete a record for the current user."""
     with get_db_cursor() as cursor:
+        # Generated PDFs live on disk; collect their paths before the rows cascade away
+        cursor.execute(
+            "SELECT storage_path FROM generated_pdfs WHERE record_id = ? AND user_id = ?",
+            (record_id, user.user_id),
+        )
+        pdf_paths = [row[0] for row in cursor.fetchall() if row[0]]
         cursor.execute(
             "DELETE FROM records WHERE id = ? AND user_id = ?",
             (record_id, user.user_id),
@@ -243,6 +306,11 @@ async def delete_record(record_id: str, user: AuthContext = Depends(get_current_
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Record not found")
 
+    _last_opened_writes.pop(record_id, None)
+
+    for pdf_path in pdf_paths:
+        Path(pdf_path).unlink(missing_ok=True)
+
     # Clean up vector collection
     try:
         delete_collection(record_id)
@@ -253,31 +321,28 @@ async def delete_record(record_id: str, user: AuthContext = Depends(get_current_
 
 
 @router.post("/{record_id}/reindex", response_model=ReindexResponse)
-async def reindex_record(
+def reindex_record(
     record_id: str,
-    background_tasks: BackgroundTasks,
     user: AuthContext = Depends(get_current_user),
 ):
     """Re-index all chunks for a record into the vector DB."""
     with get_db_cursor() as cursor:
         cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
+            """
+            SELECT u.encrypted_master_key
+            FROM records r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.id = ? AND r.user_id = ?
+            """,
             (record_id, user.user_id),
         )
-        if cursor.fetchone() is None:
+        record_row = cursor.fetchone()
+        if record_row is None:
             raise HTTPException(status_code=404, detail="Record not found")
 
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
-        user_row = cursor.fetchone()
-        if user_row is None:
-            raise HTTPException(status_code=404, detail="User not found")
+    encrypted_master_key = record_row[0]
 
-    encrypted_master_key = user_row[0]
-
-    background_tasks.add_task(
+    enqueue_ingest_job(
         _reindex_record_task,
         record_id=record_id,
         encrypted_master_key=encrypted_master_key,
@@ -290,66 +355,113 @@ async def reindex_record(
     )
 
 
-async def _reindex_record_task(record_id: str, encrypted_master_key: str) -> None:
-    """Background task to rebuild the vector index for a record."""
-    try:
-        user_key = decrypt_master_key(encrypted_master_key)
-
-        # Delete existing collection
-        delete_collection(record_id)
-
-        # Fetch all chunks
-        with get_db_cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT c.id, c.encrypted_text, c.chunk_index, c.page_number, c.section,
-                       d.id, d.filename
-                FROM chunks c
-                JOIN documents d ON d.id = c.document_id
-                WHERE d.record_id = ?
-                ORDER BY c.chunk_index
-                """,
-                (record_id,),
-            )
-            rows = cursor.fetchall()
+def _load_reindex_batch(user_key: bytes, record_id: str, after_rowid: int) -> tuple[int, list[tuple]]:
+    """
+    Read and decrypt the next REINDEX_BATCH_SIZE chunks of a record after a rowid.
+    Returns the last rowid seen (0 when exhausted) and (id, text, metadata) rows.
+    """
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.rowid, c.id, c.encrypted_text, c.chunk_index, c.page_number, c.section,
+                   d.id, d.filename
+            FROM chunks c
+            JOIN documents d ON d.id = c.document_id
+            WHERE d.record_id = ? AND c.rowid > ?
+            ORDER BY c.rowid
+            LIMIT ?
+            """,
+            (record_id, after_rowid, REINDEX_BATCH_SIZE),
+        )
+        rows = cursor.fetchall()
 
-        if not rows:
-            logger.info("No chunks to reindex for record %s", record_id)
-            return
+    if not rows:
+        return 0, []
 
-        chunk_ids: list[str] = []
-        chunk_texts: list[str] = []
-        metadatas: list[dict] = []
-
-        for row in rows:
-            cid, enc_text, chunk_index, page_num, section, doc_id, filename = row
-            try:
-                plain = decrypt_text_with_user_key(user_key, enc_text)
-            except Exception:
-                continue
-            chunk_ids.append(cid)
-            chunk_texts.append(plain)
-            metadatas.append({
+    plain_texts = decrypt_texts_with_user_key(user_key, [row[2] for row in rows])
+    batch = [
+        (
+            cid,
+            plain,
+            {
                 "document_id": doc_id,
                 "filename": filename or "unknown",
                 "chunk_index": chunk_index or 0,
                 "page_number": page_num or 0,
                 "section": section or "",
-            })
-
-        # Embed all chunks
-        embeddings = await get_embeddings(chunk_texts)
-
-        # Index into vector DB
-        add_vectors(
-            record_id=record_id,
-            ids=chunk_ids,
-            embeddings=embeddings,
-            documents=chunk_texts,
-            metadatas=metadatas,
+            },
         )
+        for (_, cid, _, chunk_index, page_num, section, doc_id, filename), plain in zip(rows, plain_texts)
+        if plain is not None
+    ]
+    return rows[-1][0], batch
+
+
+async def _reindex_record_task(record_id: str, encrypted_master_key: str) -> None:
+    """
+    Background task to rebuild the vector index for a record.
+    Decryption, embedding and index writes run as a pipeline over bounded
+    queues, so only a few batches of plaintext are in memory at once.
+    """
+    try:
+        user_key = get_cached_user_key(encrypted_master_key)
+
+        # Delete existing collection
+        delete_collection(record_id)
+
+        decrypted: asyncio.Queue = asyncio.Queue(maxsize=REINDEX_QUEUE_DEPTH)
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=REINDEX_QUEUE_DEPTH)
+        indexed = 0
+
+        async def produce() -> None:
+            after_rowid = 0
+            while True:
+                after_rowid, batch = await asyncio.to_thread(
+                    _load_reindex_batch, user_key, record_id, after_rowid
+                )
+                if not after_rowid:
+                    break
+                if batch:
+                    await decrypted.put(batch)
+            await decrypted.put(None)
+
+        async def embed() -> None:
+            while (batch := await decrypted.get()) is not None:
+                embeddings = await get_embeddings([text for _, text, _ in batch])
+                await embedded.put((batch, embeddings))
+            await embedded.put(None)
+
+        async def write() -> None:
+            nonlocal indexed
+            while (item := await embedded.get()) is not None:
+                batch, embeddings = item
+                chunk_ids = [cid for cid, _, _ in batch]
+                chunk_texts = [text for _, text, _ in batch]
+
+                # Rebuild the keyword index (also backfills chunks ingested before it existed)
+                await asyncio.to_thread(index_chunk_terms, user_key, record_id, chunk_ids, chunk_texts)
+                add_vectors(
+                    record_id=record_id,
+                    ids=chunk_ids,
+                    embeddings=embeddings,
+                    documents=chunk_texts,
+                    metadatas=[meta for _, _, meta in batch],
+                )
+                indexed += len(batch)
+
+        stages = [asyncio.create_task(stage()) for stage in (produce, embed, write)]
+        try:
+            await asyncio.gather(*stages)
+        except Exception:
+            for stage in stages:
+                stage.cancel()
+            raise
+
+        if not indexed:
+            logger.info("No chunks to reindex for record %s", record_id)
+            return
 
-        logger.info("Reindexed %d chunks for record %s", len(chunk_ids), record_id)
+        logger.info("Reindexed %d chunks for record %s", indexed, record_id)
 
     except Exception as e:
         logger.error("Reindex error for record %s: %s", record_id, e)
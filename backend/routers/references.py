@@ -2,10 +2,11 @@
 References (web links) router for OpenRecords.
 Handles URL scraping, parsing, chunking, and indexing.
 """
+import asyncio
 import logging
 import uuid
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 
 from database import get_db_cursor
 from middleware.auth import get_current_user
@@ -16,12 +17,14 @@ from models.documents import (
     ReferenceInfo,
     ReferencesListResponse,
 )
+from services.ingest_queue import enqueue_ingest_job
 from utils.auth import get_current_timestamp
 from utils.chunking import chunk_text, count_tokens
 from utils.encryption import (
-    decrypt_master_key,
-    encrypt_text_with_user_key,
+    encrypt_texts_with_user_key,
+    get_cached_user_key,
 )
+from utils.keyword_index import index_chunk_terms
 from utils.openrouter import get_embeddings
 from utils.scraping import scrape_url
 from utils.vectordb import add_vectors
@@ -47,22 +50,32 @@ async def _process_reference(
             _set_reference_error(reference_id, err or "No content extracted")
             return
 
-        # Update title
-        if title:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "UPDATE references_table SET title = ? WHERE id = ?",
-                    (title, reference_id),
-                )
+        user_key = get_cached_user_key(encrypted_master_key)
 
-        user_key = decrypt_master_key(encrypted_master_key)
+        # 2. Chunk
+        chunks = chunk_text(text)
+        if not chunks:
+            _set_reference_error(reference_id, "No chunks created from scraped content")
+            return
 
-        # 2. Create a virtual document for this reference
+        # 3. Encrypt (off the event loop)
         document_id = f"doc_{uuid.uuid4().hex}"
         created_at = get_current_timestamp()
         total_tokens = count_tokens(text)
+        chunk_ids = [f"chunk_{uuid.uuid4().hex}" for _ in chunks]
+        chunk_texts = [chunk.text for chunk in chunks]
+        encrypted_texts = await asyncio.to_thread(
+            encrypt_texts_with_user_key, user_key, chunk_texts
+        )
 
+        # 4. Store the title, a virtual document for this reference and its chunks
+        # in one transaction
         with get_db_cursor() as cursor:
+            if title:
+                cursor.execute(
+                    "UPDATE references_table SET title = ? WHERE id = ?",
+                    (title, reference_id),
+                )
             cursor.execute(
                 """
                 INSERT INTO documents (
@@ -72,41 +85,27 @@ async def _process_reference(
                 """,
                 (document_id, record_id, title or url, total_tokens, created_at),
             )
-
-        # 3. Chunk
-        chunks = chunk_text(text)
-        if not chunks:
-            _set_reference_error(reference_id, "No chunks created from scraped content")
-            return
-
-        # 4. Encrypt and store chunks
-        chunk_ids: list[str] = []
-        chunk_texts: list[str] = []
-
-        with get_db_cursor() as cursor:
-            for chunk in chunks:
-                chunk_id = f"chunk_{uuid.uuid4().hex}"
-                encrypted_chunk = encrypt_text_with_user_key(user_key, chunk.text)
-
-                cursor.execute(
-                    """
-                    INSERT INTO chunks (
-                        id, document_id, encrypted_text, token_count,
-                        chunk_index, page_number, section
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
+            cursor.executemany(
+                """
+                INSERT INTO chunks (
+                    id, document_id, encrypted_text, token_count, chunk_index, page_number, section
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
                     (
                         chunk_id,
                         document_id,
-                        encrypted_chunk,
+                        encrypted_text,
                         chunk.token_count,
                         chunk.index,
                         chunk.page_number,
                         chunk.section,
-                    ),
-                )
-                chunk_ids.append(chunk_id)
-                chunk_texts.append(chunk.text)
+                    )
+                    for chunk_id, encrypted_text, chunk in zip(chunk_ids, encrypted_texts, chunks)
+                ],
+            )
+
+        await asyncio.to_thread(index_chunk_terms, user_key, record_id, chunk_ids, chunk_texts)
 
         # 5. Generate embeddings
         embeddings = await get_embeddings(chunk_texts)
@@ -134,8 +133,8 @@ async def _process_reference(
         # 7. Update statuses
         with get_db_cursor() as cursor:
             cursor.execute(
-                "UPDATE documents SET status = 'indexed' WHERE id = ?",
-                (document_id,),
+                "UPDATE documents SET status = 'indexed', chunk_count = ? WHERE id = ?",
+                (len(chunks), document_id),
             )
             cursor.execute(
                 """
@@ -166,29 +165,26 @@ def _set_reference_error(reference_id: str, error: str) -> None:
 
 
 @router.post("/add", response_model=ReferenceAddResponse)
-async def add_reference(
+def add_reference(
     payload: ReferenceAddRequest,
-    background_tasks: BackgroundTasks,
     user: AuthContext = Depends(get_current_user),
 ):
     """Add a web reference to a record."""
 
-    # Validate record ownership
+    # Validate record ownership and fetch the user's key in one query
     with get_db_cursor() as cursor:
         cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
+            """
+            SELECT u.encrypted_master_key
+            FROM records r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.id = ? AND r.user_id = ?
+            """,
             (payload.record_id, user.user_id),
         )
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
-        cursor.execute(
-            "SELECT encrypted_master_key FROM users WHERE id = ?",
-            (user.user_id,),
-        )
         row = cursor.fetchone()
         if row is None:
-            raise HTTPException(status_code=404, detail="User not found")
+            raise HTTPException(status_code=404, detail="Record not found")
 
     encrypted_master_key = row[0]
     reference_id = f"ref_{uuid.uuid4().hex}"
@@ -206,7 +202,7 @@ async def add_reference(
         )
 
     # Kick off background scraping
-    background_tasks.add_task(
+    enqueue_ingest_job(
         _process_reference,
         reference_id=reference_id,
         record_id=payload.record_id,
@@ -222,30 +218,29 @@ async def add_reference(
 
 
 @router.get("/list/{record_id}", response_model=ReferencesListResponse)
-async def list_references(
+def list_references(
     record_id: str,
     user: AuthContext = Depends(get_current_user),
 ):
     """List all references for a record."""
     with get_db_cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM records WHERE id = ? AND user_id = ?",
-            (record_id, user.user_id),
-        )
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Record not found")
-
+        # LEFT JOIN from records: no rows means not owned, a NULL id means no references
         cursor.execute(
             """
-            SELECT id, record_id, url, title, status, document_id, error_message, created_at
-            FROM references_table
-            WHERE record_id = ?
-            ORDER BY created_at DESC
+            SELECT rt.id, r.id, rt.url, rt.title, rt.status, rt.document_id,
+                   rt.error_message, rt.created_at
+            FROM records r
+            LEFT JOIN references_table rt ON rt.record_id = r.id
+            WHERE r.id = ? AND r.user_id = ?
+            ORDER BY rt.created_at DESC
             """,
-            (record_id,),
+            (record_id, user.user_id),
         )
         rows = cursor.fetchall()
 
+    if not rows:
+        raise HTTPException(status_code=404, detail="Record not found")
+
     references = [
         ReferenceInfo(
             id=row[0],
@@ -258,6 +253,7 @@ async def list_references(
             created_at=row[7],
         )
         for row in rows
+        if row[0] is not None
     ]
 
     return ReferencesListResponse(references=references)
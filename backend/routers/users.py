@@ -1,8 +1,12 @@
 """
 User management router for OpenRecords.
 """
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+import shutil
+import sqlite3
+import time
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response
 
 from middleware.auth import get_current_user
 from models.auth import AuthContext, UserPublic
@@ -13,16 +17,46 @@ from models.users import (
     UserSettingsUpdate,
     UserUpdateRequest,
 )
+from config import settings
 from database import get_db_cursor
 from utils.auth import create_jwt_token, hash_password, verify_password
 from utils.auth import get_current_timestamp
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+SECURE_COOKIE = not settings.is_dev
+
+# user_id -> (profile, monotonic expiry), oldest first. The SPA asks for /me on
+# every page load; profile writes below refresh or drop the entry.
+PROFILE_CACHE_TTL_SECONDS = 30
+PROFILE_CACHE_MAX_ENTRIES = 4096
+_profile_cache: dict[str, tuple[UserPublic, float]] = {}
+
+
+def remember_user_profile(profile: UserPublic) -> None:
+    """Cache a user's freshly read or written profile for /me."""
+    _profile_cache.pop(profile.id, None)
+    # Evict in insertion order once the cache is full
+    if len(_profile_cache) >= PROFILE_CACHE_MAX_ENTRIES:
+        del _profile_cache[next(iter(_profile_cache))]
+    _profile_cache[profile.id] = (profile, time.monotonic() + PROFILE_CACHE_TTL_SECONDS)
+
+
+def forget_user_profile(user_id: str) -> None:
+    """Drop a user's cached profile."""
+    _profile_cache.pop(user_id, None)
+
 
 @router.get("/me", response_model=UserPublic)
-async def get_me(user: AuthContext = Depends(get_current_user)):
+def get_me(user: AuthContext = Depends(get_current_user)):
     """Get the current authenticated user."""
+    cached = _profile_cache.get(user.user_id)
+    if cached is not None:
+        profile, expires_at = cached
+        if expires_at > time.monotonic():
+            return profile
+        forget_user_profile(user.user_id)
+
     with get_db_cursor() as cursor:
         cursor.execute(
             """
@@ -43,19 +77,20 @@ async def get_me(user: AuthContext = Depends(get_current_user)):
                 last_login=None,
             )
 
-        return UserPublic(
-            id=row[0],
-            username=row[1],
-            full_name=row[2],
-            email=row[3],
-            created_at=row[4],
-            last_login=row[5],
-        )
+    profile = UserPublic(
+        id=row[0],
+        username=row[1],
+        full_name=row[2],
+        email=row[3],
+        created_at=row[4],
+        last_login=row[5],
+    )
+    remember_user_profile(profile)
+    return profile
 
 
 @router.patch("/me", response_model=UserPublic)
-async def update_me(
-    request: Request,
+def update_me(
     payload: UserUpdateRequest,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -87,30 +122,22 @@ async def update_me(
         new_full_name = updates["full_name"] if updates["full_name"] is not None else row[2]
         new_email = updates["email"] if updates["email"] is not None else row[3]
 
-        if new_username != row[1]:
+        # The UNIQUE constraints on username / email catch conflicts
+        try:
             cursor.execute(
-                "SELECT id FROM users WHERE username = ? AND id != ?",
-                (new_username, user.user_id),
+                """
+                UPDATE users
+                SET username = ?, full_name = ?, email = ?
+                WHERE id = ?
+                """,
+                (new_username, new_full_name, new_email, user.user_id),
             )
-            if cursor.fetchone():
+        except sqlite3.IntegrityError as e:
+            if "users.username" in str(e):
                 raise HTTPException(status_code=409, detail="Username already exists")
-
-        if new_email != row[3]:
-            cursor.execute(
-                "SELECT id FROM users WHERE email = ? AND id != ?",
-                (new_email, user.user_id),
-            )
-            if cursor.fetchone():
+            if "users.email" in str(e):
                 raise HTTPException(status_code=409, detail="Email already registered")
-
-        cursor.execute(
-            """
-            UPDATE users
-            SET username = ?, full_name = ?, email = ?
-            WHERE id = ?
-            """,
-            (new_username, new_full_name, new_email, user.user_id),
-        )
+            raise
 
     updated_user = UserPublic(
         id=row[0],
@@ -120,17 +147,21 @@ async def update_me(
         created_at=row[4],
         last_login=row[5],
     )
+    remember_user_profile(updated_user)
 
-    response = JSONResponse(content=updated_user.model_dump(), status_code=200)
+    response = Response(
+        content=updated_user.model_dump_json(),
+        status_code=200,
+        media_type="application/json",
+    )
 
     if new_username != row[1]:
         token = create_jwt_token(user.user_id, new_username)
-        secure = not request.app.state.settings.is_dev
         response.set_cookie(
             key="openrecords_session",
             value=token,
             httponly=True,
-            secure=secure,
+            secure=SECURE_COOKIE,
             samesite="lax",
             max_age=60 * 60 * 24 * 30,
         )
@@ -139,7 +170,7 @@ async def update_me(
 
 
 @router.patch("/me/password")
-async def change_password(
+def change_password(
     payload: PasswordChangeRequest,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -151,23 +182,29 @@ async def change_password(
         )
         row = cursor.fetchone()
 
-        if not row:
-            raise HTTPException(status_code=404, detail="User not found")
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Argon2 verify + hash run with no connection held
+    if not verify_password(payload.current_password, row[0]):
+        raise HTTPException(status_code=401, detail="Current password is incorrect")
 
-        if not verify_password(payload.current_password, row[0]):
-            raise HTTPException(status_code=401, detail="Current password is incorrect")
+    new_hash = hash_password(payload.new_password)
 
-        new_hash = hash_password(payload.new_password)
+    # Only swap in the new hash if nobody changed the password meanwhile
+    with get_db_cursor() as cursor:
         cursor.execute(
-            "UPDATE users SET password_hash = ? WHERE id = ?",
-            (new_hash, user.user_id),
+            "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+            (new_hash, user.user_id, row[0]),
         )
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=409, detail="Password was changed concurrently")
 
     return {"status": "ok"}
 
 
 @router.delete("/me")
-async def delete_account(
+def delete_account(
     payload: DeleteAccountRequest,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -179,13 +216,18 @@ async def delete_account(
         )
         row = cursor.fetchone()
 
-        if not row:
-            raise HTTPException(status_code=404, detail="User not found")
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        if not verify_password(payload.password, row[0]):
-            raise HTTPException(status_code=401, detail="Password is incorrect")
+    if not verify_password(payload.password, row[0]):
+        raise HTTPException(status_code=401, detail="Password is incorrect")
 
+    with get_db_cursor() as cursor:
         cursor.execute("DELETE FROM users WHERE id = ?", (user.user_id,))
+    forget_user_profile(user.user_id)
+
+    # Generated PDFs are stored outside the database, so the cascade does not reach them
+    shutil.rmtree(settings.pdf_path / user.user_id, ignore_errors=True)
 
     response = JSONResponse(content={"status": "ok"}, status_code=200)
     response.delete_cookie(
@@ -197,7 +239,7 @@ async def delete_account(
 
 
 @router.get("/settings", response_model=UserSettingsResponse)
-async def get_settings(user: AuthContext = Depends(get_current_user)):
+def get_settings(user: AuthContext = Depends(get_current_user)):
     """Get the current user's settings."""
     with get_db_cursor() as cursor:
         cursor.execute(
@@ -223,7 +265,7 @@ async def get_settings(user: AuthContext = Depends(get_current_user)):
 
 
 @router.put("/settings", response_model=UserSettingsResponse)
-async def update_settings(
+def update_settings(
     payload: UserSettingsUpdate,
     user: AuthContext = Depends(get_current_user),
 ):
@@ -232,48 +274,25 @@ async def update_settings(
     with get_db_cursor() as cursor:
         cursor.execute(
             """
-            SELECT user_id FROM user_settings WHERE user_id = ?
+            INSERT INTO user_settings (
+                user_id, default_chat_model, default_embed_model, theme, temperature, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                default_chat_model = excluded.default_chat_model,
+                default_embed_model = excluded.default_embed_model,
+                theme = excluded.theme,
+                temperature = excluded.temperature,
+                updated_at = excluded.updated_at
             """,
-            (user.user_id,),
+            (
+                user.user_id,
+                payload.default_chat_model,
+                payload.default_embed_model,
+                payload.theme,
+                payload.temperature,
+                updated_at,
+            ),
         )
-        exists = cursor.fetchone() is not None
-
-        if exists:
-            cursor.execute(
-                """
-                UPDATE user_settings
-                SET default_chat_model = ?,
-                    default_embed_model = ?,
-                    theme = ?,
-                    temperature = ?,
-                    updated_at = ?
-                WHERE user_id = ?
-                """,
-                (
-                    payload.default_chat_model,
-                    payload.default_embed_model,
-                    payload.theme,
-                    payload.temperature,
-                    updated_at,
-                    user.user_id,
-                ),
-            )
-        else:
-            cursor.execute(
-                """
-                INSERT INTO user_settings (
-                    user_id, default_chat_model, default_embed_model, theme, temperature, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    user.user_id,
-                    payload.default_chat_model,
-                    payload.default_embed_model,
-                    payload.theme,
-                    payload.temperature,
-                    updated_at,
-                ),
-            )
 
     return UserSettingsResponse(
         default_chat_model=payload.default_chat_model,
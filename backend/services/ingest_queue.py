@@ -0,0 +1,74 @@
+"""
+Ingestion job queue for OpenRecords.
+Document processing, reference scraping and reindexing are queued here and
+drained by a fixed pool of worker tasks, so a burst of uploads cannot run
+an unbounded number of heavy jobs against the API's event loop at once.
+"""
+import asyncio
+import logging
+from functools import partial
+from typing import Any, Awaitable, Callable, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_queue: Optional[asyncio.Queue] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_workers: list[asyncio.Task] = []
+
+
+async def _worker(queue: asyncio.Queue) -> None:
+    """Run queued jobs one at a time until cancelled."""
+    while True:
+        job = await queue.get()
+        try:
+            await job()
+        except Exception as e:
+            logger.error("Ingest job failed: %s", e)
+        finally:
+            queue.task_done()
+
+
+def start_ingest_workers() -> None:
+    """Create the queue and start the worker pool on the running loop."""
+    global _queue, _loop
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue()
+    _workers.extend(
+        asyncio.create_task(_worker(_queue))
+        for _ in range(max(1, settings.ingest_workers))
+    )
+
+
+async def stop_ingest_workers() -> None:
+    """
+    Let queued and running jobs finish, then stop the worker pool.
+    Jobs still unfinished after ingest_drain_timeout_seconds are cancelled.
+    """
+    global _queue, _loop
+    if _queue is not None and _workers:
+        try:
+            await asyncio.wait_for(_queue.join(), timeout=settings.ingest_drain_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Ingest queue not drained after %gs; cancelling running jobs, %d still queued",
+                settings.ingest_drain_timeout_seconds,
+                _queue.qsize(),
+            )
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    _loop = None
+
+
+def enqueue_ingest_job(job: Callable[..., Awaitable[Any]], **kwargs: Any) -> None:
+    """
+    Queue ``job(**kwargs)`` for the worker pool.
+    Safe to call from both async endpoints and sync endpoints running in a thread.
+    """
+    if _queue is None or _loop is None:
+        raise RuntimeError("Ingest workers are not running")
+    _loop.call_soon_threadsafe(_queue.put_nowait, partial(job, **kwargs))
@@ -2,28 +2,47 @@
 Model cache service for OpenRecords.
 Manages OpenRouter model listing and caching.
 """
-import json
+import threading
 import time
 from typing import Any, Dict, List, Optional
 
+import httpx
+import orjson
 from openrouter import OpenRouter, operations
 
-from cache_db import get_cache_db_cursor
+from cache_db import get_cache_db_cursor, replace_models_cache
 from config import settings
 from utils.openrouter import OPENROUTER_HTTP_REFERER, OPENROUTER_X_TITLE
 
+# Sync keep-alive client for the model listing calls, so each refresh reuses
+# a warm HTTP/2 connection instead of paying a fresh TCP + TLS handshake
+_http_client = httpx.Client(
+    http2=True,
+    follow_redirects=True,
+    timeout=httpx.Timeout(30.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=4),
+)
+
+
+def close_model_cache_client() -> None:
+    """Close the model listing HTTP client (called on application shutdown)."""
+    _http_client.close()
+
 
 class ModelCacheService:
     """Service for managing OpenRouter model cache."""
 
     def __init__(self):
         """Initialize the model cache service."""
+        # Held while a refresh runs, so at most one hits OpenRouter at a time
+        self._refresh_lock = threading.Lock()
         self.client: Optional[OpenRouter] = None
         if settings.openrouter_api_key:
             self.client = OpenRouter(
                 api_key=settings.openrouter_api_key,
                 http_referer=OPENROUTER_HTTP_REFERER,
                 x_title=OPENROUTER_X_TITLE,
+                client=_http_client,
             )
 
     def _get_cache_age(self) -> Optional[int]:
@@ -111,14 +130,14 @@ class ModelCacheService:
         if isinstance(pricing_completion, str):
             pricing_completion = float(pricing_completion)
 
-        # Extract categories
+        # Extract categories, stored as a JSON array so SQL can filter on them
         categories = raw_model.get("categories")
         if categories is None:
             categories = raw_model.get("architecture", {}).get("modality")
-        if isinstance(categories, list):
-            categories = ",".join(categories)
-        elif categories is None:
-            categories = ""
+        if categories is None:
+            categories = []
+        elif not isinstance(categories, list):
+            categories = [categories]
 
         return {
             "id": raw_model.get("id", ""),
@@ -128,9 +147,10 @@ class ModelCacheService:
             "context_length": raw_model.get("context_length"),
             "pricing_prompt": pricing_prompt,
             "pricing_completion": pricing_completion,
-            "categories": categories,
+            "categories": orjson.dumps(categories).decode("utf-8"),
             "supports_streaming": 1 if raw_model.get("supports_streaming", False) else 0,
-            "raw_json": json.dumps(raw_model),
+            "is_embedding": 1 if "embedding" in categories or "embed" in raw_model.get("id", "").lower() else 0,
+            "raw_json": orjson.dumps(raw_model).decode("utf-8"),
             "updated_at": int(time.time()),
         }
 
@@ -144,36 +164,7 @@ class ModelCacheService:
         Returns:
             Number of models stored
         """
-        with get_cache_db_cursor() as cursor:
-            # Clear existing cache
-            cursor.execute("DELETE FROM models_cache")
-            
-            # Bulk insert new models
-            for model in models:
-                cursor.execute(
-                    """
-                    INSERT INTO models_cache (
-                        id, provider, name, context_length,
-                        pricing_prompt, pricing_completion,
-                        categories, supports_streaming,
-                        raw_json, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        model["id"],
-                        model["provider"],
-                        model["name"],
-                        model["context_length"],
-                        model["pricing_prompt"],
-                        model["pricing_completion"],
-                        model["categories"],
-                        model["supports_streaming"],
-                        model["raw_json"],
-                        model["updated_at"],
-                    ),
-                )
-            
-            return len(models)
+        return replace_models_cache(models)
 
     def _fetch_embedding_models_from_openrouter(self) -> List[Dict[str, Any]]:
         """
@@ -206,62 +197,100 @@ class ModelCacheService:
         Returns:
             Dictionary with cached status, timestamp, and models list
         """
-        # Check if we need to refresh
-        should_refresh = force_refresh or self.is_cache_expired()
+        should_refresh = self._refresh_if_needed(force_refresh)
+        models, updated_at = self._read_cached_models()
+
+        return {
+            "cached": not should_refresh,
+            "updated_at": updated_at or int(time.time()),
+            "models": models,
+        }
+
+    def _refresh_cache(self) -> None:
+        """Fetch models from OpenRouter and replace the cache with them."""
+        try:
+            # Fetch from OpenRouter
+            raw_models = self._fetch_models_from_openrouter()
+            
+            # Normalize models
+            normalized_models = [self._normalize_model(m) for m in raw_models]
+            
+            # Store in cache
+            count = self._store_models_in_cache(normalized_models)
+            
+            print(f"Refreshed model cache: {count} models stored")
+        except Exception as e:
+            print(f"Failed to refresh models, using stale cache: {e}")
+            # Continue to serve stale cache if available
+
+    def _refresh_in_background(self) -> None:
+        """Refresh the cache, then release the lock taken by the caller."""
+        try:
+            self._refresh_cache()
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_if_needed(self, force_refresh: bool) -> bool:
+        """
+        Refresh the cache from OpenRouter if forced, empty or expired.
+
+        Forced refreshes and an empty cache block the caller, since there is
+        nothing to serve yet. An expired cache is served as-is while a
+        background thread refreshes it (stale-while-revalidate).
+
+        Returns:
+            Whether the caller waited for a refresh
+        """
+        cache_age = None if force_refresh else self._get_cache_age()
+
+        if force_refresh or cache_age is None:
+            with self._refresh_lock:
+                self._refresh_cache()
+            return True
+
+        if cache_age > settings.cache_ttl_seconds and self._refresh_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+        return False
+
+    def _read_cached_models(self, embedding_only: bool = False) -> tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Read models from the cache, optionally only embedding-capable ones.
+
+        Returns:
+            Tuple of (models, newest updated_at or None if empty)
+        """
+        where = "WHERE is_embedding = 1" if embedding_only else ""
 
-        if should_refresh:
-            try:
-                # Fetch from OpenRouter
-                raw_models = self._fetch_models_from_openrouter()
-                
-                # Normalize models
-                normalized_models = [self._normalize_model(m) for m in raw_models]
-                
-                # Store in cache
-                count = self._store_models_in_cache(normalized_models)
-                
-                print(f"Refreshed model cache: {count} models stored")
-            except Exception as e:
-                print(f"Failed to refresh models, using stale cache: {e}")
-                # Continue to serve stale cache if available
-
-        # Retrieve from cache
         with get_cache_db_cursor() as cursor:
             cursor.execute(
-                """
+                f"""
                 SELECT id, provider, name, context_length,
                        pricing_prompt, pricing_completion,
                        categories, supports_streaming, updated_at
                 FROM models_cache
+                {where}
                 ORDER BY provider, name
                 """
             )
-            
             rows = cursor.fetchall()
-            
-            models = []
-            updated_at = None
-            
-            for row in rows:
-                if updated_at is None:
-                    updated_at = row[8]  # updated_at column
-                
-                models.append({
-                    "id": row[0],
-                    "provider": row[1],
-                    "name": row[2],
-                    "context_length": row[3],
-                    "pricing_prompt": row[4],
-                    "pricing_completion": row[5],
-                    "categories": row[6].split(",") if row[6] else [],
-                    "supports_streaming": bool(row[7]),
-                })
 
-        return {
-            "cached": not should_refresh,
-            "updated_at": updated_at or int(time.time()),
-            "models": models,
-        }
+        models = [
+            {
+                "id": row[0],
+                "provider": row[1],
+                "name": row[2],
+                "context_length": row[3],
+                "pricing_prompt": row[4],
+                "pricing_completion": row[5],
+                "categories": orjson.loads(row[6]) if row[6] else [],
+                "supports_streaming": bool(row[7]),
+            }
+            for row in rows
+        ]
+        updated_at = rows[0][8] if rows else None
+
+        return models, updated_at
 
     def refresh_models(self) -> Dict[str, Any]:
         """
@@ -295,6 +324,8 @@ class ModelCacheService:
         try:
             raw_models = self._fetch_embedding_models_from_openrouter()
             normalized_models = [self._normalize_model(m) for m in raw_models]
+            for model in normalized_models:
+                model["categories"] = orjson.loads(model["categories"])
             return {
                 "cached": False,
                 "updated_at": int(time.time()),
@@ -303,16 +334,11 @@ class ModelCacheService:
         except Exception as e:
             print(f"Failed to fetch embedding models from OpenRouter: {e}")
             # Fallback to cached embedding models
-            models_data = self.get_models()
-            embedding_models = [
-                model
-                for model in models_data["models"]
-                if "embedding" in model.get("categories", [])
-                or "embed" in model["id"].lower()
-            ]
+            should_refresh = self._refresh_if_needed(force_refresh=False)
+            embedding_models, updated_at = self._read_cached_models(embedding_only=True)
             return {
-                "cached": models_data["cached"],
-                "updated_at": models_data["updated_at"],
+                "cached": not should_refresh,
+                "updated_at": updated_at or int(time.time()),
                 "models": embedding_models,
             }
 
@@ -5,6 +5,7 @@ from utils.auth import (
     generate_user_id,
     get_current_timestamp,
     hash_password,
+    hash_passwords_bulk,
     verify_jwt_token,
     verify_password,
 )
@@ -19,6 +20,7 @@ __all__ = [
     "generate_user_master_key",
     "get_current_timestamp",
     "hash_password",
+    "hash_passwords_bulk",
     "verify_jwt_token",
     "verify_password",
 ]
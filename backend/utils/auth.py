@@ -2,37 +2,85 @@
 Authentication utilities for OpenRecords.
 Handles password hashing, JWT generation, and verification.
 """
+import os
 import secrets
 import string
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple
 
 import jwt
-from argon2 import PasswordHasher
+from argon2 import PasswordHasher, Type
 from argon2.exceptions import VerifyMismatchError, InvalidHash
 
 from config import settings
 from models.auth import AuthContext, TokenPayload
 
 # Argon2 hasher instance
-_hasher = PasswordHasher()
+_hasher = PasswordHasher(
+    time_cost=settings.argon2_time_cost,
+    memory_cost=settings.argon2_memory_kib,
+    parallelism=settings.argon2_parallelism,
+    hash_len=32,
+    salt_len=16,
+    type=Type.ID,
+)
+
+# JWT codec, signing key and algorithm list built once instead of per token
+_jwt = jwt.PyJWT()
+_JWT_SECRET = settings.openrecords_secret_key.encode("utf-8")
+_JWT_ALGORITHMS = [settings.jwt_algorithm]
+
+# Auth endpoints are sync and already run in the threadpool; this caps how many
+# memory-hard Argon2 runs share the CPUs at once so they don't thrash each other
+ARGON2_SLOTS = os.cpu_count() or 1
+_argon2_slots = threading.BoundedSemaphore(ARGON2_SLOTS)
+
+# Bulk hashing uses at most half the Argon2 slots, leaving the rest to login and signup
+BULK_HASH_WORKERS = max(1, ARGON2_SLOTS // 2)
 
 
 def hash_password(password: str) -> str:
     """Hash a password using Argon2."""
-    return _hasher.hash(password)
+    with _argon2_slots:
+        return _hasher.hash(password)
+
+
+def hash_passwords_bulk(passwords: list[str]) -> list[str]:
+    """
+    Hash many passwords at once, e.g. for a bulk user import.
+
+    Argon2 releases the GIL, so hashes run in parallel, but on at most
+    BULK_HASH_WORKERS threads. Each hash takes an Argon2 slot, so a bulk import
+    leaves the remaining slots free for login, signup and password changes
+    (on a single-core host they share the one slot).
+    """
+    if not passwords:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(passwords), BULK_HASH_WORKERS)) as executor:
+        return list(executor.map(hash_password, passwords))
 
 
 def verify_password(password: str, password_hash: str) -> bool:
     """Verify a password against an Argon2 hash."""
     try:
-        _hasher.verify(password_hash, password)
+        with _argon2_slots:
+            _hasher.verify(password_hash, password)
         return True
     except (VerifyMismatchError, InvalidHash):
         return False
 
 
+def password_needs_rehash(password_hash: str) -> bool:
+    """Whether a stored hash was made with different Argon2 parameters than the current ones."""
+    try:
+        return _hasher.check_needs_rehash(password_hash)
+    except InvalidHash:
+        return True
+
+
 def generate_user_id() -> str:
     """Generate a unique user ID."""
     # Generate 8 random bytes and encode as hex
@@ -61,9 +109,7 @@ def create_jwt_token(user_id: str, username: str) -> str:
         "iat": int(now.timestamp()),
     }
 
-    token = jwt.encode(
-        payload, settings.openrecords_secret_key, algorithm=settings.jwt_algorithm
-    )
+    token = _jwt.encode(payload, _JWT_SECRET, algorithm=settings.jwt_algorithm)
 
     return token
 
@@ -79,11 +125,7 @@ def decode_jwt_token(token: str) -> Optional[TokenPayload]:
         TokenPayload if valid, None otherwise
     """
     try:
-        payload = jwt.decode(
-            token,
-            settings.openrecords_secret_key,
-            algorithms=[settings.jwt_algorithm],
-        )
+        payload = _jwt.decode(token, _JWT_SECRET, algorithms=_JWT_ALGORITHMS)
 
         return TokenPayload(
             sub=payload["sub"],
@@ -5,6 +5,8 @@ Uses tiktoken for token-aware chunking with overlap.
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import cache
+from itertools import accumulate
 from typing import List
 
 import tiktoken
@@ -14,6 +16,7 @@ _enc = tiktoken.get_encoding("cl100k_base")
 
 DEFAULT_CHUNK_SIZE = 500  # tokens
 DEFAULT_CHUNK_OVERLAP = 50  # tokens
+_MAX_CHARS_PER_TOKEN = 16  # generous upper bound, used to bound encode() input
 
 
 @dataclass
@@ -32,6 +35,111 @@ def count_tokens(text: str) -> int:
     return len(_enc.encode(text))
 
 
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Trim text to at most max_tokens cl100k_base tokens, cutting on a token
+    boundary. Only a prefix long enough to hold the budget is encoded.
+    """
+    if max_tokens <= 0:
+        return ""
+    tokens = _enc.encode(text[: max_tokens * _MAX_CHARS_PER_TOKEN])
+    if len(tokens) <= max_tokens and len(text) <= max_tokens * _MAX_CHARS_PER_TOKEN:
+        return text
+    return _enc.decode(tokens[:max_tokens])
+
+
+def _token_windows(total_tokens: int, chunk_size: int, chunk_overlap: int) -> list[tuple[int, int]]:
+    """(start, end) token offsets of the overlapping chunk windows."""
+    if total_tokens <= 0:
+        return []
+    # Windows advance by a fixed stride; the last one is the first to reach the end
+    step = chunk_size - chunk_overlap
+    starts = range(0, max(total_tokens - chunk_size, 0) + step, step)
+    return [(start, min(start + chunk_size, total_tokens)) for start in starts]
+
+
+@cache
+def _token_byte_lengths() -> list[int]:
+    """
+    UTF-8 byte length of every token id, built once on first use so byte
+    offsets cost a list lookup per token instead of a tokenizer call.
+    """
+    lengths = []
+    for token in range(_enc.n_vocab):
+        try:
+            lengths.append(len(_enc.decode_single_token_bytes(token)))
+        except KeyError:
+            lengths.append(0)
+    return lengths
+
+
+def _utf8_slice(data: bytes, start: int, end: int) -> str:
+    """Decode data[start:end], widened outwards to whole UTF-8 characters."""
+    while start > 0 and 0x80 <= data[start] < 0xC0:
+        start -= 1
+    while end < len(data) and 0x80 <= data[end] < 0xC0:
+        end += 1
+    return data[start:end].decode("utf-8")
+
+
+def _utf8_encode(text: str) -> tuple[str, bytes]:
+    """
+    UTF-8 encode text the way tiktoken sees it. Lone surrogates (which PDF/DOCX
+    extraction can produce) become U+FFFD using the same fixup tiktoken applies
+    before tokenizing, so byte offsets from token lengths line up.
+    """
+    try:
+        return text, text.encode("utf-8")
+    except UnicodeEncodeError:
+        text = text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        return text, text.encode("utf-8")
+
+
+def _chunk_encoded(
+    sources: list[tuple[str, list[int], int | None, str | None]],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> List[Chunk]:
+    """
+    Chunk already-encoded (text, tokens, page_number, section) sources.
+    Windows are cut straight out of the source's UTF-8 bytes using token byte
+    lengths, so nothing is re-decoded and a character split across two tokens
+    stays whole. Chunk indexes run consecutively across all sources.
+    """
+    chunks: List[Chunk] = []
+    token_byte_length = _token_byte_lengths().__getitem__
+
+    def add(chunk_text_str: str, token_count: int, page_number: int | None, section: str | None) -> None:
+        chunk_text_str = chunk_text_str.strip()
+        if chunk_text_str:
+            chunks.append(
+                Chunk(
+                    text=chunk_text_str,
+                    token_count=token_count,
+                    page_number=page_number,
+                    section=section,
+                    index=len(chunks),
+                )
+            )
+
+    for text, tokens, page_number, section in sources:
+        text, data = _utf8_encode(text)
+        if len(tokens) <= chunk_size:
+            add(text, len(tokens), page_number, section)
+            continue
+
+        byte_offsets = list(accumulate(map(token_byte_length, tokens), initial=0))
+        for start, end in _token_windows(len(tokens), chunk_size, chunk_overlap):
+            add(
+                _utf8_slice(data, byte_offsets[start], byte_offsets[end]),
+                end - start,
+                page_number,
+                section,
+            )
+
+    return chunks
+
+
 def chunk_text(
     text: str,
     chunk_size: int = DEFAULT_CHUNK_SIZE,
@@ -55,47 +163,11 @@ def chunk_text(
     if not text or not text.strip():
         return []
 
-    tokens = _enc.encode(text)
-    total_tokens = len(tokens)
-
-    if total_tokens <= chunk_size:
-        return [
-            Chunk(
-                text=text.strip(),
-                token_count=total_tokens,
-                page_number=page_number,
-                section=section,
-                index=0,
-            )
-        ]
-
-    chunks: List[Chunk] = []
-    start = 0
-    idx = 0
-
-    while start < total_tokens:
-        end = min(start + chunk_size, total_tokens)
-        chunk_tokens = tokens[start:end]
-        chunk_text_str = _enc.decode(chunk_tokens).strip()
-
-        if chunk_text_str:
-            chunks.append(
-                Chunk(
-                    text=chunk_text_str,
-                    token_count=len(chunk_tokens),
-                    page_number=page_number,
-                    section=section,
-                    index=idx,
-                )
-            )
-            idx += 1
-
-        if end >= total_tokens:
-            break
-
-        start = end - chunk_overlap
-
-    return chunks
+    return _chunk_encoded(
+        [(text, _enc.encode(text), page_number, section)],
+        chunk_size,
+        chunk_overlap,
+    )
 
 
 def chunk_pages(
@@ -106,20 +178,15 @@ def chunk_pages(
     """
     Chunk a list of (page_number, text) tuples.
     Preserves page metadata on each chunk.
+    All pages are encoded in one encode_batch call.
     """
-    all_chunks: List[Chunk] = []
-    global_idx = 0
-
-    for page_num, text in pages:
-        page_chunks = chunk_text(
-            text,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            page_number=page_num,
-        )
-        for c in page_chunks:
-            c.index = global_idx
-            global_idx += 1
-            all_chunks.append(c)
-
-    return all_chunks
+    pages = [(page_num, text) for page_num, text in pages if text and text.strip()]
+    if not pages:
+        return []
+
+    encoded = _enc.encode_batch([text for _, text in pages])
+    return _chunk_encoded(
+        [(text, tokens, page_num, None) for (page_num, text), tokens in zip(pages, encoded)],
+        chunk_size,
+        chunk_overlap,
+    )
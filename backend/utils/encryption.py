@@ -1,8 +1,18 @@
 """
 Encryption utilities for OpenRecords.
-Uses Fernet for symmetric encryption of user master keys.
+Uses Fernet for symmetric encryption of user master keys, and AES-256-GCM
+(keyed from the user's master key) for the user's data.
 """
-from cryptography.fernet import Fernet
+import base64
+import hashlib
+import os
+import time
+from typing import Any, Callable, Optional
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from config import settings
 
@@ -10,17 +20,29 @@ from config import settings
 # Initialize Fernet cipher with server secret key
 # Ensure the key is properly formatted for Fernet (32 bytes, URL-safe base64)
 def _get_fernet_key(secret: str) -> bytes:
-    """Generate a valid Fernet key from a secret string."""
-    import base64
-    import hashlib
+    """Derive the master-key wrapping key from the server secret with HKDF."""
+    key_bytes = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"openrecords-master-key-wrap",
+    ).derive(secret.encode())
+    return base64.urlsafe_b64encode(key_bytes)
+
 
-    # Hash the secret to get 32 bytes, then encode as base64
+def _get_legacy_fernet_key(secret: str) -> bytes:
+    """Plain SHA-256 key used to wrap master keys before the HKDF switch."""
     key_bytes = hashlib.sha256(secret.encode()).digest()
     return base64.urlsafe_b64encode(key_bytes)
 
 
-# Create Fernet instance
-_fernet = Fernet(_get_fernet_key(settings.openrecords_secret_key))
+# Derived once at import. New master keys are wrapped with the HKDF key;
+# keys wrapped with the legacy key still decrypt through MultiFernet.
+_FERNET_KEY = _get_fernet_key(settings.openrecords_secret_key)
+_fernet = MultiFernet([
+    Fernet(_FERNET_KEY),
+    Fernet(_get_legacy_fernet_key(settings.openrecords_secret_key)),
+])
 
 
 def encrypt_master_key(user_key: bytes) -> str:
@@ -50,28 +72,174 @@ def decrypt_master_key(encrypted_key: str) -> bytes:
     return _fernet.decrypt(encrypted_key.encode("utf-8"))
 
 
+# blake2b(encrypted master key) -> (decrypted key, monotonic expiry), oldest first.
+# Keyed on the ciphertext so a rotated key never hits a stale entry.
+MASTER_KEY_CACHE_TTL_SECONDS = 600
+MASTER_KEY_CACHE_MAX_ENTRIES = 1024
+_master_key_cache: dict[bytes, tuple[bytes, float]] = {}
+
+
+def get_cached_user_key(encrypted_key: str) -> bytes:
+    """
+    Decrypt a user's master key, reusing the result for a few minutes.
+
+    Every authenticated record/RAG request unwraps the same key, so the
+    Fernet decrypt runs once per TTL window instead of once per request.
+    """
+    cache_key = hashlib.blake2b(encrypted_key.encode("utf-8"), digest_size=16).digest()
+    now = time.monotonic()
+
+    cached = _master_key_cache.get(cache_key)
+    if cached is not None:
+        user_key, expires_at = cached
+        if expires_at > now:
+            return user_key
+        del _master_key_cache[cache_key]
+
+    user_key = decrypt_master_key(encrypted_key)
+
+    # Evict in insertion order once the cache is full
+    if len(_master_key_cache) >= MASTER_KEY_CACHE_MAX_ENTRIES:
+        del _master_key_cache[next(iter(_master_key_cache))]
+    _master_key_cache[cache_key] = (user_key, now + MASTER_KEY_CACHE_TTL_SECONDS)
+
+    return user_key
+
+
+def forget_cached_user_key(encrypted_key: str) -> None:
+    """Drop a user's decrypted master key and the ciphers built from it (e.g. on logout)."""
+    cache_key = hashlib.blake2b(encrypted_key.encode("utf-8"), digest_size=16).digest()
+    cached = _master_key_cache.pop(cache_key, None)
+    if cached is not None:
+        user_key = cached[0]
+    else:
+        try:
+            user_key = decrypt_master_key(encrypted_key)
+        except InvalidToken:
+            return
+    _payload_cipher_cache.pop(user_key, None)
+    _legacy_fernet_cache.pop(user_key, None)
+
+
 def generate_user_master_key() -> bytes:
     """Generate a new random master key for a user."""
     return Fernet.generate_key()
 
 
+# User data is sealed as version byte + 12-byte nonce + AES-GCM ciphertext/tag.
+# Data written before the switch is a Fernet token, recognisable by its prefix,
+# and still decrypts.
+_PAYLOAD_VERSION = b"\x02"
+_NONCE_BYTES = 12
+_FERNET_TOKEN_PREFIX = b"gAAAAA"
+
+
+# user key -> (cipher, monotonic expiry), oldest first. Ciphers live no longer than
+# the cached master key and are dropped with it in forget_cached_user_key.
+CIPHER_CACHE_MAX_ENTRIES = 1024
+_payload_cipher_cache: dict[bytes, tuple[AESGCM, float]] = {}
+_legacy_fernet_cache: dict[bytes, tuple[Fernet, float]] = {}
+
+
+def _cached_cipher(cache: dict, user_key: bytes, build: Callable[[bytes], Any]) -> Any:
+    """Return the cipher cached for user_key, building it if missing or expired."""
+    now = time.monotonic()
+    cached = cache.get(user_key)
+    if cached is not None:
+        cipher, expires_at = cached
+        if expires_at > now:
+            return cipher
+        del cache[user_key]
+
+    cipher = build(user_key)
+
+    # Evict in insertion order once the cache is full
+    if len(cache) >= CIPHER_CACHE_MAX_ENTRIES:
+        del cache[next(iter(cache))]
+    cache[user_key] = (cipher, now + MASTER_KEY_CACHE_TTL_SECONDS)
+    return cipher
+
+
+def _build_payload_cipher(user_key: bytes) -> AESGCM:
+    key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"openrecords payload v2",
+    ).derive(base64.urlsafe_b64decode(user_key))
+    return AESGCM(key)
+
+
+def _legacy_fernet(user_key: bytes) -> Fernet:
+    """Fernet instance for reading a user's pre-AES-GCM payloads."""
+    return _cached_cipher(_legacy_fernet_cache, user_key, Fernet)
+
+
+def _payload_cipher(user_key: bytes) -> AESGCM:
+    """AES-256-GCM cipher for a user's data, derived from their master key with HKDF."""
+    return _cached_cipher(_payload_cipher_cache, user_key, _build_payload_cipher)
+
+
+def _seal(cipher: AESGCM, data: bytes) -> bytes:
+    nonce = os.urandom(_NONCE_BYTES)
+    return _PAYLOAD_VERSION + nonce + cipher.encrypt(nonce, data, None)
+
+
+def _unseal(user_key: bytes, data: bytes) -> bytes:
+    if data.startswith(_FERNET_TOKEN_PREFIX):
+        return _legacy_fernet(user_key).decrypt(data)
+    if data[:1] != _PAYLOAD_VERSION:
+        raise InvalidToken
+    nonce = data[1 : 1 + _NONCE_BYTES]
+    return _payload_cipher(user_key).decrypt(nonce, data[1 + _NONCE_BYTES :], None)
+
+
+def _unseal_text(user_key: bytes, encrypted_text: str) -> str:
+    token = encrypted_text.encode("ascii")
+    if not token.startswith(_FERNET_TOKEN_PREFIX):
+        token = base64.urlsafe_b64decode(token)
+    return _unseal(user_key, token).decode("utf-8")
+
+
 def encrypt_bytes_with_user_key(user_key: bytes, data: bytes) -> bytes:
     """Encrypt bytes with a user master key."""
-    return Fernet(user_key).encrypt(data)
+    return _seal(_payload_cipher(user_key), data)
 
 
 def decrypt_bytes_with_user_key(user_key: bytes, data: bytes) -> bytes:
     """Decrypt bytes with a user master key."""
-    return Fernet(user_key).decrypt(data)
+    return _unseal(user_key, data)
 
 
 def encrypt_text_with_user_key(user_key: bytes, text: str) -> str:
     """Encrypt text with a user master key."""
-    encrypted = encrypt_bytes_with_user_key(user_key, text.encode("utf-8"))
-    return encrypted.decode("utf-8")
+    sealed = _seal(_payload_cipher(user_key), text.encode("utf-8"))
+    return base64.urlsafe_b64encode(sealed).decode("ascii")
+
+
+def encrypt_texts_with_user_key(user_key: bytes, texts: list[str]) -> list[str]:
+    """Encrypt many texts with a user master key, reusing one cipher."""
+    cipher = _payload_cipher(user_key)
+    return [
+        base64.urlsafe_b64encode(_seal(cipher, text.encode("utf-8"))).decode("ascii")
+        for text in texts
+    ]
 
 
 def decrypt_text_with_user_key(user_key: bytes, encrypted_text: str) -> str:
     """Decrypt text with a user master key."""
-    decrypted = decrypt_bytes_with_user_key(user_key, encrypted_text.encode("utf-8"))
-    return decrypted.decode("utf-8")
+    return _unseal_text(user_key, encrypted_text)
+
+
+def decrypt_texts_with_user_key(user_key: bytes, encrypted_texts: list[str]) -> list[Optional[str]]:
+    """
+    Decrypt many texts with a user master key.
+    Entries that fail to decrypt come back as None instead of raising.
+    """
+    plain_texts: list[Optional[str]] = []
+    for encrypted_text in encrypted_texts:
+        try:
+            plain_texts.append(_unseal_text(user_key, encrypted_text))
+        except Exception:
+            plain_texts.append(None)
+    return plain_texts
@@ -0,0 +1,123 @@
+"""
+Blind keyword index for OpenRecords.
+
+Chunk terms are stored in the ``chunks_fts`` FTS5 table as keyed hashes
+(HMAC-SHA256 of record id + term under the user's master key), so the
+keyword side of hybrid retrieval runs in SQL without decrypting every
+chunk and without keeping plaintext terms on disk. Term order is kept,
+so quoted phrases still work as FTS5 phrase queries.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import re
+
+from database import get_db_connection, get_db_cursor
+
+_TERM_RE = re.compile(r"\w+")
+TERM_HASH_HEX_CHARS = 16  # 64-bit hashes keep the index compact
+
+
+class _TermHasher:
+    """Hash terms for one user + record, memoizing repeated terms."""
+
+    def __init__(self, user_key: bytes, record_id: str) -> None:
+        self._key = user_key
+        self._prefix = f"{record_id}\0".encode("utf-8")
+        self._memo: dict[str, str] = {}
+
+    def hash_text(self, text: str) -> list[str]:
+        hashes: list[str] = []
+        for term in _TERM_RE.findall(text.lower()):
+            hashed = self._memo.get(term)
+            if hashed is None:
+                digest = hmac.digest(self._key, self._prefix + term.encode("utf-8"), hashlib.sha256)
+                hashed = digest.hex()[:TERM_HASH_HEX_CHARS]
+                self._memo[term] = hashed
+            hashes.append(hashed)
+        return hashes
+
+
+def index_chunk_terms(
+    user_key: bytes,
+    record_id: str,
+    chunk_ids: list[str],
+    texts: list[str],
+) -> None:
+    """(Re)write the keyword index entries for the given chunks."""
+    if not chunk_ids:
+        return
+
+    hasher = _TermHasher(user_key, record_id)
+    rows = [
+        (" ".join(hasher.hash_text(text)), chunk_id)
+        for chunk_id, text in zip(chunk_ids, texts)
+    ]
+
+    with get_db_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.executemany(
+                "DELETE FROM chunks_fts WHERE rowid = (SELECT seq FROM chunks WHERE id = ?)",
+                [(chunk_id,) for chunk_id in chunk_ids],
+            )
+            conn.executemany(
+                "INSERT INTO chunks_fts (rowid, terms) SELECT seq, ? FROM chunks WHERE id = ?",
+                rows,
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def is_record_indexed(record_id: str) -> bool:
+    """True when the record has chunks and every one of them is in the keyword index."""
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COUNT(*), COUNT(f.rowid)
+            FROM chunks c
+            JOIN documents d ON d.id = c.document_id
+            LEFT JOIN chunks_fts f ON f.rowid = c.seq
+            WHERE d.record_id = ?
+            """,
+            (record_id,),
+        )
+        total, indexed = cursor.fetchone()
+    return total > 0 and total == indexed
+
+
+def search_keyword_index(
+    user_key: bytes,
+    record_id: str,
+    phrases: list[str],
+    limit: int,
+) -> list[str]:
+    """
+    Return chunk ids matching any of the phrases (single words included),
+    best BM25 rank first.
+    """
+    hasher = _TermHasher(user_key, record_id)
+    clauses = []
+    for phrase in phrases:
+        hashes = hasher.hash_text(phrase)
+        if hashes:
+            clauses.append('"' + " ".join(hashes) + '"')
+    if not clauses:
+        return []
+
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.id
+            FROM chunks_fts
+            JOIN chunks c ON c.seq = chunks_fts.rowid
+            WHERE chunks_fts MATCH ?
+            ORDER BY chunks_fts.rank
+            LIMIT ?
+            """,
+            (" OR ".join(clauses), limit),
+        )
+        return [row[0] for row in cursor.fetchall()]
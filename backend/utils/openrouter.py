@@ -4,10 +4,14 @@ Uses the official OpenRouter Python SDK for chat, httpx for embeddings.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import List
+import random
+from functools import cache
+from typing import AsyncIterator, List
 
 import httpx
+import orjson
 from openrouter import OpenRouter
 
 from config import settings
@@ -15,21 +19,186 @@ from config import settings
 logger = logging.getLogger(__name__)
 
 EMBED_BATCH_SIZE = 32
+EMBED_MAX_CONCURRENCY = 8  # in-flight embedding requests per call
+EMBED_COALESCE_WINDOW_SECONDS = 0.02  # how long a single-text call waits for company
+EMBED_COALESCE_MAX_TEXTS = 64
 EMBED_MODEL = "mistralai/mistral-embed-2312"
 EMBED_DIMENSIONS = 1024  # mistral-embed-2312 output size
 DEFAULT_CHAT_MODEL = "moonshotai/kimi-k2.5"
 OPENROUTER_HTTP_REFERER = "https://openrecords.vercel.app"
 OPENROUTER_X_TITLE = "OpenRecords"
 
+# Shared HTTP/2 client so OpenRouter calls reuse warm TLS connections
+HTTP_TIMEOUT = httpx.Timeout(180.0, connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30.0)
+_http_client: httpx.AsyncClient | None = None
+_sdk_client: OpenRouter | None = None
+
+# Process-wide cap on in-flight OpenRouter requests, plus 429 retry policy
+OPENROUTER_MAX_CONCURRENCY = 16
+RATE_LIMIT_MAX_RETRIES = 4
+RATE_LIMIT_BASE_DELAY_SECONDS = 2.0
+RATE_LIMIT_MAX_DELAY_SECONDS = 60.0
+_request_slots = asyncio.Semaphore(OPENROUTER_MAX_CONCURRENCY)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide httpx client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared httpx client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 def _get_client() -> OpenRouter:
-    """Create an OpenRouter SDK client."""
-    return OpenRouter(
-        api_key=settings.openrouter_api_key,
-        http_referer=OPENROUTER_HTTP_REFERER,
-        x_title=OPENROUTER_X_TITLE,
+    """Return the OpenRouter SDK client, bound to the shared httpx client."""
+    global _sdk_client
+    http_client = get_http_client()
+    if _sdk_client is None or _sdk_client.sdk_configuration.async_client is not http_client:
+        _sdk_client = OpenRouter(
+            api_key=settings.openrouter_api_key,
+            http_referer=OPENROUTER_HTTP_REFERER,
+            x_title=OPENROUTER_X_TITLE,
+            async_client=http_client,
+        )
+    return _sdk_client
+
+
+@cache
+def openrouter_headers() -> dict[str, str]:
+    """Request headers for raw OpenRouter calls, built once per process (do not mutate)."""
+    return {
+        "Authorization": f"Bearer {settings.openrouter_api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": OPENROUTER_HTTP_REFERER,
+        "X-Title": OPENROUTER_X_TITLE,
+    }
+
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a 429: Retry-After if given, else jittered backoff."""
+    retry_after = resp.headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(float(retry_after), RATE_LIMIT_MAX_DELAY_SECONDS)
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff
+    delay = min(RATE_LIMIT_BASE_DELAY_SECONDS * 2 ** attempt, RATE_LIMIT_MAX_DELAY_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def openrouter_post(url: str, **kwargs) -> httpx.Response:
+    """
+    POST to OpenRouter on the shared client, holding one of the global
+    request slots, and retry rate-limited (429) responses with backoff.
+
+    The last response is returned as-is once retries are exhausted so
+    callers keep their existing status-code handling.
+    """
+    for attempt in range(RATE_LIMIT_MAX_RETRIES):
+        async with _request_slots:
+            resp = await get_http_client().post(url, **kwargs)
+        if resp.status_code != 429:
+            return resp
+
+        delay = _retry_delay(resp, attempt)
+        logger.warning("OpenRouter rate limited, retrying in %.1fs (attempt %d)", delay, attempt + 1)
+        await asyncio.sleep(delay)
+
+    async with _request_slots:
+        return await get_http_client().post(url, **kwargs)
+
+
+async def _post_embeddings(texts: List[str], model: str) -> List[List[float]]:
+    """Embed one batch of texts in a single request (zero vectors on API error)."""
+    resp = await openrouter_post(
+        f"{settings.openrouter_base_url}/embeddings",
+        headers=openrouter_headers(),
+        json={
+            "model": model,
+            "input": texts,
+        },
+        timeout=30.0,
     )
 
+    if resp.status_code != 200:
+        logger.error("Embeddings API error %d: %s", resp.status_code, resp.text[:200])
+        return [[0.0] * EMBED_DIMENSIONS for _ in texts]
+
+    data = resp.json()
+    return [item["embedding"] for item in sorted(data.get("data", []), key=lambda x: x["index"])]
+
+
+class _EmbeddingBatcher:
+    """
+    Coalesces single-text embedding calls (RAG queries) that arrive within
+    EMBED_COALESCE_WINDOW_SECONDS into one request per model.
+    """
+
+    def __init__(self) -> None:
+        self._pending: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, text: str, model: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(model, [])
+        pending.append((text, future))
+
+        if len(pending) >= EMBED_COALESCE_MAX_TEXTS:
+            self._flush(model)
+        elif len(pending) == 1:
+            self._timers[model] = loop.call_later(EMBED_COALESCE_WINDOW_SECONDS, self._flush, model)
+
+        return await future
+
+    def _flush(self, model: str) -> None:
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(model, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(batch, model))
+        self._tasks.add(task)  # keep a reference until it finishes
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _send(batch: list[tuple[str, asyncio.Future]], model: str) -> None:
+        try:
+            embeddings = await _post_embeddings([text for text, _ in batch], model)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+        # A short response must not leave callers waiting forever, nor hand
+        # them a zero vector that would silently match nothing
+        if len(embeddings) < len(batch):
+            error = RuntimeError(
+                f"Embeddings API returned {len(embeddings)} vectors for {len(batch)} texts"
+            )
+            for _, future in batch[len(embeddings):]:
+                if not future.done():
+                    future.set_exception(error)
+
+
+_embedding_batcher = _EmbeddingBatcher()
+
 
 async def get_embeddings(
     texts: List[str],
@@ -37,7 +206,9 @@ async def get_embeddings(
 ) -> List[List[float]]:
     """
     Get embeddings from OpenRouter API.
-    Batches texts in groups of EMBED_BATCH_SIZE.
+    Batches texts in groups of EMBED_BATCH_SIZE and sends up to
+    EMBED_MAX_CONCURRENCY batches at once over the shared client.
+    Single-text calls are micro-batched with any others arriving at the same time.
     Uses httpx directly since the SDK doesn't expose a raw embeddings endpoint.
 
     Returns list of embedding vectors (one per text).
@@ -46,36 +217,42 @@ async def get_embeddings(
         logger.warning("No OpenRouter API key configured — returning empty embeddings")
         return [[0.0] * EMBED_DIMENSIONS for _ in texts]
 
-    all_embeddings: List[List[float]] = []
-
-    for i in range(0, len(texts), EMBED_BATCH_SIZE):
-        batch = texts[i : i + EMBED_BATCH_SIZE]
-
-        async with httpx.AsyncClient(timeout=30.0) as http:
-            resp = await http.post(
-                f"{settings.openrouter_base_url}/embeddings",
-                headers={
-                    "Authorization": f"Bearer {settings.openrouter_api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": OPENROUTER_HTTP_REFERER,
-                    "X-Title": OPENROUTER_X_TITLE,
-                },
-                json={
-                    "model": model,
-                    "input": batch,
-                },
-            )
+    if len(texts) == 1:
+        return [await _embedding_batcher.embed(texts[0], model)]
 
-            if resp.status_code != 200:
-                logger.error("Embeddings API error %d: %s", resp.status_code, resp.text[:200])
-                all_embeddings.extend([[0.0] * EMBED_DIMENSIONS for _ in batch])
-                continue
+    semaphore = asyncio.Semaphore(EMBED_MAX_CONCURRENCY)
+
+    async def _embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await _post_embeddings(batch, model)
+
+    # Batch similar-length texts together so no batch is padded out to one long outlier
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    sorted_texts = [texts[i] for i in order]
+
+    results = await asyncio.gather(*(
+        _embed_batch(sorted_texts[i : i + EMBED_BATCH_SIZE])
+        for i in range(0, len(sorted_texts), EMBED_BATCH_SIZE)
+    ))
 
-            data = resp.json()
-            for item in sorted(data.get("data", []), key=lambda x: x["index"]):
-                all_embeddings.append(item["embedding"])
+    embeddings: List[List[float]] = [[] for _ in texts]
+    for index, embedding in zip(order, (embedding for batch in results for embedding in batch)):
+        embeddings[index] = embedding
+    return embeddings
 
-    return all_embeddings
+
+# Placeholder replies chat_completion(_stream) return instead of raising
+_FALLBACK_REPLY_PREFIXES = (
+    "OpenRouter API key not configured",
+    "No response from AI model",
+    "No content in response",
+    "Error from AI model",
+)
+
+
+def is_fallback_reply(text: str) -> bool:
+    """True if a chat reply is one of our error/placeholder strings, not model output."""
+    return text.startswith(_FALLBACK_REPLY_PREFIXES)
 
 
 async def chat_completion(
@@ -95,24 +272,103 @@ async def chat_completion(
         return "OpenRouter API key not configured. Please set OPENROUTER_API_KEY in your .env file."
 
     try:
-        with _get_client() as client:
-            res = client.chat.send(
+        async with _request_slots:
+            res = await _get_client().chat.send_async(
                 messages=messages,
                 model=model,
                 max_tokens=max_tokens,
                 temperature=temperature,
             )
 
-            if not res.choices:
-                return "No response from AI model."
+        if not res.choices:
+            return "No response from AI model."
 
-            msg = res.choices[0].message
-            # Prefer content; fall back to reasoning for thinking models
-            text = msg.content
-            if not text and hasattr(msg, "reasoning") and msg.reasoning:
-                text = msg.reasoning
-            return text or "No content in response."
+        msg = res.choices[0].message
+        # Prefer content; fall back to reasoning for thinking models
+        text = msg.content
+        if not text and hasattr(msg, "reasoning") and msg.reasoning:
+            text = msg.reasoning
+        return text or "No content in response."
 
     except Exception as e:
         logger.error("Chat API error: %s", e)
         return f"Error from AI model: {str(e)[:200]}. Please try again."
+
+
+class ChatStreamStatus:
+    """Filled in by chat_completion_stream once the stream is over."""
+
+    def __init__(self) -> None:
+        # True only when the provider sent [DONE] and no error text was yielded
+        self.completed = False
+
+
+async def chat_completion_stream(
+    messages: list[dict],
+    model: str = DEFAULT_CHAT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0.3,
+    status: ChatStreamStatus | None = None,
+) -> AsyncIterator[str]:
+    """
+    Stream an OpenRouter chat completion, yielding text deltas as they arrive.
+
+    Uses httpx directly against the SSE endpoint. Reasoning deltas are
+    forwarded when a thinking model sends no regular content. Errors are
+    yielded as text so a partially streamed answer still ends cleanly;
+    pass ``status`` to find out whether the answer is complete.
+    """
+    if not settings.openrouter_api_key:
+        yield "OpenRouter API key not configured. Please set OPENROUTER_API_KEY in your .env file."
+        return
+
+    try:
+        async with _request_slots, get_http_client().stream(
+            "POST",
+            f"{settings.openrouter_base_url}/chat/completions",
+            headers=openrouter_headers(),
+            json={
+                "model": model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": True,
+            },
+            timeout=httpx.Timeout(30.0, read=None),
+        ) as resp:
+            if resp.status_code != 200:
+                body = await resp.aread()
+                logger.error("Chat stream API error %d: %s", resp.status_code, body[:200])
+                yield f"Error from AI model: HTTP {resp.status_code}. Please try again."
+                return
+
+            sent_content = False
+            saw_done = False
+            async for line in resp.aiter_lines():
+                # SSE comments (": OPENROUTER PROCESSING") and blank keep-alives
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    saw_done = True
+                    break
+
+                choices = orjson.loads(data).get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta") or {}
+                text = delta.get("content")
+                if text:
+                    sent_content = True
+                elif not sent_content:
+                    text = delta.get("reasoning")
+                if text:
+                    yield text
+
+    except Exception as e:
+        logger.error("Chat stream error: %s", e)
+        yield f"Error from AI model: {str(e)[:200]}. Please try again."
+        return
+
+    if status is not None:
+        status.completed = saw_done
@@ -3,22 +3,93 @@ File parsing utilities for OpenRecords.
 Extracts text from PDF, DOCX, MD, and TXT files.
 """
 import io
-from typing import List, Tuple
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+# PDFs with at least this many pages are split across worker processes.
+# PyMuPDF is not thread-safe, so pages are extracted in separate processes
+# that each open their own copy of the document.
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_EXTRACT_WORKERS = min(4, os.cpu_count() or 1)
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Return the shared PDF extraction pool, creating it on first use."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the PDF extraction worker processes, if any were started."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(cancel_futures=True)
+            _pdf_pool = None
+
+
+def _extract_pdf_pages(doc, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract (page_number, text) for pages [start, stop) of an open document."""
+    pages: List[Tuple[int, str]] = []
+    for page_index in range(start, min(stop, doc.page_count)):
+        # Blocks are (x0, y0, x1, y1, text, block_no, block_type); type 0 is text
+        text = "\n".join(
+            block_text
+            for *_, raw_text, _, block_type in doc[page_index].get_text("blocks")
+            if block_type == 0 and (block_text := raw_text.strip())
+        )
+        if text:
+            pages.append((page_index + 1, text))
+    return pages
+
+
+def _extract_pdf_page_range(data: bytes, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Worker entry point: open the PDF bytes and extract pages [start, stop)."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return _extract_pdf_pages(doc, start, stop)
 
 
 def extract_text_from_pdf(data: bytes) -> List[Tuple[int, str]]:
     """
     Extract text from PDF bytes.
     Returns list of (page_number, text) tuples.
+    Large PDFs are extracted in contiguous page ranges across worker processes;
+    this blocks until they finish, so async callers should use a thread.
     """
     import fitz  # PyMuPDF
 
-    pages: List[Tuple[int, str]] = []
     with fitz.open(stream=data, filetype="pdf") as doc:
-        for page_num, page in enumerate(doc, start=1):
-            text = page.get_text("text")
-            if text and text.strip():
-                pages.append((page_num, text.strip()))
+        page_count = doc.page_count
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS < 2:
+            return _extract_pdf_pages(doc, 0, page_count)
+
+    # One contiguous range per worker, so the PDF bytes are sent to each process once
+    step = -(-page_count // PDF_EXTRACT_WORKERS)
+    starts = range(0, page_count, step)
+    results = _get_pdf_pool().map(
+        _extract_pdf_page_range,
+        [data] * len(starts),
+        starts,
+        [start + step for start in starts],
+    )
+
+    pages: List[Tuple[int, str]] = []
+    for chunk in results:
+        pages.extend(chunk)
     return pages
 
 
@@ -8,15 +8,23 @@ NotebookLM's approach.
 Pipeline:
   1. Extract key terms, quoted phrases, named entities from the query
   2. Vector search — cosine similarity on embeddings
-  3. Regex search  — exact + fuzzy keyword matching on decrypted chunks
+  3. Keyword search — exact, case-insensitive, word-bounded term matching
+                     on decrypted chunks (one Aho–Corasick pass per chunk)
   4. RRF merge     — combine both ranked lists into a single ranking
 """
 from __future__ import annotations
 
+import asyncio
+import heapq
 import logging
 import re
 from dataclasses import dataclass, field
-from typing import List
+from functools import lru_cache
+from itertools import islice
+from operator import attrgetter
+from typing import List, Sequence
+
+import ahocorasick
 
 from utils.vectordb import query_vectors
 
@@ -59,8 +67,12 @@ _STOP_WORDS = frozenset(
     "yourself yourselves".split()
 )
 
+_QUOTED_PHRASE_RE = re.compile(r'"([^"]+)"')
+_QUOTED_SPAN_RE = re.compile(r'"[^"]*"')
+_WORD_RE = re.compile(r"[A-Za-z0-9_\-\.]+")
+
 
-def _extract_query_terms(query: str) -> tuple[list[str], list[str]]:
+def extract_query_terms(query: str) -> tuple[list[str], list[str]]:
     """
     Parse a user query into:
       - exact_phrases: quoted strings  e.g. ``"neural network"``
@@ -69,20 +81,26 @@ def _extract_query_terms(query: str) -> tuple[list[str], list[str]]:
     Returns (exact_phrases, keywords).
     """
     # 1. Extract quoted phrases
-    exact_phrases: list[str] = re.findall(r'"([^"]+)"', query)
+    exact_phrases: list[str] = _QUOTED_PHRASE_RE.findall(query)
     # Remove quoted parts from the remaining text
-    remaining = re.sub(r'"[^"]*"', " ", query)
+    remaining = _QUOTED_SPAN_RE.sub(" ", query)
 
     # 2. Extract keywords (non-stop, length > 2)
-    words = re.findall(r"[A-Za-z0-9_\-\.]+", remaining)
+    words = _WORD_RE.findall(remaining)
     keywords = [
         w for w in words
-        if w.lower() not in _STOP_WORDS and len(w) > 2
+        if len(w) > 2 and w.lower() not in _STOP_WORDS
     ]
 
     return exact_phrases, keywords
 
 
+@lru_cache(maxsize=1024)
+def _term_pattern(term: str) -> re.Pattern[str]:
+    """Case-insensitive, word-boundary-aware pattern for one literal term."""
+    return re.compile(rf"\b{re.escape(term)}\b", re.IGNORECASE)
+
+
 def _build_regex_patterns(
     exact_phrases: list[str],
     keywords: list[str],
@@ -93,30 +111,94 @@ def _build_regex_patterns(
     Exact phrases get weight 1.0, individual keywords get 0.5.
     All patterns are case-insensitive and word-boundary-aware.
     """
-    patterns: list[tuple[re.Pattern[str], float]] = []
+    return [
+        *((_term_pattern(phrase), 1.0) for phrase in exact_phrases),
+        *((_term_pattern(kw), 0.5) for kw in keywords),
+    ]
 
-    for phrase in exact_phrases:
-        escaped = re.escape(phrase)
-        try:
-            patterns.append((re.compile(rf"(?i)\b{escaped}\b"), 1.0))
-        except re.error:
-            pass
 
-    for kw in keywords:
-        escaped = re.escape(kw)
-        try:
-            patterns.append((re.compile(rf"(?i)\b{escaped}\b"), 0.5))
-        except re.error:
-            pass
+@dataclass
+class _KeywordMatcher:
+    """
+    Aho–Corasick automaton over the lowercased query terms.
+
+    Each key maps to (term_id, key_length, pattern_indexes); pattern indexes
+    point into the weights / patterns of _build_regex_patterns, and several
+    patterns can share one key (the same term given twice, or as both a
+    phrase and a keyword).
+    """
 
-    return patterns
+    automaton: ahocorasick.Automaton
+    term_count: int
+    patterns: tuple[tuple[re.Pattern[str], float], ...]
+
+
+def _build_keyword_matcher(
+    exact_phrases: list[str],
+    keywords: list[str],
+    patterns: tuple[tuple[re.Pattern[str], float], ...],
+) -> _KeywordMatcher | None:
+    """
+    Build the automaton for the same terms, in the same order, as
+    _build_regex_patterns. Returns None if any term changes length when
+    lowercased, in which case the regex patterns are used instead.
+    """
+    terms = [*exact_phrases, *keywords]
+    if not terms or len(terms) != len(patterns):
+        return None
+
+    indexes_by_key: dict[str, list[int]] = {}
+    for i, term in enumerate(terms):
+        key = term.lower()
+        if len(key) != len(term):
+            return None
+        indexes_by_key.setdefault(key, []).append(i)
+
+    automaton = ahocorasick.Automaton()
+    for term_id, (key, indexes) in enumerate(indexes_by_key.items()):
+        automaton.add_word(key, (term_id, len(key), indexes))
+    automaton.make_automaton()
+    return _KeywordMatcher(automaton, len(indexes_by_key), patterns)
+
+
+def _is_word_boundary(text: str, pos: int) -> bool:
+    """Whether regex ``\b`` holds at text[pos] (word chars per re's Unicode \w)."""
+    before = pos > 0 and (text[pos - 1].isalnum() or text[pos - 1] == "_")
+    after = pos < len(text) and (text[pos].isalnum() or text[pos] == "_")
+    return before != after
+
+
+def _match_snippet(text: str, match_start: int, match_end: int) -> str:
+    """The match with 40 characters of context on either side."""
+    start = max(0, match_start - 40)
+    end = min(len(text), match_end + 40)
+    snippet = text[start:end].strip()
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet = snippet + "…"
+    return snippet
+
+
+@lru_cache(maxsize=512)
+def _prepare_keyword_search(
+    query: str,
+) -> tuple[tuple[tuple[re.Pattern[str], float], ...], _KeywordMatcher | None]:
+    """
+    Parse a query and compile its patterns and keyword matcher, memoized so a
+    query repeated within a chat session is not re-parsed and re-compiled.
+    The results are shared between callers and never mutated.
+    """
+    exact_phrases, keywords = extract_query_terms(query)
+    patterns = tuple(_build_regex_patterns(exact_phrases, keywords))
+    return patterns, _build_keyword_matcher(exact_phrases, keywords, patterns)
 
 
 # ── Regex scoring ──
 
 def _score_chunk_regex(
     text: str,
-    patterns: list[tuple[re.Pattern[str], float]],
+    patterns: Sequence[tuple[re.Pattern[str], float]],
 ) -> tuple[float, list[str]]:
     """
     Score a chunk against the regex patterns.
@@ -134,22 +216,58 @@ def _score_chunk_regex(
 
     for pat, weight in patterns:
         max_possible += weight * 3  # cap at 3 hits per pattern
-        matches = pat.findall(text)
-        count = min(len(matches), 3)
+        # Stop scanning once the hit cap is reached
+        matches = pat.finditer(text)
+        first = next(matches, None)
+        if first is None:
+            continue
+        count = 1 + sum(1 for _ in islice(matches, 2))
         total += weight * count
 
         # Build snippet highlights (first match with surrounding context)
-        if matches:
-            m = pat.search(text)
-            if m:
-                start = max(0, m.start() - 40)
-                end = min(len(text), m.end() + 40)
-                snippet = text[start:end].strip()
-                if start > 0:
-                    snippet = "…" + snippet
-                if end < len(text):
-                    snippet = snippet + "…"
-                highlights.append(snippet)
+        highlights.append(_match_snippet(text, first.start(), first.end()))
+
+    score = total / max_possible if max_possible > 0 else 0.0
+    return min(score, 1.0), highlights
+
+
+def _score_chunk_keywords(text: str, matcher: _KeywordMatcher) -> tuple[float, list[str]]:
+    """
+    Score a chunk exactly like _score_chunk_regex, but find every term in a
+    single Aho–Corasick pass. Hits failing the word-boundary check, or
+    overlapping an accepted hit of the same term, are skipped, matching the
+    regex's non-overlapping leftmost scan.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        return _score_chunk_regex(text, matcher.patterns)
+
+    counts = [0] * len(matcher.patterns)
+    first_hits: list[tuple[int, int] | None] = [None] * len(matcher.patterns)
+    term_ends = [0] * matcher.term_count
+
+    for end_index, (term_id, key_length, indexes) in matcher.automaton.iter(lowered):
+        stop = end_index + 1
+        start = stop - key_length
+        if start < term_ends[term_id]:
+            continue
+        if not (_is_word_boundary(text, start) and _is_word_boundary(text, stop)):
+            continue
+        term_ends[term_id] = stop
+        for i in indexes:
+            if counts[i] < 3:  # cap at 3 hits per pattern
+                counts[i] += 1
+                if first_hits[i] is None:
+                    first_hits[i] = (start, stop)
+
+    total = 0.0
+    max_possible = 0.0
+    highlights: list[str] = []
+    for (_, weight), count, first_hit in zip(matcher.patterns, counts, first_hits):
+        max_possible += weight * 3
+        total += weight * count
+        if first_hit is not None:
+            highlights.append(_match_snippet(text, *first_hit))
 
     score = total / max_possible if max_possible > 0 else 0.0
     return min(score, 1.0), highlights
@@ -161,40 +279,36 @@ def _rrf_merge(
     vector_ranked: list[RetrievedChunk],
     keyword_ranked: list[RetrievedChunk],
     k: int = RRF_K,
+    top_k: int | None = None,
 ) -> list[RetrievedChunk]:
     """
     Merge two ranked lists using Reciprocal Rank Fusion.
 
     RRF score for a document d = Σ  1 / (k + rank_i(d))
     over each ranking list i where d appears.
+    With top_k, only the best top_k are selected (heap, no full sort).
     """
-    scores: dict[str, float] = {}
     chunk_map: dict[str, RetrievedChunk] = {}
 
     for rank, chunk in enumerate(vector_ranked, start=1):
-        cid = chunk.chunk_id
-        scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
-        chunk_map[cid] = chunk
+        chunk.rrf_score = 1.0 / (k + rank)
+        chunk_map[chunk.chunk_id] = chunk
 
     for rank, chunk in enumerate(keyword_ranked, start=1):
-        cid = chunk.chunk_id
-        scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
-        if cid in chunk_map:
+        existing = chunk_map.get(chunk.chunk_id)
+        if existing is not None:
             # Merge keyword info into the existing chunk
-            chunk_map[cid].keyword_score = chunk.keyword_score
-            chunk_map[cid].match_highlights = chunk.match_highlights
+            existing.rrf_score += 1.0 / (k + rank)
+            existing.keyword_score = chunk.keyword_score
+            existing.match_highlights = chunk.match_highlights
         else:
-            chunk_map[cid] = chunk
-
-    # Assign final RRF scores and sort
-    result = []
-    for cid, rrf in scores.items():
-        c = chunk_map[cid]
-        c.rrf_score = rrf
-        result.append(c)
+            chunk.rrf_score = 1.0 / (k + rank)
+            chunk_map[chunk.chunk_id] = chunk
 
-    result.sort(key=lambda c: c.rrf_score, reverse=True)
-    return result
+    rrf_score = attrgetter("rrf_score")
+    if top_k is not None:
+        return heapq.nlargest(top_k, chunk_map.values(), key=rrf_score)
+    return sorted(chunk_map.values(), key=rrf_score, reverse=True)
 
 
 # ── Public API ──
@@ -206,6 +320,7 @@ async def hybrid_retrieve(
     decrypted_chunks: dict[str, tuple[str, dict]],
     top_k: int = 5,
     vector_top_k: int | None = None,
+    vector_hits: list[dict] | None = None,
 ) -> list[RetrievedChunk]:
     """
     NotebookLM-style hybrid retrieval.
@@ -218,6 +333,8 @@ async def hybrid_retrieve(
                            — the caller decrypts chunks before passing them in
         top_k:             Final number of results to return
         vector_top_k:      How many vector hits to consider (default: top_k * 3)
+        vector_hits:       Pre-computed query_vectors() results, if the caller
+                           already ran the vector search
 
     Returns:
         Ranked list of RetrievedChunk with fused scores.
@@ -225,11 +342,13 @@ async def hybrid_retrieve(
     vtk = vector_top_k or top_k * 3
 
     # ── 1. Vector (semantic) search ──
-    vector_hits = query_vectors(
-        record_id=record_id,
-        query_embedding=query_embedding,
-        top_k=vtk,
-    )
+    if vector_hits is None:
+        vector_hits = await asyncio.to_thread(
+            query_vectors,
+            record_id=record_id,
+            query_embedding=query_embedding,
+            top_k=vtk,
+        )
 
     vector_ranked: list[RetrievedChunk] = []
     for hit in vector_hits:
@@ -251,13 +370,15 @@ async def hybrid_retrieve(
         )
 
     # ── 2. Regex (keyword) search ──
-    exact_phrases, keywords = _extract_query_terms(query)
-    patterns = _build_regex_patterns(exact_phrases, keywords)
+    patterns, matcher = _prepare_keyword_search(query)
 
     keyword_scored: list[RetrievedChunk] = []
     if patterns:
         for cid, (text, meta) in decrypted_chunks.items():
-            score, highlights = _score_chunk_regex(text, patterns)
+            if matcher is not None:
+                score, highlights = _score_chunk_keywords(text, matcher)
+            else:
+                score, highlights = _score_chunk_regex(text, patterns)
             if score > 0:
                 keyword_scored.append(
                     RetrievedChunk(
@@ -268,9 +389,8 @@ async def hybrid_retrieve(
                         match_highlights=highlights,
                     )
                 )
-        # Sort by keyword score descending, take top vtk
-        keyword_scored.sort(key=lambda c: c.keyword_score, reverse=True)
-        keyword_ranked = keyword_scored[:vtk]
+        # Take the top vtk by keyword score (heap, no full sort)
+        keyword_ranked = heapq.nlargest(vtk, keyword_scored, key=attrgetter("keyword_score"))
     else:
         keyword_ranked = []
 
@@ -292,5 +412,4 @@ async def hybrid_retrieve(
             chunk.rrf_score = chunk.keyword_score
         return keyword_ranked[:top_k]
 
-    merged = _rrf_merge(vector_ranked, keyword_ranked)
-    return merged[:top_k]
+    return _rrf_merge(vector_ranked, keyword_ranked, top_k=top_k)
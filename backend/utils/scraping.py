@@ -11,9 +11,9 @@ import unicodedata
 from typing import Optional
 from urllib.parse import urlparse
 
-import bleach
 import httpx
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +21,16 @@ USER_AGENT = "OpenRecordsBot/1.0 (+https://openrecords.local)"
 MAX_REDIRECTS = 3
 REQUEST_TIMEOUT = 10.0
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
+FETCH_CHUNK_SIZE = 64 * 1024
 MAX_TOKENS_PER_LINK = 50_000
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=30.0)
+_http_client: httpx.AsyncClient | None = None
 
-# Tags to extract content from (in priority order)
-CONTENT_TAGS = ["article", "main", "section", "div[role='main']"]
+# Content areas to extract from (in priority order)
+CONTENT_TAGS = [".//article", ".//main", ".//section", ".//div[@role='main']"]
+
+# Tags whose text is collected from the content area
+TEXT_TAGS = ("p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "td", "th", "blockquote", "pre", "code")
 
 # Tags to remove
 REMOVE_TAGS = [
@@ -33,6 +39,17 @@ REMOVE_TAGS = [
     "svg", "canvas", "video", "audio", "img",
 ]
 
+_HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+# Stray markup left in extracted text: comments and anything that looks like a tag
+_STRAY_TAG_RE = re.compile(r"<!--.*?-->|</?[A-Za-z][^<>]*>", re.DOTALL)
+
+# Control characters to drop (newlines and tabs are kept)
+_CONTROL_CHARS = dict.fromkeys([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), *range(0x7F, 0xA0)])
+
+# Runs of spaces/tabs, or three or more newlines
+_WHITESPACE_RE = re.compile(r"[ \t]+|\n{3,}")
+
 
 def _is_private_ip(hostname: str) -> bool:
     """Check if a hostname resolves to a private/loopback IP. SSRF protection."""
@@ -71,6 +88,29 @@ def validate_url(url: str) -> tuple[bool, str]:
     return True, ""
 
 
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the shared scraping client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=REQUEST_TIMEOUT,
+            limits=HTTP_LIMITS,
+            follow_redirects=True,
+            max_redirects=MAX_REDIRECTS,
+            headers={"User-Agent": USER_AGENT},
+        )
+    return _http_client
+
+
+async def close_scrape_client() -> None:
+    """Close the shared scraping client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 async def fetch_page(url: str) -> tuple[str | None, str | None, str | None]:
     """
     Fetch a web page.
@@ -81,16 +121,7 @@ async def fetch_page(url: str) -> tuple[str | None, str | None, str | None]:
         return None, None, err
 
     try:
-        async with httpx.AsyncClient(
-            timeout=REQUEST_TIMEOUT,
-            follow_redirects=True,
-            max_redirects=MAX_REDIRECTS,
-        ) as client:
-            resp = await client.get(
-                url,
-                headers={"User-Agent": USER_AGENT},
-            )
-
+        async with _get_http_client().stream("GET", url) as resp:
             if resp.status_code != 200:
                 return None, None, f"HTTP {resp.status_code}"
 
@@ -98,10 +129,18 @@ async def fetch_page(url: str) -> tuple[str | None, str | None, str | None]:
             if "text/html" not in content_type and "text/plain" not in content_type:
                 return None, None, f"Unsupported content type: {content_type}"
 
-            if len(resp.content) > MAX_CONTENT_LENGTH:
+            # Reject oversized pages before (or while) downloading them
+            declared_length = resp.headers.get("content-length", "")
+            if declared_length.isdigit() and int(declared_length) > MAX_CONTENT_LENGTH:
                 return None, None, "Page too large (>5MB)"
 
-            return resp.text, str(resp.url), None
+            body = bytearray()
+            async for chunk in resp.aiter_bytes(FETCH_CHUNK_SIZE):
+                body += chunk
+                if len(body) > MAX_CONTENT_LENGTH:
+                    return None, None, "Page too large (>5MB)"
+
+            return body.decode(resp.encoding or "utf-8", errors="replace"), str(resp.url), None
 
     except httpx.TimeoutException:
         return None, None, "Request timed out"
@@ -116,67 +155,65 @@ def parse_html(html: str) -> tuple[str, str | None]:
     Parse HTML and extract main content text.
     Returns (text_content, page_title).
     """
-    soup = BeautifulSoup(html, "html.parser")
+    try:
+        # Parse bytes so pages with an XML encoding declaration are accepted
+        tree = lxml.html.document_fromstring(html.encode("utf-8"), parser=_HTML_PARSER)
+    except etree.ParserError:
+        return "", None
 
     # Extract title
-    title_tag = soup.find("title")
-    title = title_tag.get_text(strip=True) if title_tag else None
+    title_el = tree.find(".//title")
+    title = title_el.text_content().strip() if title_el is not None else None
 
-    # Remove unwanted elements
-    for tag_name in REMOVE_TAGS:
-        for el in soup.find_all(tag_name):
-            el.decompose()
+    # Remove unwanted elements (their trailing text belongs to the parent)
+    etree.strip_elements(tree, *REMOVE_TAGS, with_tail=False)
 
-    # Try to find main content area
+    # Try to find main content area, falling back to body
     content_el = None
-    for selector in CONTENT_TAGS:
-        if "[" in selector:
-            # Attribute selector like div[role='main']
-            tag, attr_str = selector.split("[", 1)
-            attr_str = attr_str.rstrip("]")
-            key, val = attr_str.split("=", 1)
-            val = val.strip("'\"")
-            content_el = soup.find(tag, attrs={key: val})
-        else:
-            content_el = soup.find(selector)
-        if content_el:
+    for path in CONTENT_TAGS:
+        content_el = tree.find(path)
+        if content_el is not None:
             break
+    if content_el is None:
+        content_el = tree.find("body")
+    if content_el is None:
+        content_el = tree
 
-    # Fall back to body
-    if not content_el:
-        content_el = soup.find("body") or soup
-
-    # Extract text from relevant tags
+    # Extract text from relevant tags in a single walk
     text_parts: list[str] = []
-    for el in content_el.find_all(["p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "td", "th", "blockquote", "pre", "code"]):
-        txt = el.get_text(separator=" ", strip=True)
+    for el in content_el.iter(*TEXT_TAGS):
+        txt = " ".join(piece for part in el.itertext() if (piece := part.strip()))
         if txt:
             # Preserve heading markers
-            if el.name and el.name.startswith("h"):
-                level = int(el.name[1])
-                txt = "#" * level + " " + txt
+            if el.tag[0] == "h":
+                txt = "#" * int(el.tag[1]) + " " + txt
             text_parts.append(txt)
 
     return "\n\n".join(text_parts), title
 
 
+def _collapse_whitespace(match: re.Match[str]) -> str:
+    return "\n\n" if match.group()[0] == "\n" else " "
+
+
 def sanitize_text(text: str) -> str:
     """
     Sanitize extracted text.
     Removes scripts, hidden content, control characters.
     """
     # Remove any remaining HTML tags
-    cleaned = bleach.clean(text, tags=[], strip=True)
+    cleaned = _STRAY_TAG_RE.sub("", text) if "<" in text else text
 
     # Normalize unicode
     cleaned = unicodedata.normalize("NFKC", cleaned)
 
-    # Remove control characters (keep newlines and tabs)
-    cleaned = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]", "", cleaned)
+    # Normalize line endings, then remove control characters (keep newlines and tabs)
+    if "\r" in cleaned:
+        cleaned = cleaned.replace("\r\n", "\n").replace("\r", "\n")
+    cleaned = cleaned.translate(_CONTROL_CHARS)
 
     # Collapse excessive whitespace
-    cleaned = re.sub(r"[ \t]+", " ", cleaned)
-    cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
+    cleaned = _WHITESPACE_RE.sub(_collapse_whitespace, cleaned)
 
     return cleaned.strip()
 
@@ -0,0 +1,17 @@
+"""
+On-disk storage helpers for OpenRecords.
+Vault blobs and generated PDFs are written owner-readable only.
+"""
+import os
+from pathlib import Path
+
+
+def write_private_file(path: Path, data: bytes) -> None:
+    """Write a file with raw os.write calls, owner-readable only."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
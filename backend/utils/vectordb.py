@@ -6,10 +6,14 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import List
 
+import hnswlib
 import numpy as np
 
 from config import settings
@@ -18,6 +22,33 @@ logger = logging.getLogger(__name__)
 
 _conn: sqlite3.Connection | None = None
 
+# Per-record stacked, L2-normalized embedding matrices, most recently used last.
+# Invalidated by add_vectors / delete_collection, the only writers.
+# Each matrix is also kept on disk as matrices/<record_id>.npy, rows in vectors
+# rowid order, and memory-mapped on load so a cache miss skips the BLOB decode.
+# Records with ANN_MIN_VECTORS or more rows also get an HNSW index over the
+# matrix (labels are row positions), persisted as matrices/<record_id>.hnsw.
+VECTOR_CACHE_MAX_RECORDS = 8
+_matrix_cache: OrderedDict[str, tuple[list[str], np.ndarray, hnswlib.Index | None]] = OrderedDict()
+_matrix_versions: dict[str, int] = {}  # bumped on invalidation so stale loads aren't cached
+_matrix_cache_lock = threading.Lock()
+
+# Below this size an exact brute-force scan is already fast
+ANN_MIN_VECTORS = 10_000
+ANN_M = 16
+ANN_EF_CONSTRUCTION = 200
+ANN_EF_SEARCH = 128
+
+# Embeddings are stored L2-normalized (see add_vectors), so cosine similarity
+# is a plain dot product. VECTOR_DB_VERSION 1 marks databases where that holds.
+VECTOR_DB_VERSION = 1
+VECTOR_DB_PRAGMAS_SQL = f"""
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -{settings.sqlite_cache_mb * 1024};
+PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms};
+"""
 VECTOR_DB_SCHEMA = """
 CREATE TABLE IF NOT EXISTS vectors (
     id TEXT PRIMARY KEY,
@@ -37,14 +68,41 @@ def _get_conn() -> sqlite3.Connection:
         db_path = Path(settings.vector_db_path)
         db_path.mkdir(parents=True, exist_ok=True)
         db_file = db_path / "vectors.db"
-        _conn = sqlite3.connect(str(db_file), check_same_thread=False)
-        _conn.executescript(VECTOR_DB_SCHEMA)
+        conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        conn.executescript(VECTOR_DB_PRAGMAS_SQL)
+        conn.executescript(VECTOR_DB_SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < VECTOR_DB_VERSION:
+            _normalize_stored_vectors(conn)
+        _conn = conn
     return _conn
 
 
-def _to_blob(embedding: List[float]) -> bytes:
-    """Convert embedding list to numpy bytes."""
-    return np.array(embedding, dtype=np.float32).tobytes()
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place; all-zero rows are left as they are."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _normalize_stored_vectors(conn: sqlite3.Connection) -> None:
+    """One-time upgrade: normalize embeddings written before they were stored normalized."""
+    rows = conn.execute("SELECT id, embedding FROM vectors").fetchall()
+    conn.executemany(
+        "UPDATE vectors SET embedding = ? WHERE id = ?",
+        ((_to_blob(_from_blob(blob)), vid) for vid, blob in rows),
+    )
+    conn.execute(f"PRAGMA user_version = {VECTOR_DB_VERSION}")
+    conn.commit()
+
+
+def _to_blob(embedding: List[float] | np.ndarray) -> bytes:
+    """Convert an embedding to L2-normalized float32 bytes."""
+    vector = np.array(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tobytes()
 
 
 def _from_blob(blob: bytes) -> np.ndarray:
@@ -52,20 +110,151 @@ def _from_blob(blob: bytes) -> np.ndarray:
     return np.frombuffer(blob, dtype=np.float32)
 
 
-def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    """Compute cosine similarity between two vectors.
-    Handles dimension mismatches by truncating to the shorter length.
+def _matrix_file(record_id: str) -> Path:
+    """Path of a record's on-disk embedding matrix."""
+    return Path(settings.vector_db_path) / "matrices" / f"{record_id}.npy"
+
+
+def _open_matrix_file(record_id: str, row_count: int) -> np.ndarray | None:
+    """Memory-map a record's matrix file, or None if it is missing or out of date."""
+    try:
+        matrix = np.load(_matrix_file(record_id), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if matrix.ndim != 2 or matrix.shape[0] != row_count:
+        return None
+    return matrix
+
+
+def _ann_index_file(record_id: str) -> Path:
+    """Path of a record's on-disk HNSW index."""
+    return _matrix_file(record_id).with_suffix(".hnsw")
+
+
+def _open_ann_index(record_id: str, matrix: np.ndarray) -> hnswlib.Index | None:
+    """Load a record's HNSW index file, or None if it is missing or out of date."""
+    path = _ann_index_file(record_id)
+    if not path.exists():
+        return None
+    index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+    try:
+        index.load_index(str(path), max_elements=matrix.shape[0])
+    except RuntimeError:
+        return None
+    if index.get_current_count() != matrix.shape[0]:
+        return None
+    return index
+
+
+def _build_ann_index(matrix: np.ndarray) -> hnswlib.Index:
+    """Build an inner-product HNSW index over normalized rows, labelled by row position."""
+    index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+    index.init_index(max_elements=matrix.shape[0], ef_construction=ANN_EF_CONSTRUCTION, M=ANN_M)
+    index.add_items(matrix, np.arange(matrix.shape[0]))
+    return index
+
+
+def _invalidate_matrix(record_id: str) -> None:
+    """Drop a record's cached embedding matrix and ANN index, in memory and on disk."""
+    with _matrix_cache_lock:
+        _matrix_cache.pop(record_id, None)
+        _matrix_versions[record_id] = _matrix_versions.get(record_id, 0) + 1
+        _matrix_file(record_id).unlink(missing_ok=True)
+        _ann_index_file(record_id).unlink(missing_ok=True)
+
+
+def _load_matrix(record_id: str) -> tuple[list[str], np.ndarray, hnswlib.Index | None]:
     """
-    min_len = min(len(a), len(b))
-    if min_len == 0:
-        return 0.0
-    a, b = a[:min_len], b[:min_len]
-    dot = np.dot(a, b)
-    norm_a = np.linalg.norm(a)
-    norm_b = np.linalg.norm(b)
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return float(dot / (norm_a * norm_b))
+    Return (ids, matrix, ann_index) for a record, where matrix is an (N, D)
+    float32 array of L2-normalized embeddings and ann_index is an HNSW index
+    over it for records with at least ANN_MIN_VECTORS rows, else None.
+    Built once per record and cached; the matrix is read-only.
+    """
+    with _matrix_cache_lock:
+        cached = _matrix_cache.get(record_id)
+        if cached is not None:
+            _matrix_cache.move_to_end(record_id)
+            return cached
+        version = _matrix_versions.get(record_id, 0)
+
+    conn = _get_conn()
+    ids = [
+        row[0]
+        for row in conn.execute(
+            "SELECT id FROM vectors WHERE record_id = ? ORDER BY rowid",
+            (record_id,),
+        )
+    ]
+
+    # (staged temp file, final path) pairs, renamed into place only if still current
+    staged_files: list[tuple[Path, Path]] = []
+
+    matrix = _open_matrix_file(record_id, len(ids)) if ids else None
+    if matrix is None:
+        ids, matrix = _build_matrix(conn, record_id)
+        if ids:
+            staged_files.append(
+                (_stage_file(_matrix_file(record_id), lambda f: np.save(f, matrix)), _matrix_file(record_id))
+            )
+
+    ann_index = None
+    if len(ids) >= ANN_MIN_VECTORS:
+        ann_index = _open_ann_index(record_id, matrix) if not staged_files else None
+        if ann_index is None:
+            ann_index = _build_ann_index(matrix)
+            path = _ann_index_file(record_id)
+            staged = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            ann_index.save_index(str(staged))
+            staged_files.append((staged, path))
+        ann_index.set_ef(ANN_EF_SEARCH)
+
+    with _matrix_cache_lock:
+        if _matrix_versions.get(record_id, 0) == version:
+            for staged, path in staged_files:
+                os.replace(staged, path)
+            staged_files = []
+            _matrix_cache[record_id] = (ids, matrix, ann_index)
+            if len(_matrix_cache) > VECTOR_CACHE_MAX_RECORDS:
+                _matrix_cache.popitem(last=False)
+    # A writer got in while we were building; these copies are stale
+    for staged, _ in staged_files:
+        staged.unlink(missing_ok=True)
+    return ids, matrix, ann_index
+
+
+def _build_matrix(conn: sqlite3.Connection, record_id: str) -> tuple[list[str], np.ndarray]:
+    """Stack a record's embedding BLOBs, in rowid order, into one matrix."""
+    rows = conn.execute(
+        "SELECT id, embedding FROM vectors WHERE record_id = ? ORDER BY rowid",
+        (record_id,),
+    ).fetchall()
+
+    ids = [row[0] for row in rows]
+    blobs = [row[1] for row in rows]
+    if blobs:
+        blob_size = len(blobs[0])
+        if all(len(blob) == blob_size for blob in blobs):
+            # Common case: one buffer, one array, no per-row NumPy calls.
+            # Rows are stored normalized, so the read-only view is used as is.
+            matrix = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+        else:
+            # Older rows may differ in size; compare on the common prefix,
+            # which has to be renormalized
+            vectors = [_from_blob(blob) for blob in blobs]
+            dim = min(len(v) for v in vectors)
+            matrix = _normalize_rows(np.stack([v[:dim] for v in vectors]))
+    else:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    return ids, matrix
+
+
+def _stage_file(path: Path, write) -> Path:
+    """Write a file next to its final path via write(f); the caller renames it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staged = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    with open(staged, "wb") as f:
+        write(f)
+    return staged
 
 
 def add_vectors(
@@ -82,18 +271,24 @@ def add_vectors(
     conn = _get_conn()
     metas = metadatas or [{}] * len(ids)
 
-    for i, vid in enumerate(ids):
-        conn.execute(
-            "INSERT OR REPLACE INTO vectors (id, record_id, embedding, document, metadata) VALUES (?, ?, ?, ?, ?)",
+    # Drop the matrix file before writing too, so a crash between the commit
+    # and the invalidation below cannot leave a stale file behind
+    _invalidate_matrix(record_id)
+    conn.executemany(
+        "INSERT OR REPLACE INTO vectors (id, record_id, embedding, document, metadata) VALUES (?, ?, ?, ?, ?)",
+        (
             (
                 vid,
                 record_id,
                 _to_blob(embeddings[i]),
                 documents[i] if i < len(documents) else "",
                 json.dumps(metas[i]),
-            ),
-        )
+            )
+            for i, vid in enumerate(ids)
+        ),
+    )
     conn.commit()
+    _invalidate_matrix(record_id)
     logger.info("Indexed %d chunks into record %s", len(ids), record_id)
 
 
@@ -106,40 +301,61 @@ def query_vectors(
     Query vectors for a record using cosine similarity.
     Returns list of dicts with keys: id, distance, document, metadata.
     """
-    conn = _get_conn()
-    cursor = conn.execute(
-        "SELECT id, embedding, document, metadata FROM vectors WHERE record_id = ?",
-        (record_id,),
-    )
-    rows = cursor.fetchall()
-
-    if not rows:
+    ids, matrix, ann_index = _load_matrix(record_id)
+    if not ids:
         return []
 
-    query_vec = np.array(query_embedding, dtype=np.float32)
-    scored: list[tuple[float, dict]] = []
+    dim = min(matrix.shape[1], len(query_embedding))
+    query_vec = np.asarray(query_embedding[:dim], dtype=np.float32)
+    query_norm = np.linalg.norm(query_vec)
+    k = min(top_k, len(ids))
+
+    if ann_index is not None and dim == matrix.shape[1] and query_norm > 0 and k <= ANN_EF_SEARCH:
+        # Approximate search; inner-product distance is already 1 - cosine
+        labels, distances = ann_index.knn_query(query_vec / query_norm, k=k, num_threads=1)
+        top_idx = labels[0]
+        top_scores = 1.0 - distances[0]
+    else:
+        if query_norm == 0 or dim == 0:
+            similarities = np.zeros(len(ids), dtype=np.float32)
+        else:
+            # One BLAS matrix-vector product for every chunk in the record
+            similarities = matrix[:, :dim] @ (query_vec / query_norm)
+
+        top_idx = np.argpartition(-similarities, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-similarities[top_idx])]
+        top_scores = similarities[top_idx]
 
-    for vid, emb_blob, doc, meta_json in rows:
-        emb = _from_blob(emb_blob)
-        sim = _cosine_similarity(query_vec, emb)
+    # Only the winners need their text and metadata
+    top_ids = [ids[i] for i in top_idx]
+    conn = _get_conn()
+    rows = conn.execute(
+        f"SELECT id, document, metadata FROM vectors WHERE id IN ({', '.join('?' for _ in top_ids)})",
+        top_ids,
+    ).fetchall()
+    details = {row[0]: (row[1], row[2]) for row in rows}
+
+    results: list[dict] = []
+    for score, vid in zip(top_scores, top_ids):
+        doc, meta_json = details.get(vid, ("", None))
         # Convert similarity to distance (lower = more similar, for compatibility)
-        distance = 1.0 - sim
-        scored.append((distance, {
+        distance = 1.0 - float(score)
+        results.append({
             "id": vid,
             "distance": distance,
             "document": doc or "",
             "metadata": json.loads(meta_json) if meta_json else {},
-        }))
-
-    scored.sort(key=lambda x: x[0])
-    return [item[1] for item in scored[:top_k]]
+        })
+    return results
 
 
 def delete_collection(record_id: str) -> None:
     """Delete all vectors for a record."""
     conn = _get_conn()
+    _invalidate_matrix(record_id)
     conn.execute("DELETE FROM vectors WHERE record_id = ?", (record_id,))
     conn.commit()
+    _invalidate_matrix(record_id)
     logger.info("Deleted vectors for record %s", record_id)
 
 
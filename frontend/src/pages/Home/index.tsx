@@ -41,6 +41,25 @@ function timeAgo(iso: string): string {
 	return `${days}d ago`;
 }
 
+// The records endpoint is paginated; follow next_cursor until the last page
+async function fetchAllRecords(): Promise<RecordItem[]> {
+	const all: RecordItem[] = [];
+	let cursor: string | null = null;
+	do {
+		const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+		const response = await fetch(`${API_BASE_URL}/records${query}`, {
+			credentials: "include",
+		});
+		const data = await response.json();
+		if (!response.ok) {
+			throw new Error(data.detail || "Failed to load records");
+		}
+		all.push(...(data.records || []));
+		cursor = data.next_cursor || null;
+	} while (cursor);
+	return all;
+}
+
 export default function Home() {
 	const router = useRouter();
 	const { user, loadUser, signout } = useAuthStore();
@@ -99,16 +118,7 @@ export default function Home() {
 
 			try {
 				setIsLoading(true);
-				const response = await fetch(`${API_BASE_URL}/records`, {
-					credentials: "include",
-				});
-
-				const data = await response.json();
-				if (!response.ok) {
-					throw new Error(data.detail || "Failed to load records");
-				}
-
-				const nextRecords = data.records || [];
+				const nextRecords = await fetchAllRecords();
 				setRecords(nextRecords);
 				localStorage.setItem(
 					CACHE_KEY,
@@ -181,14 +191,7 @@ export default function Home() {
 	const refreshRecords = async () => {
 		try {
 			setIsLoading(true);
-			const response = await fetch(`${API_BASE_URL}/records`, {
-				credentials: "include",
-			});
-			const data = await response.json();
-			if (!response.ok) {
-				throw new Error(data.detail || "Failed to load records");
-			}
-			const nextRecords = data.records || [];
+			const nextRecords = await fetchAllRecords();
 			setRecords(nextRecords);
 			localStorage.setItem(
 				CACHE_KEY,